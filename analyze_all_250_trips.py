@@ -4,6 +4,7 @@ import numpy as np
 import seaborn as sns
 from matplotlib.gridspec import GridSpec
 import warnings
+from dataset_cache import read_excel_cached
 warnings.filterwarnings('ignore')
 
 # ============================================================================
@@ -29,11 +30,12 @@ print("="*80)
 print("\n📂 Caricamento dati dall'Excel...")
 
 try:
-    # Carica tutti i sheet
-    summary_df = pd.read_excel(EXCEL_FILE, sheet_name='Summary')
-    convergence_df = pd.read_excel(EXCEL_FILE, sheet_name='Convergence')
-    arc_stats_df = pd.read_excel(EXCEL_FILE, sheet_name='Arc_Statistics')
-    assignments_df = pd.read_excel(EXCEL_FILE, sheet_name='Assignments')
+    # Carica tutti i sheet (una sola lettura, poi dalla cache)
+    sheets = read_excel_cached(EXCEL_FILE, ['Summary', 'Convergence', 'Arc_Statistics', 'Assignments'])
+    summary_df = sheets['Summary']
+    convergence_df = sheets['Convergence']
+    arc_stats_df = sheets['Arc_Statistics']
+    assignments_df = sheets['Assignments']
     
     print(f"✓ Summary: {len(summary_df)} metriche")
     print(f"✓ Convergence: {len(convergence_df)} iterazioni")
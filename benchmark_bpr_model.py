@@ -0,0 +1,99 @@
+"""
+Benchmark of the exact BPR model against the PWL LP of create_model.
+
+Builds and solves each dataset at free-flow times twice: BPR_MODEL=pwl
+(the LP, SOLVER / auto) and BPR_MODEL=exact (the convex NLP with the BPR
+polynomials, first available solver of NLP_ORDER). Every row records
+build and solve seconds, the free variables and active rows handed to the
+solver, the TSTT the model reports and the TSTT of its flows under the
+exact Beckmann potential. The two TSTT columns of a PWL row differ by the
+chord error at its solution; its exact TSTT against the one of the exact
+model is what the approximation costs in the assignment itself. Without
+a nonlinear solver the exact rows keep their build figures only.
+
+Usage: MAX_TRIPS=... python benchmark_bpr_model.py [dataset.xlsx ...]
+       (default: the dataset_50 workbooks of every traffic level)
+"""
+
+import glob
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from pyomo.environ import Constraint, Var
+
+from model_MULTI import create_model, read_dataset
+from solution_report import bpr_sigma, extract_solution
+from solver_backend import SolverBackend
+
+OUT_CSV = os.getenv("BENCH_OUT", "benchmark_bpr_model.csv")
+
+datasets = sys.argv[1:] or sorted(glob.glob("*/OTT/dataset_50_*.xlsx"))
+
+
+def exact_tstt(x, inst):
+    """TSTT of the flow array x under the exact Beckmann potential (unscaled)"""
+    ARCS = inst["ARCS"]
+    ff = np.array([inst["FFTT"][a] for a in ARCS], dtype=float)[:, None]
+    mu = np.array([inst["CAPACITY"][a] for a in ARCS], dtype=float)[:, None]
+    dur = np.array([inst["ARC_DURATION"][a] for a in ARCS], dtype=float)[:, None]
+    return float((bpr_sigma(ff, mu, x) / dur).sum())
+
+
+def run(dataset, form):
+    os.environ["BPR_MODEL"] = form
+    t0 = time.perf_counter()
+    model = create_model(dataset=dataset)[0]
+    inst = model.inst
+    row = {
+        "dataset": dataset["xls_path"],
+        "model": form,
+        "trips": len(inst["TRIPS"]),
+        "options": len(inst["ctp_set"]),
+        "build_s": time.perf_counter() - t0,
+        "variables": sum(not v.fixed for v in model.component_data_objects(Var)),
+        "rows": sum(1 for _ in model.component_data_objects(Constraint, active=True)),
+        "solver": None, "termination": None, "solve_s": np.nan, "TSTT_model": np.nan, "TSTT_exact": np.nan,
+    }
+    try:
+        solver = SolverBackend("auto", nonlinear=True) if form == "exact" else SolverBackend()
+    except RuntimeError as e:
+        print(f"⚠️ {form}: {e}, solve skipped")
+        return row
+    solver.solve(model)
+    sol = extract_solution(model)
+    row.update({
+        "solver": solver.name,
+        "termination": solver.last["termination"],
+        "solve_s": solver.last["wall_s"],
+        "TSTT_model": sol["TSTT_scaled"] / inst["OBJ_SCALE"],
+        "TSTT_exact": exact_tstt(sol["x"], inst),
+    })
+    return row
+
+
+rows = []
+for xls_path in datasets:
+    dataset = read_dataset(xls_path)
+    for form in ("pwl", "exact"):
+        row = run(dataset, form)
+        rows.append(row)
+        solved = f"solve={row['solve_s']:.1f}s  TSTT model={row['TSTT_model']:,.2f}  exact={row['TSTT_exact']:,.2f}" \
+            if row["solver"] else "not solved"
+        print(f"⏱️ {os.path.basename(xls_path)} {form:>5}: build={row['build_s']:.1f}s  "
+              f"vars={row['variables']:,}  rows={row['rows']:,}  {solved}")
+
+df = pd.DataFrame(rows)
+df.to_csv(OUT_CSV, index=False)
+
+print("\n📈 PWL accuracy (exact TSTT of the PWL flows):")
+for xls_path, grp in df.groupby("dataset", sort=False):
+    pwl, exact = grp.set_index("model").loc["pwl"], grp.set_index("model").loc["exact"]
+    line = f"   {os.path.basename(xls_path)}: chord error {pwl['TSTT_model'] / pwl['TSTT_exact'] - 1:+.4%}"
+    if np.isfinite(exact["TSTT_exact"]):
+        line += (f", vs exact model {pwl['TSTT_exact'] / exact['TSTT_exact'] - 1:+.4%}, "
+                 f"solve {pwl['solve_s']:.1f}s vs {exact['solve_s']:.1f}s")
+    print(line)
+print(f"\n💾 Saved: {OUT_CSV}")
@@ -0,0 +1,78 @@
+"""
+Build-time benchmark for create_model as a function of the number of trips.
+
+Builds the MULTI model on growing prefixes of the trip sheet (MAX_TRIPS) and
+times the full construction plus the demand constraint alone, both with the
+trip -> options index and with the old full scan of CTP per trip. The fitted
+log-log slope shows how construction time scales (1.0 = linear).
+
+Usage: XLS_PATH=... python benchmark_build.py [n1 n2 ...]
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from pyomo.environ import ConcreteModel, Constraint, NonNegativeReals, Set, Var
+
+from model_MULTI import create_model
+from option_index import trip_option_index
+
+OUT_CSV = os.getenv("BENCH_OUT", "benchmark_build.csv")
+SKIP_SCAN = os.getenv("BENCH_SKIP_SCAN", "0") == "1"
+
+xls_path = os.getenv("XLS_PATH", "./INPUT_DATASETS/MEDIUM/OTT/dataset_medium_traffic_250.xlsx")
+n_total = len(pd.read_excel(xls_path, sheet_name="trips"))
+if len(sys.argv) > 1:
+    sizes = [int(n) for n in sys.argv[1:]]
+else:
+    sizes = sorted({max(1, n_total // d) for d in (8, 4, 2, 1)})
+
+
+def time_demand(ctp_set, trips, indexed):
+    m = ConcreteModel()
+    m.C = Set(initialize=trips)
+    m.CTP = Set(initialize=ctp_set, dimen=3)
+    m.y = Var(m.CTP, domain=NonNegativeReals)
+    t0 = time.perf_counter()
+    if indexed:
+        index = trip_option_index(ctp_set)
+        m.demand = Constraint(m.C, rule=lambda m, c: sum(m.y[o] for o in index.get(c, [])) <= 1)
+    else:
+        m.demand = Constraint(m.C, rule=lambda m, c: sum(m.y[cc, p, tau] for (cc, p, tau) in m.CTP if cc == c) <= 1)
+    return time.perf_counter() - t0
+
+
+rows = []
+for n in sizes:
+    os.environ["MAX_TRIPS"] = str(n)
+    t0 = time.perf_counter()
+    model = create_model()[0]
+    t_build = time.perf_counter() - t0
+
+    ctp_set = list(model.CTP)
+    trips = list(model.C)
+    row = {
+        "trips": len(trips),
+        "options": len(ctp_set),
+        "build_s": t_build,
+        "demand_indexed_s": time_demand(ctp_set, trips, indexed=True),
+        "demand_scan_s": np.nan if SKIP_SCAN else time_demand(ctp_set, trips, indexed=False),
+    }
+    rows.append(row)
+    print(f"⏱️ trips={row['trips']:>5}  options={row['options']:>8,}  build={row['build_s']:.2f}s  "
+          f"demand(index)={row['demand_indexed_s']:.3f}s  demand(scan)={row['demand_scan_s']:.3f}s")
+
+df = pd.DataFrame(rows)
+df.to_csv(OUT_CSV, index=False)
+
+print("\n📈 Scaling exponents (log-log slope vs. trips, 1.0 = linear):")
+if len(df) > 1:
+    x = np.log(df["trips"])
+    for col in ("build_s", "demand_indexed_s", "demand_scan_s"):
+        if df[col].notna().all():
+            slope = np.polyfit(x, np.log(df[col].clip(lower=1e-6)), 1)[0]
+            print(f"   {col}: {slope:.2f}")
+print(f"\n💾 Saved: {OUT_CSV}")
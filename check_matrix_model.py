@@ -0,0 +1,172 @@
+"""
+Equivalence check: rule-based create_model vs. matrix builder.
+
+For each dataset the LP is built both ways; the matrix LP is solved with
+HiGHS, its solution is loaded into the Pyomo model and every active
+constraint of the rule-based model is evaluated at that point.
+
+Both builds share build_instance, so these checks cannot see a bug in the
+options or the PWL data. Two more objective comparisons cover that:
+  - the Pyomo model is solved and its optimum compared with the matrix one
+    (CHECK_SOLVE_RULES: auto = only instances with at most
+    CHECK_SOLVE_MAX_CTP options, 1 = always, 0 = never);
+  - when a shipped result workbook solution_<n>_<LEVEL>[_<VARIANT>].xlsx
+    exists in the repository root, the first TSTT of its Convergence sheet
+    (iteration 0, written by the original solver) is compared with the
+    matrix optimum. Each dataset is built with the background traffic of
+    its LEVEL folder, as those workbooks were.
+
+Usage: python check_matrix_model.py [dataset.xlsx ...]
+"""
+
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+from pyomo.environ import Constraint, SolverFactory, value
+
+from model_MULTI import TRAFFIC_FILES, create_model
+from model_MULTI_matrix import create_matrix_model, solve_lp_arrays, unpack_solution
+
+DATASETS = sys.argv[1:] or [
+    "MEDIUM/OTT/dataset_10_MEDIUM.xlsx",
+    "MEDIUM/OTT/dataset_50_MEDIUM.xlsx",
+    "MEDIUM/OTT/dataset_medium_traffic_250.xlsx",
+]
+TOL = float(os.getenv("CHECK_TOL", "1e-4"))
+OBJ_TOL = float(os.getenv("CHECK_OBJ_TOL", "1e-3"))
+SOLVE_RULES = os.getenv("CHECK_SOLVE_RULES", "auto").lower()
+SOLVE_MAX_CTP = int(os.getenv("CHECK_SOLVE_MAX_CTP", "5000"))
+DEFAULT_TRAFFIC = os.getenv("TRAFFIC")
+ROOT = Path(__file__).resolve().parent
+
+
+def dataset_level(xls):
+    """LEVEL folder of a dataset (LOW/MEDIUM/HIGH/NULL) or None"""
+    parts = Path(xls).parts
+    return parts[-3].upper() if len(parts) >= 3 and parts[-3].upper() in TRAFFIC_FILES else None
+
+
+def reference_tstt(xls):
+    """Iteration-0 TSTT of the shipped solution workbook of a dataset, or None"""
+    path = Path(xls)
+    found = re.findall(r"_(\d+)", path.stem)
+    level = dataset_level(xls)
+    if not found or level is None:
+        return None
+    variant = path.parent.name.upper()
+    suffix = "" if variant == "OTT" else f"_{variant}"
+    ref = ROOT / f"solution_{found[-1]}_{level}{suffix}.xlsx"
+    if not ref.exists():
+        return None
+    return float(pd.read_excel(ref, sheet_name="Convergence")["TSTT"].iloc[0])
+
+
+def rel_gap(a, b):
+    return abs(a - b) / max(1.0, abs(b))
+
+
+def load_into_model(model, lp, sol, inst):
+    """Copy matrix-solution arrays into the Pyomo variables"""
+    arc_index = {a: n for n, a in enumerate(inst["ARCS"])}
+    for n, (c, p, tau) in enumerate(inst["ctp_set"]):
+        model.y[c, p, tau].set_value(sol["y"][n], skip_validation=True)
+        model.TT[c, p, tau].set_value(sol["TT"][n], skip_validation=True)
+        model.I[c, p, tau].set_value(sol["I"][n], skip_validation=True)
+    for n, c in enumerate(inst["TRIPS"]):
+        model.r[c].set_value(sol["r"][n], skip_validation=True)
+    for (i, j, t) in model.x:
+        a = arc_index[(i, j)]
+        model.x[i, j, t].set_value(sol["x"][a, t], skip_validation=True)
+        model.eta[i, j, t].set_value(sol["eta"][a, t], skip_validation=True)
+        model.u_lat[i, j, t].set_value(sol["u_lat"][a, t], skip_validation=True)
+        if inst["RELAX_TTI"]:
+            model.slack_tti[i, j, t].set_value(sol["slack_tti"][a, t], skip_validation=True)
+    for (i, j, t, h) in model.lmbd:
+        model.lmbd[i, j, t, h].set_value(sol["lmbd"][arc_index[(i, j)], t, h - 1], skip_validation=True)
+
+
+def max_violation(model):
+    worst, where = 0.0, None
+    for con in model.component_data_objects(Constraint, active=True):
+        body = value(con.body)
+        viol = 0.0
+        if con.has_lb():
+            viol = max(viol, value(con.lower) - body)
+        if con.has_ub():
+            viol = max(viol, body - value(con.upper))
+        scale = max(1.0, abs(body))
+        if viol / scale > worst:
+            worst, where = viol / scale, con.name
+    return worst, where
+
+
+results = []
+for xls in DATASETS:
+    print("\n" + "=" * 70)
+    print(f"🔍 {xls}")
+    print("=" * 70)
+    os.environ["XLS_PATH"] = xls
+    level = dataset_level(xls)
+    if level is not None:
+        os.environ["TRAFFIC"] = level
+    elif DEFAULT_TRAFFIC is not None:
+        os.environ["TRAFFIC"] = DEFAULT_TRAFFIC
+    else:
+        os.environ.pop("TRAFFIC", None)
+
+    t0 = time.time()
+    model = create_model()[0]
+    t_rules = time.time() - t0
+
+    t0 = time.time()
+    lp, inst = create_matrix_model()
+    t_matrix = time.time() - t0
+
+    res = solve_lp_arrays(lp)
+    sol = unpack_solution(lp, res["col_value"])
+
+    load_into_model(model, lp, sol, inst)
+    viol, where = max_violation(model)
+    obj_rules_at_sol = value(model.obj_TSTT)
+    obj_gap = rel_gap(obj_rules_at_sol, res["objective"])
+
+    row = {
+        "dataset": xls,
+        "ctp_options": len(inst["ctp_set"]),
+        "build_rules_s": t_rules,
+        "build_matrix_s": t_matrix,
+        "max_rel_violation": viol,
+        "objective_matrix": res["objective"],
+        "objective_rules_at_matrix_sol": obj_rules_at_sol,
+    }
+    ok = viol <= TOL and obj_gap <= TOL
+
+    if SOLVE_RULES == "1" or (SOLVE_RULES == "auto" and len(inst["ctp_set"]) <= SOLVE_MAX_CTP):
+        solver = SolverFactory(os.getenv("CHECK_SOLVER", "appsi_highs"))
+        solver.solve(model, load_solutions=True)
+        row["objective_rules_solved"] = value(model.obj_TSTT)
+        ok = ok and rel_gap(row["objective_rules_solved"], res["objective"]) <= OBJ_TOL
+
+    ref = reference_tstt(xls)
+    if ref is not None:
+        row["tstt_matrix"] = res["objective"] / inst["OBJ_SCALE"]
+        row["tstt_reference"] = ref
+        ok = ok and rel_gap(row["tstt_matrix"], ref) <= OBJ_TOL
+
+    row["ok"] = ok
+    results.append(row)
+
+    for key, val in row.items():
+        print(f"   {key}: {val}")
+    if where is not None:
+        print(f"   worst constraint: {where}")
+    print(f"   speedup (build): {t_rules / max(t_matrix, 1e-9):.1f}x")
+
+print("\n" + "=" * 70)
+for row in results:
+    print(f"{'✅' if row['ok'] else '❌'} {row['dataset']}")
+sys.exit(0 if all(r["ok"] for r in results) else 1)
@@ -0,0 +1,179 @@
+"""
+Column-generation mode for the MULTI model.
+
+Instead of putting every (c, p, tau) option of ctp_set in the LP, the
+restricted master starts from CG_INIT_PER_TRIP options per trip (the
+cheapest at free-flow latency on top of the background traffic) and is
+grown with priced-out columns:
+
+    reduced cost(o) = - a_dem * pi[c]  - a_flow * sum_{k in cells(o)} lambda[k]
+
+with pi the duals of the demand rows, lambda the duals of the flow rows
+(arc, slot) and a_dem / a_flow the coefficients of y in those rows. y has
+no objective coefficient of its own; its TT/I companions only sit in their
+own rows, so they do not enter the pricing. Each round adds up to
+CG_COLS_PER_TRIP improving options per trip until no option prices below
+-CG_TOL.
+
+Every round assembles its master with the matrix builder
+(model_MULTI_matrix, a fraction of a second) and solves it cold with
+HiGHS simplex plus crossover, so the duals are basic. Editing a live
+Pyomo master instead makes a persistent solver remove and re-add every
+flow and demand row that a new column touches, which cost 10-99 s a
+round on dataset_10_MEDIUM.
+
+When it pays off: only the option part of the LP shrinks (y, TT, I and
+their path_travel_time / inconvenience rows). The PWL rows and columns
+of every (arc, slot) cell stay in the master, because their flow duals
+price the options outside it. The run prints master and full LP sizes
+and the share of the full LP taken by options. On dataset_10_MEDIUM that
+share is 2% of rows and 1% of columns: the master keeps 98% of the rows
+and the full LP solves faster than the CG rounds together. CG is worth it only when options make up most of the LP:
+many trips, paths and departure slots per cell.
+
+Usage: XLS_PATH=... python column_generation.py
+    CG_INIT_PER_TRIP   initial options per trip (default 1)
+    CG_COLS_PER_TRIP   columns added per trip and round (default 3)
+    CG_MAX_ROUNDS      (default 50)
+    CG_TOL             reduced-cost tolerance, scaled objective units (default 1e-6)
+    CG_CHECK_FULL=1    also solve the full model and compare objectives
+    SOLVER_THREADS / SOLVER_TIME_LIMIT   HiGHS settings (see solver_backend.py)
+    CG_OUT             per-round log (default column_generation.csv)
+"""
+
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from model_MULTI import build_instance, restrict_instance
+from model_MULTI_matrix import build_lp_arrays, solve_lp_arrays
+from solution_report import bpr_latency
+from solver_backend import settings
+
+
+def initial_options(inst, per_trip=1):
+    """Positions of the per_trip cheapest options of each trip at x = Z"""
+    ARCS, nT = inst["ARCS"], len(inst["TIME_SLOTS"])
+    inc = inst["INCIDENCE"]
+    ff = np.repeat([inst["FFTT"][a] for a in ARCS], nT)
+    mu = np.repeat([inst["CAPACITY"][a] for a in ARCS], nT)
+    dur = np.repeat([inst["ARC_DURATION"][a] for a in ARCS], nT)
+    z = inst["Z"].ravel().astype(float)
+    cost = np.bincount(inc.opt_of_entry, weights=(bpr_latency(ff, mu, z) / dur)[inc.opt_cells],
+                       minlength=inc.n_options)
+    return best_per_trip(inst, cost, per_trip)
+
+
+def best_per_trip(inst, score, k, candidates=None):
+    """Up to k lowest-score option positions per trip (optionally among candidates)"""
+    trip_of = np.array([c for (c, p, tau) in inst["ctp_set"]])
+    idx = np.arange(len(score)) if candidates is None else np.asarray(candidates, dtype=np.int64)
+    order = idx[np.lexsort((score[idx], trip_of[idx]))]
+    trips = trip_of[order]
+    start = np.r_[0, np.flatnonzero(trips[1:] != trips[:-1]) + 1]
+    rank = np.arange(len(order)) - np.repeat(start, np.diff(np.r_[start, len(order)]))
+    return order[rank < k]
+
+
+def row_coefficient(lp, row_block, row, col_block, col):
+    """Coefficient of column col of col_block in row row of row_block of an assembled LP"""
+    return float(lp["A"][lp["rows"][row_block][0] + row, lp["cols"][col_block][0] + col])
+
+
+def master_duals(lp, res):
+    """Flow (cells) and demand (trips) row duals of a solved master, as extract_solution names them"""
+    d = res["row_dual"]
+    (fs, fe), (ds, de) = lp["rows"]["flow"], lp["rows"]["demand"]
+    return {"flow_dual": d[fs:fe], "demand_dual": d[ds:de]}
+
+
+def option_share(lp):
+    """Share of the rows and columns of an assembled LP that belong to the options"""
+    n_rows, n_cols = lp["A"].shape
+    rows = sum(e - s for name, (s, e) in lp["rows"].items() if name in ("path_travel_time", "inconvenience"))
+    cols = sum(e - s for name, (s, e) in lp["cols"].items() if name in ("y", "TT", "I"))
+    return rows / n_rows, cols / n_cols
+
+
+def price_options(sol, full, a_dem, a_flow):
+    """Reduced cost of every option of the full instance from the duals of extract_solution"""
+    inc = full["INCIDENCE"]
+    lam = sol["flow_dual"].ravel()  # cell = arc * nT + slot
+    pi = dict(zip(full["TRIPS"], sol["demand_dual"].tolist()))
+    pi_opt = np.array([pi[c] for (c, p, tau) in full["ctp_set"]])
+    lam_opt = np.bincount(inc.opt_of_entry, weights=lam[inc.opt_cells], minlength=inc.n_options)
+    return -a_dem * pi_opt - a_flow * lam_opt
+
+
+if __name__ == "__main__":
+    INIT_PER_TRIP = int(os.getenv("CG_INIT_PER_TRIP", "1"))
+    COLS_PER_TRIP = int(os.getenv("CG_COLS_PER_TRIP", "3"))
+    MAX_ROUNDS = int(os.getenv("CG_MAX_ROUNDS", "50"))
+    TOL = float(os.getenv("CG_TOL", "1e-6"))
+    OUT_CSV = os.getenv("CG_OUT", "column_generation.csv")
+    s = settings()
+
+    print("\n" + "=" * 70)
+    print("🧩 COLUMN GENERATION over (trip, path, departure) options")
+    print("=" * 70)
+
+    full = build_instance()
+    full_lp = build_lp_arrays(full)
+    n_full = len(full["ctp_set"])
+    active = initial_options(full, INIT_PER_TRIP)
+
+    rounds = []
+    a_dem = a_flow = None
+    for r in range(1, MAX_ROUNDS + 1):
+        in_master = np.zeros(n_full, dtype=bool)
+        in_master[active] = True
+
+        t0 = time.time()
+        master = restrict_instance(full, active)
+        lp = build_lp_arrays(master)
+        build_time = time.time() - t0
+        res = solve_lp_arrays(lp, s["time_limit"], s["threads"], method="simplex", crossover="on")
+        obj = res["objective"]
+
+        if a_dem is None:
+            c0 = master["TRIPS"].index(master["ctp_set"][0][0])
+            k0 = int(master["INCIDENCE"].cells_of(0)[0])
+            a_dem = row_coefficient(lp, "demand", c0, "y", 0)
+            a_flow = row_coefficient(lp, "flow", k0, "y", 0)
+
+        rc = price_options(master_duals(lp, res), full, a_dem, a_flow)
+        master_rc = rc[in_master]
+        candidates = np.flatnonzero(~in_master & (rc < -TOL))
+        new = best_per_trip(full, rc, COLS_PER_TRIP, candidates) if len(candidates) else candidates
+
+        rounds.append({"Round": r, "Options": int(in_master.sum()), "Rows": lp["A"].shape[0],
+                       "Columns": lp["A"].shape[1], "Objective": obj,
+                       "Min_Reduced_Cost": float(rc[~in_master].min()) if (~in_master).any() else 0.0,
+                       "Master_Min_RC": float(master_rc.min()), "Added": len(new),
+                       "Build_Time_s": build_time, "Solve_Time_s": res["solve_time"]})
+        print(f"   round {r:>3}: options={rounds[-1]['Options']:,}  obj={obj:,.4f}  "
+              f"min rc={rounds[-1]['Min_Reduced_Cost']:.3e}  +{len(new)}  ({res['solve_time']:.1f}s)")
+        if len(new) == 0:
+            break
+        active = np.r_[active, new]
+
+    n_master = rounds[-1]["Options"]
+    cg_time = sum(rec["Build_Time_s"] + rec["Solve_Time_s"] for rec in rounds)
+    row_share, col_share = option_share(full_lp)
+    print(f"\n✅ Column generation finished after {len(rounds)} rounds ({cg_time:.1f}s)")
+    print(f"   Options in master: {n_master:,} of {n_full:,} ({100 * n_master / n_full:.1f}%)")
+    print(f"   Master LP: {rounds[-1]['Rows']:,} rows x {rounds[-1]['Columns']:,} cols; "
+          f"full LP: {full_lp['A'].shape[0]:,} rows x {full_lp['A'].shape[1]:,} cols")
+    print(f"   Options in the full LP: {100 * row_share:.1f}% of rows, {100 * col_share:.1f}% of cols")
+    print(f"   Objective (scaled): {rounds[-1]['Objective']:,.4f}")
+
+    if os.getenv("CG_CHECK_FULL", "0") == "1":
+        res = solve_lp_arrays(full_lp, s["time_limit"], s["threads"], method="simplex", crossover="on")
+        full_obj = res["objective"]
+        gap = abs(full_obj - rounds[-1]["Objective"]) / max(1.0, abs(full_obj))
+        print(f"   Full model objective: {full_obj:,.4f} ({res['solve_time']:.1f}s), relative gap {gap:.2e}")
+
+    pd.DataFrame(rounds).to_csv(OUT_CSV, index=False)
+    print(f"💾 Saved: {OUT_CSV}")
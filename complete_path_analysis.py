@@ -9,6 +9,7 @@ import networkx as nx
 import numpy as np
 from collections import defaultdict
 import warnings
+from dataset_cache import read_excel_cached
 warnings.filterwarnings('ignore')
 
 # ============================================================================
@@ -31,14 +32,13 @@ print("="*80)
 # ============================================================================
 print("\n📂 Caricamento dati...")
 
-# Load INPUT dataset
-arcs_df = pd.read_excel(INPUT_FILE, sheet_name='arcs')
-trips_df = pd.read_excel(INPUT_FILE, sheet_name='trips')
-nodes_df = pd.read_excel(INPUT_FILE, sheet_name='nodes')
+# Load INPUT dataset (sheets come from the dataset cache)
+input_sheets = read_excel_cached(INPUT_FILE, ['arcs', 'trips', 'nodes'])
+arcs_df, trips_df, nodes_df = input_sheets['arcs'], input_sheets['trips'], input_sheets['nodes']
 
 # Load SOLUTION
-assignments_df = pd.read_excel(SOLUTION_FILE, sheet_name='Assignments')
-arc_stats_df = pd.read_excel(SOLUTION_FILE, sheet_name='Arc_Statistics')
+solution_sheets = read_excel_cached(SOLUTION_FILE, ['Assignments', 'Arc_Statistics'])
+assignments_df, arc_stats_df = solution_sheets['Assignments'], solution_sheets['Arc_Statistics']
 
 print(f"✓ INPUT - Arcs: {len(arcs_df)}")
 print(f"✓ INPUT - Trips: {len(trips_df)}")
@@ -0,0 +1,299 @@
+"""
+Single-pass dataset pipeline: node probabilities -> solver-ready workbook.
+
+Runs the stages of generate_trips.py -> generate_paths_15minuti.py ->
+generate_temporal_paths_15minuti.py -> model/dataset.py in memory, with
+no intermediate JSON files:
+
+    sample_trips        ODSampler draws: origin, destination, departure, preference
+    assign_demand       TOTAL_DEMAND split by p_gen * p_attr * U(0.8, 2.2), integer, same total
+    attach_paths        K shortest paths of every OD pair (path_cache table, process pool),
+                        15-minute departure windows per path, computed once per
+                        (OD pair, days) and shared by the trips that repeat them
+    workbook_frames     nodes / arcs / trips sheets in the model/dataset.py layout
+
+build_dataset runs them, writes the workbook and stores the dataset_cache
+bundle of the same frames under the workbook hash, so the first model
+build does not parse the workbook either.
+
+Run from the repository root (inputs are read from dati/):
+
+    python data_generation/dataset_pipeline.py --trips 1000 [--seed 0] [--demand 19387]
+        [--k 3] [--traffic dati/traffic_DEF_N.json] [--out INPUT_DATASETS/dataset_1000.xlsx]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from dataset_cache import compile_frames, store_dataset
+from path_cache import k_shortest_paths
+from trip_sampler import DAY_SLOTS, ODSampler
+
+NODES_PATH = "dati/nodes.json"
+NODES_WITH_INDEX_PATH = "dati/nodes_with_indices.json"
+ARCS_PATH = "dati/arcs_bidirectional.json"
+NODI_PROB_PATH = "dati/nodi_prob.json"
+TRAFFIC_PATH = "dati/traffic_DEF_N.json"
+
+K = 3
+TOTAL_DEMAND = 19387
+NUM_BREAKPOINTS = 50
+UMAX = 4.0
+
+# Finestre temporali (generate_temporal_paths_15minuti.py)
+START_DAY_MINUTES = 360     # 6:00
+END_DAY_MINUTES = 1140      # 19:00
+SLOT_DURATION = 15
+SLOTS_PER_DAY = (END_DAY_MINUTES - START_DAY_MINUTES) // SLOT_DURATION  # 52
+SECOND_DAY_OFFSET = 54      # preferenza 1/2: partenza base + 54 slot
+
+
+def load_inputs(nodes_path=NODES_PATH, arcs_path=ARCS_PATH, prob_path=NODI_PROB_PATH, traffic_path=TRAFFIC_PATH):
+    """Network, node probabilities and traffic profile as read by the single-stage scripts"""
+    with open(nodes_path, "r", encoding="utf-8") as f:
+        nodes = json.load(f)["nodes"]
+    with open(arcs_path, "r", encoding="utf-8") as f:
+        arcs = json.load(f)["edges"]
+    with open(prob_path, "r") as f:
+        nodes_prob = json.load(f)
+    traffic = {}
+    if traffic_path:
+        with open(traffic_path, "r", encoding="utf-8") as f:
+            traffic = json.load(f)
+    return {"nodes": nodes, "arcs": arcs, "nodes_prob": nodes_prob, "traffic": traffic}
+
+
+def network(inputs):
+    """Graph weighted by distance and rounded free-flow minutes per arc (generate_paths_15minuti.py)"""
+    G = nx.DiGraph()
+    for n in inputs["nodes"]:
+        G.add_node(n["ID"], lat=n["lat"], lon=n["lon"])
+    minutes = {}
+    for a in inputs["arcs"]:
+        i, j = a["from_node"], a["to_node"]
+        maxspeed, distance = float(a["maxspeed"]), float(a["distance"])
+        fftt = 9999 if maxspeed == 0 else distance / maxspeed * 60
+        G.add_edge(i, j, weight=distance)
+        minutes[(i, j)] = round(fftt if fftt > 0 else 10.0)
+    return G, minutes
+
+
+def sample_trips(sampler, n, rng):
+    """Trip draws plus the departure days of each trip (0 = day 1, 1 = day 2)"""
+    s = sampler.sample(n, seed=rng)
+    base = s["real_departure_time"]
+    pref = s["preferences"]
+    # preferenza 0: [base], 1: [base + 54], 2: entrambe; slot <= 54 = giorno 1 (base + 54 solo se base = 0)
+    day_of_second = (base + SECOND_DAY_OFFSET > SECOND_DAY_OFFSET).astype(int)
+    s["days"] = [(0,) if p == 0 else (d,) if p == 1 else tuple(sorted({0, d}))
+                 for p, d in zip(pref.tolist(), day_of_second.tolist())]
+    return s
+
+
+def assign_demand(sampler, trips, total, rng):
+    """
+    Integer demand per trip proportional to p_gen * p_attr * U(0.8, 2.2),
+    at least 1, summing to total (rounding residue spread in random order).
+    """
+    p_gen = np.diff(sampler.cum_orig, prepend=0.0)[trips["origin"]]
+    p_attr = np.diff(sampler.cum_dest, prepend=0.0)[trips["destination"]]
+    weights = p_gen * p_attr * rng.uniform(0.8, 2.2, len(p_gen))
+    demand = np.maximum(1, np.rint(weights / weights.sum() * total)).astype(np.int64)
+    remaining = int(total - demand.sum())
+    order = rng.permutation(len(demand))
+    if remaining > 0:
+        q, r = divmod(remaining, len(demand))
+        demand += q
+        demand[order[:r]] += 1
+    while remaining < 0:
+        room = order[demand[order] > 1][:-remaining]
+        if not len(room):
+            break
+        demand[room] -= 1
+        remaining += len(room)
+    return demand
+
+
+def departure_window(travel_time, days):
+    """Departure slots (sorted, unique) from which a trip of travel_time minutes ends within its day"""
+    n_slots = max(0, (END_DAY_MINUTES - START_DAY_MINUTES - travel_time) // SLOT_DURATION + 1)
+    return sorted({k + d * SLOTS_PER_DAY for d in days for k in range(n_slots) if k + d * SLOTS_PER_DAY < 2 * SLOTS_PER_DAY})
+
+
+def path_preference(slots):
+    if not slots:
+        return "nessuno"
+    if max(slots) <= DAY_SLOTS - 1:
+        return "giorno1"
+    if min(slots) >= DAY_SLOTS:
+        return "giorno2"
+    return "entrambi"
+
+
+def attach_paths(trips, ids, G, minutes, k=K, workers=None):
+    """
+    Paths of every trip as (arcs, tempo, slots, preferenza) tuples.
+
+    Trips whose nodes are not in the network or with no path left get an
+    empty list (dropped from the workbook, as generate_temporal does).
+    """
+    od = list(zip(ids[trips["origin"]].tolist(), ids[trips["destination"]].tolist()))
+    pairs = [p for p in dict.fromkeys(od) if G.has_node(p[0]) and G.has_node(p[1])]
+    ksp = k_shortest_paths(G, pairs, k, weight="weight", workers=workers)
+
+    arc_paths = {}
+    for pair, node_paths in ksp.items():
+        entries = []
+        for nodes in node_paths:
+            arcs = [(nodes[j], nodes[j + 1]) for j in range(len(nodes) - 1)]
+            base = sum(minutes.get(a, 10) for a in arcs)
+            if base > 0:
+                entries.append((arcs, base))
+        arc_paths[pair] = entries
+
+    windows = {}
+    out = []
+    for pair, days in zip(od, trips["days"]):
+        key = (pair, days)
+        if key not in windows:
+            windows[key] = [(arcs, base, slots, path_preference(slots))
+                            for arcs, base in arc_paths.get(pair, [])
+                            for slots in [departure_window(round(base), days)]]
+        out.append(windows[key])
+    return out
+
+
+def workbook_frames(inputs, demand, paths, umax=UMAX, num_breakpoints=NUM_BREAKPOINTS):
+    """nodes / arcs / trips sheets in the layout of model/dataset.py"""
+    df_nodes = pd.DataFrame(inputs["nodes"])
+
+    arcs_list = []
+    for arc in inputs["arcs"]:
+        i, j = str(arc["from_node"]), str(arc["to_node"])
+        capacity = float(arc["capacity"])
+        fftt = max(0.05, float(arc["distance"]) / float(arc["maxspeed"]) * 60)
+        mu_15 = capacity / 4.0
+        x_vals = np.linspace(0, umax * mu_15, num_breakpoints + 1)
+        sigma_vals = (fftt * (x_vals + 0.03 * (x_vals ** 5) / ((mu_15 ** 4) + 1e-12))).round(3)
+        arc_traffic = inputs["traffic"].get(f"{i},{j}", {})
+        arcs_list.append({
+            "arc_id": f"{i}_{j}",
+            "from_node": i,
+            "to_node": j,
+            "capacity": capacity,
+            "fftt": round(fftt, 3),
+            "max_exogenous": round(max([float(v) for v in arc_traffic.values()] or [0]), 2),
+            "breakpoints": str(x_vals.tolist()),
+            "sigma_values": str(sigma_vals.tolist()),
+        })
+    df_arcs = pd.DataFrame(arcs_list)
+
+    trip_records = []
+    for dem, trip_paths in zip(demand.tolist(), paths):
+        if not trip_paths:
+            continue
+        row = {
+            "trip_id": len(trip_records),
+            "origin": trip_paths[0][0][0][0],
+            "destination": trip_paths[0][0][-1][1],
+            "demand": dem,
+        }
+        for p_id, (arcs, base, slots, pref) in enumerate(trip_paths):
+            row[f"path_{p_id}"] = ",".join(f"{a}_{b}" for a, b in arcs)
+            row[f"tempo_{p_id}"] = round(base, 2)
+            row[f"possible_departure_times_{p_id}"] = ",".join(map(str, slots))
+            row[f"preferenza_{p_id}"] = pref
+        trip_records.append(row)
+    df_trips = pd.DataFrame(trip_records)
+    return df_nodes, df_arcs, df_trips
+
+
+def build_dataset(n_trips, out_path, seed=0, total_demand=TOTAL_DEMAND, k=K, traffic_path=TRAFFIC_PATH,
+                  workers=None, inputs=None):
+    """
+    Generate a dataset workbook of n_trips sampled trips and its compiled cache.
+
+    Parameters:
+    -----------
+    n_trips : int
+        Trips sampled (trips without a usable path are dropped)
+    out_path : str
+        Workbook to write
+    seed : int
+        Seed of every random draw of the run
+    total_demand : int
+        Vehicles spread over the sampled trips
+    k : int
+        Paths per OD pair
+    traffic_path : str
+        Traffic profile for the max_exogenous column
+    workers : int, optional
+        Processes for the path search (path_cache / KSP_WORKERS)
+    inputs : dict, optional
+        load_inputs() result, reused across calls
+
+    Returns (df_nodes, df_arcs, df_trips).
+    """
+    timings = {}
+    t0 = time.time()
+    inputs = inputs or load_inputs(traffic_path=traffic_path)
+    sampler = ODSampler(inputs["nodes_prob"])
+    G, minutes = network(inputs)
+    rng = np.random.default_rng(seed)
+    timings["input"] = time.time() - t0
+
+    t0 = time.time()
+    trips = sample_trips(sampler, n_trips, rng)
+    demand = assign_demand(sampler, trips, total_demand, rng)
+    timings["trips"] = time.time() - t0
+
+    t0 = time.time()
+    paths = attach_paths(trips, sampler.ids, G, minutes, k=k, workers=workers)
+    timings["paths"] = time.time() - t0
+
+    t0 = time.time()
+    frames = workbook_frames(inputs, demand, paths)
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    with pd.ExcelWriter(out_path, engine="openpyxl") as writer:
+        frames[1].to_excel(writer, sheet_name="arcs", index=False)
+        frames[2].to_excel(writer, sheet_name="trips", index=False)
+        frames[0].to_excel(writer, sheet_name="nodes", index=False)
+    timings["workbook"] = time.time() - t0
+
+    t0 = time.time()
+    store_dataset(out_path, compile_frames(*frames))
+    timings["cache"] = time.time() - t0
+
+    df_trips = frames[2]
+    print(f"✅ Dataset {out_path}: {len(df_trips)} trip su {n_trips} campionati, "
+          f"domanda {int(df_trips['demand'].sum()):,}")
+    print("⏱️ " + ", ".join(f"{name} {sec:.2f}s" for name, sec in timings.items()))
+    return frames
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Dataset workbook + cache from the node probabilities in one pass")
+    ap.add_argument("--trips", type=int, required=True, help="Trips to sample")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--demand", type=int, default=TOTAL_DEMAND, help="Total demand")
+    ap.add_argument("--k", type=int, default=K, help="Paths per OD pair")
+    ap.add_argument("--traffic", type=str, default=TRAFFIC_PATH, help="Traffic profile (max_exogenous)")
+    ap.add_argument("--workers", type=int, default=None, help="Processes for the path search")
+    ap.add_argument("--out", type=str, default=None, help="Output workbook")
+    args = ap.parse_args()
+    out = args.out or f"./INPUT_DATASETS/dataset_{args.trips}.xlsx"
+    build_dataset(args.trips, out, seed=args.seed, total_demand=args.demand, k=args.k,
+                  traffic_path=args.traffic, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
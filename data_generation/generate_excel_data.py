@@ -1,5 +1,9 @@
 import json
 import pandas as pd
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from dataset_cache import load_dataset
 
 # === Percorsi dei file ===
 TRIPS_TEMPORAL_PATH = "dati/trips_with_paths_temporal_15minuti_10.json"
@@ -9,7 +13,6 @@ NODES_PATH = "dati/nodes_with_indices.json"
 OUTPUT_EXCEL = "output/dataset_10.xlsx"
 
 # Crea la cartella se non esiste
-import os
 os.makedirs(os.path.dirname(OUTPUT_EXCEL), exist_ok=True)
 
 # === 1. Foglio: ARCS ===
@@ -93,4 +96,7 @@ with pd.ExcelWriter(OUTPUT_EXCEL, engine='openpyxl') as writer:
     df_trips.to_excel(writer, sheet_name='trips', index=False)
     df_nodes.to_excel(writer, sheet_name='nodes', index=False)
 
-print(f"✅ File Excel generato: {OUTPUT_EXCEL}")
\ No newline at end of file
+print(f"✅ File Excel generato: {OUTPUT_EXCEL}")
+
+# Compile the cache right away so the first model build skips the Excel parse
+load_dataset(OUTPUT_EXCEL)
\ No newline at end of file
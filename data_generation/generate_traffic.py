@@ -1,126 +1,288 @@
+"""
+Background traffic (exogenous flow Z) of every arc and 15-minute slot.
+
+Each arc of the profile file has a time profile (morning, evening,
+camel_day) and a congestion level 1-10. All three profiles are computed
+at once on the 108 slots, and every traffic intensity M is applied to
+the whole arcs x slots matrix in one step. This replaces one run per M
+(arc_traffic_<level>.json) followed by dati/generate_traffic_DEF.py on
+each file. Given the same profile file, the values are the same:
+
+    factor = round(profile * level / 5 * M, 3)            arc_traffic_<level>.json
+    Z      = round(M * factor * capacity / 4, 2)           traffic_DEF_<L|N|H|null>.json
+
+The profile file (dati/traffic_profile.json) is required: without it the
+script stops, unless --default-profile explicitly gives every arc of
+--arcs camel_day at level 5. Output goes to --out-dir
+(dati/traffic_generated by default); copy files over the dati/ inputs
+deliberately, the script never writes there on its own.
+
+Optionally, --npz writes the same matrices to one compact array file,
+together with --scenarios Monte Carlo draws per level (perturb_traffic:
+unit-mean lognormal noise, AR(1) over the slots, plus an optional
+per-arc factor).
+
+Run from the repository root:
+
+    python data_generation/generate_traffic.py [--levels L=0.5,N=1,H=1.5,null=0]
+        [--out-dir dati/traffic_generated] [--default-profile] [--factors] [--npz dati/traffic_DEF.npz] [--scenarios 100 --sigma 0.1 --rho 0.8 --seed 0] [--plot]
+"""
+
+import argparse
 import json
+import os
+
 import numpy as np
-import matplotlib.pyplot as plt
 
 # === Parametri globali ===
 TIME_START = 0 * 60 + 0        # 0 minuti (00:00)
-TIME_END = 26 * 60 + 45        # 1605 minuti 
-MINUTES = list(range(TIME_START, TIME_END + 1, 15))  # 108 time slots
-M = 0.5  # Intensità globale del traffico 
-
-"""""
-M lo spossiamo cambiare se volessimo generare: 
-1. M = 0.5 --> low traffic 
-2. M = 1 --> normal traffic
-3. M  = 1.5 --> high traffic! 
-""""" 
+TIME_END = 26 * 60 + 45        # 1605 minuti
+MINUTES = np.arange(TIME_START, TIME_END + 1, 15)  # 108 time slots
+
+PROFILE_TYPES = ("morning", "evening", "camel_day")
+DEFAULT_PROFILE = "camel_day"
+DEFAULT_LEVEL = 5
+
+# Intensità globale del traffico M per livello (suffisso dei file traffic_DEF_*)
+LEVELS = {"L": 0.5, "N": 1.0, "H": 1.5, "null": 0.0}
+FACTOR_NAMES = {"L": "low", "N": "normal", "H": "high"}  # arc_traffic_<nome>.json
+
+PROFILE_PATH = "dati/traffic_profile.json"
+OUT_DIR = "dati/traffic_generated"
+ARCS_PATH = "dati/arcs_bidirectional.json"
+
+
+def py_round(a, decimals):
+    """
+    Python round() of every element. generate_traffic_DEF rounded the flows
+    as Python floats (read back from JSON); np.round scales by 10**decimals
+    first and moves ties like 12.925 the other way.
+    """
+    a = np.asarray(a, dtype=float)
+    return np.array([round(v, decimals) for v in a.ravel().tolist()]).reshape(a.shape)
+
+
 def smooth_step(x, x0, x1):
-    if x <= x0:
-        return 0.15
-    elif x >= x1:
-        return 1.0
-    else:
-        return 3*((x - x0)/(x1 - x0))**2 - 2*((x - x0)/(x1 - x0))**3
+    """Smoothstep from 0.15 (x <= x0) to 1 (x >= x1), elementwise"""
+    x = np.asarray(x, dtype=float)
+    s = (x - x0) / (x1 - x0)
+    return np.where(x <= x0, 0.15, np.where(x >= x1, 1.0, 3 * s ** 2 - 2 * s ** 3))
+
+
+def profile_matrix(minutes=MINUTES):
+    """
+    Congestion factor of every profile type on every slot.
+
+    Returns a (len(PROFILE_TYPES), len(minutes)) array rounded to 3 decimals.
+    """
+    t = np.asarray(minutes)
+    # Giorni lavorativi 6:00-19:00 (giorno 1 e giorno dopo), fuori traffico minimo
+    working = ((360 <= t) & (t <= 1140)) | ((360 + 1440 <= t) & (t <= 1140 + 1440))
+    t_in_day = t % 1440
+
+    morning = np.where((360 <= t_in_day) & (t_in_day <= 480), smooth_step(t_in_day, 360, 480),  # 6:00-8:00
+                       np.where((480 < t_in_day) & (t_in_day <= 600), smooth_step(600 - t_in_day, 0.15, 120),  # 8:00-10:00
+                                0.15))
+    evening = np.where((900 <= t_in_day) & (t_in_day <= 1050), smooth_step(t_in_day, 900, 1050),  # 15:00-17:30
+                       np.where((1050 < t_in_day) & (t_in_day <= 1140), smooth_step(1140 - t_in_day, 0.15, 90),  # 17:30-19:00
+                                0.15))
+    camel_day = np.maximum(morning, evening)
+
+    profiles = np.stack([morning, evening, camel_day])
+    return np.round(np.where(working, profiles, 0.15), 3)
+
 
 def create_profile(profile_type):
-    traffic = np.zeros(len(MINUTES))
-
-    for idx, t in enumerate(MINUTES):
-        # Ciclo su due giorni (ogni giorno è 13 ore = 52 time slots da 15 minuti)
-        day1_start = 6 * 60  # 360 minuti = 6:00
-        day1_end = 19 * 60   # 1140 minuti = 19:00
-        day2_start = day1_start + 1440  # 6:00 del giorno dopo
-        day2_end = day1_end + 1440      # 19:00 del giorno dopo
-
-        # Verifica se il tempo è dentro uno dei due giorni lavorativi
-        if (day1_start <= t <= day1_end) or (day2_start <= t <= day2_end):
-            # Usa l'orario relativo al giorno (ignora il giorno in sé)
-            t_in_day = t % 1440  # 1440 minuti = 24 ore
-
-            if profile_type == "morning":
-                if 360 <= t_in_day <= 480:  # 6:00–8:00
-                    traffic[idx] = smooth_step(t_in_day, 360, 480)
-                elif 480 < t_in_day <= 600:  # 8:00–10:00
-                    traffic[idx] = smooth_step(600 - t_in_day, 0.15, 120)
-                else:
-                    traffic[idx] = 0.15
-
-            elif profile_type == "evening":
-                if 900 <= t_in_day <= 1050:  # 15:00–17:30
-                    traffic[idx] = smooth_step(t_in_day, 900, 1050)
-                elif 1050 < t_in_day <= 1140:  # 17:30–19:00
-                    traffic[idx] = smooth_step(1140 - t_in_day, 0.15, 90)
-                else:
-                    traffic[idx] = 0.15
-
-            elif profile_type == "camel_day":
-                traffic_morning = smooth_step(t_in_day, 360, 480) if 360 <= t_in_day <= 600 else 0.15
-                if 480 < t_in_day <= 600:
-                    traffic_morning = smooth_step(600 - t_in_day, 0.15, 120)
-
-                traffic_evening = smooth_step(t_in_day, 900, 1050) if 900 <= t_in_day <= 1140 else 0.15
-                if 1050 < t_in_day <= 1140:
-                    traffic_evening = smooth_step(1140 - t_in_day, 0.15, 90)
-
-                traffic[idx] = max(traffic_morning, traffic_evening)
-
-        else:
-            # Fuori dall'orario lavorativo, traffico minimo
-            traffic[idx] = 0.15
-
-    return np.round(traffic, 3)
-
-# === Caricamento archi ===
-with open("dati/traffic_profile.json", "r") as f:
-    arcs_data = json.load(f)["edges"]
-
-arc_traffic = {}  
-
-for arc in arcs_data:
-    i, j = arc["from_node"], arc["to_node"]
-    profile = arc.get("traffic_profile", {}).get("time_profile", "camel_day")
-    level = arc.get("traffic_profile", {}).get("congestion_level", 5)
-
-    base = create_profile(profile)
-    scaling = level / 5
-    scaled = [round(p * scaling * M, 3) for p in base]
-
-    
-        # now JSON keys are the snapshot index 0…107
-    arc_traffic[f"{i},{j}"] = { str(idx): scaled[idx] for idx in range(len(MINUTES)) }
-
-# === Salvataggio ===
-#M = 0.5
-with open("dati/arc_traffic_low.json", "w") as f:
-    json.dump(arc_traffic, f, indent=2)
-
-#M = 1
-#with open("dati/arc_traffic_normal.json", "w") as f:
-#    json.dump(arc_traffic, f, indent=2)
-
-#M = 1.5
-#with open("dati/arc_traffic_high.json", "w") as f:
-#    json.dump(arc_traffic, f, indent=2)
-
-# === Plot ===
-import matplotlib.pyplot as plt
-
-profiles = ["morning", "evening", "camel_day"]
-
-for name in profiles:
-    y = create_profile(name)
-
-    fig, ax = plt.subplots(figsize=(10, 4))
-    ax.plot(MINUTES, y, label=name, color="steelblue")
-    ax.set_xticks(range(MINUTES[0], MINUTES[-1] + 1, 15))
-    ax.set_xticklabels([f"{h//60}:{h%60:02d}" for h in range(MINUTES[0], MINUTES[-1] + 1, 15)], rotation=45)
-    ax.set_title(f"Profilo di congestione: {name}")
-    ax.set_ylabel("Fattore di congestione (0–1)")
-    ax.set_xlabel("Orario")
-    ax.grid(True)
-    ax.legend()
-    plt.tight_layout()
-
-    # Salva immagine
-    plt.savefig(f"dati/profile_{name}.png")
-    plt.show()
+    """Congestion factor of one profile type on the 108 slots"""
+    return profile_matrix()[PROFILE_TYPES.index(profile_type)]
+
+
+def load_arcs(profile_path=PROFILE_PATH, arcs_path=ARCS_PATH, default_profile=False):
+    """
+    Arc keys, profile index, congestion level and capacity of the arcs of
+    profile_path that have a capacity in arcs_path.
+
+    A missing profile file raises FileNotFoundError; with default_profile
+    every arc of arcs_path gets camel_day at level 5 instead (the defaults
+    of a profile entry without traffic_profile).
+    """
+    with open(arcs_path, "r", encoding="utf-8") as f:
+        arcs_data = json.load(f)["edges"]
+    capacity = {(str(a["from_node"]), str(a["to_node"])): float(a["capacity"]) for a in arcs_data}
+
+    if os.path.exists(profile_path):
+        with open(profile_path, "r", encoding="utf-8") as f:
+            profile_data = json.load(f)["edges"]
+    elif default_profile:
+        print(f"⚠️ {profile_path} non trovato: {DEFAULT_PROFILE}, livello {DEFAULT_LEVEL} su tutti gli archi di {arcs_path}")
+        profile_data = arcs_data
+    else:
+        raise FileNotFoundError(f"❌ File non trovato: {profile_path} (--default-profile per {DEFAULT_PROFILE}, "
+                                f"livello {DEFAULT_LEVEL} su tutti gli archi)")
+
+    keys, kinds, levels, caps = [], [], [], []
+    missing = 0
+    for arc in profile_data:
+        i, j = str(arc["from_node"]), str(arc["to_node"])
+        if (i, j) not in capacity:
+            missing += 1
+            continue
+        tp = arc.get("traffic_profile", {})
+        keys.append(f"{i},{j}")
+        kinds.append(PROFILE_TYPES.index(tp.get("time_profile", DEFAULT_PROFILE)))
+        levels.append(float(tp.get("congestion_level", DEFAULT_LEVEL)))
+        caps.append(capacity[(i, j)])
+    if missing:
+        print(f"⚠️ {missing} archi del profilo senza capacità, esclusi")
+    return {"keys": keys, "profile": np.array(kinds, dtype=int),
+            "level": np.array(levels), "capacity": np.array(caps)}
+
+
+def traffic_levels(arcs, levels=LEVELS):
+    """
+    Factors and exogenous flows of every level.
+
+    Parameters:
+    -----------
+    arcs : dict
+        load_arcs() result
+    levels : dict
+        Level name -> intensity M
+
+    Returns (factors, flows): dicts level -> (arcs x slots) array.
+    """
+    base = profile_matrix()[arcs["profile"]] * (arcs["level"] / 5)[:, None]
+    scaled_cap = (arcs["capacity"] / 4.0)[:, None]  # veicoli/15min
+    factors, flows = {}, {}
+    for name, M in levels.items():
+        factors[name] = np.round(base * M, 3)
+        flows[name] = np.maximum(0.0, py_round(M * factors[name] * scaled_cap, 2))
+    return factors, flows
+
+
+def perturb_traffic(Z, n, sigma=0.1, rho=0.8, sigma_arc=0.0, seed=None):
+    """
+    Monte Carlo draws of a traffic matrix with unit-mean multiplicative noise.
+
+    The noise of a cell is exp(sigma * e - sigma^2 / 2), with e a stationary
+    AR(1) over the slots of each arc (correlation rho between consecutive
+    slots); sigma_arc adds a lognormal factor shared by all slots of an arc.
+
+    Parameters:
+    -----------
+    Z : array (arcs x slots)
+        Traffic around which to draw
+    n : int
+        Scenarios
+    sigma, rho : float
+        Std of the log-noise per cell and its slot-to-slot correlation
+    sigma_arc : float
+        Std of the log-factor per arc and scenario
+    seed : int or np.random.Generator, optional
+
+    Returns a float32 (n x arcs x slots) array.
+    """
+    rng = np.random.default_rng(seed)
+    Z = np.asarray(Z, dtype=float)
+    eps = np.empty((n,) + Z.shape)
+    eps[..., 0] = rng.standard_normal((n, Z.shape[0]))
+    innovation = np.sqrt(1.0 - rho ** 2)
+    for t in range(1, Z.shape[1]):
+        eps[..., t] = rho * eps[..., t - 1] + innovation * rng.standard_normal((n, Z.shape[0]))
+    log_noise = sigma * eps - 0.5 * sigma ** 2
+    if sigma_arc > 0:
+        log_noise += (sigma_arc * rng.standard_normal((n, Z.shape[0], 1)) - 0.5 * sigma_arc ** 2)
+    return (Z * np.exp(log_noise)).astype(np.float32)
+
+
+def to_json_dict(keys, matrix):
+    """{"i,j": {"0": v, ..., "107": v}} as read by model_MULTI.background_traffic"""
+    slots = [str(t) for t in range(matrix.shape[1])]
+    return {k: dict(zip(slots, row)) for k, row in zip(keys, matrix.tolist())}
+
+
+def write_json(path, data):
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+    print(f"💾 {path}: {len(data)} archi")
+
+
+def plot_profiles(out_dir):
+    import matplotlib.pyplot as plt
+
+    profiles = profile_matrix()
+    ticks = range(int(MINUTES[0]), int(MINUTES[-1]) + 1, 15)
+    for name, y in zip(PROFILE_TYPES, profiles):
+        fig, ax = plt.subplots(figsize=(10, 4))
+        ax.plot(MINUTES, y, label=name, color="steelblue")
+        ax.set_xticks(ticks)
+        ax.set_xticklabels([f"{h//60}:{h%60:02d}" for h in ticks], rotation=45)
+        ax.set_title(f"Profilo di congestione: {name}")
+        ax.set_ylabel("Fattore di congestione (0–1)")
+        ax.set_xlabel("Orario")
+        ax.grid(True)
+        ax.legend()
+        plt.tight_layout()
+
+        # Salva immagine
+        plt.savefig(os.path.join(out_dir, f"profile_{name}.png"))
+        plt.close(fig)
+
+
+def parse_levels(text):
+    """'L=0.5,N=1' -> {'L': 0.5, 'N': 1.0}"""
+    levels = {}
+    for item in text.split(","):
+        name, M = item.split("=")
+        levels[name.strip()] = float(M)
+    return levels
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Background traffic files of every level in one pass")
+    ap.add_argument("--profiles", default=PROFILE_PATH, help="Arcs with traffic_profile (time_profile, congestion_level)")
+    ap.add_argument("--arcs", default=ARCS_PATH, help="Arcs with capacity")
+    ap.add_argument("--default-profile", action="store_true",
+                    help=f"Without --profiles file, use {DEFAULT_PROFILE} at level {DEFAULT_LEVEL} on every arc")
+    ap.add_argument("--levels", type=parse_levels, default=LEVELS, help="Level=M list, e.g. L=0.5,N=1,H=1.5,null=0")
+    ap.add_argument("--out-dir", default=OUT_DIR, help="Output directory (never the dati/ inputs by default)")
+    ap.add_argument("--factors", action="store_true", help="Also write the arc_traffic_<level>.json factors")
+    ap.add_argument("--npz", default=None, help="Compact array file with every level (and scenarios)")
+    ap.add_argument("--scenarios", type=int, default=0, help="Perturbed draws per level stored in --npz")
+    ap.add_argument("--sigma", type=float, default=0.1)
+    ap.add_argument("--rho", type=float, default=0.8)
+    ap.add_argument("--sigma-arc", type=float, default=0.0)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--plot", action="store_true", help="Save the profile plots in --out-dir")
+    args = ap.parse_args()
+
+    arcs = load_arcs(args.profiles, args.arcs, args.default_profile)
+    factors, flows = traffic_levels(arcs, args.levels)
+    print(f"🧮 Traffico esogeno: {len(arcs['keys'])} archi x {len(MINUTES)} slot, livelli {args.levels}")
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    for name, Z in flows.items():
+        write_json(os.path.join(args.out_dir, f"traffic_DEF_{name}.json"), to_json_dict(arcs["keys"], Z))
+        if args.factors and name in FACTOR_NAMES:
+            write_json(os.path.join(args.out_dir, f"arc_traffic_{FACTOR_NAMES[name]}.json"),
+                       to_json_dict(arcs["keys"], factors[name]))
+        print(f"📊 {name}: media {Z.mean():.2f}, max {Z.max():.2f}, zeri {np.mean(Z < 1e-6):.1%}")
+
+    if args.npz:
+        rng = np.random.default_rng(args.seed)
+        bundle = {"arcs": np.array(arcs["keys"]), "levels": np.array(list(args.levels)),
+                  "M": np.array(list(args.levels.values())), "minutes": MINUTES}
+        for name, Z in flows.items():
+            bundle[f"Z_{name}"] = Z.astype(np.float32)
+            if args.scenarios > 0:
+                bundle[f"scenarios_{name}"] = perturb_traffic(Z, args.scenarios, args.sigma, args.rho,
+                                                              args.sigma_arc, rng)
+        np.savez_compressed(args.npz, **bundle)
+        print(f"💾 {args.npz}: {len(flows)} livelli, {args.scenarios} scenari per livello")
+
+    if args.plot:
+        plot_profiles(args.out_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,59 +1,22 @@
 import json
-import random
-random.seed(0)
+import sys
+import time
 
-# Load the probabilities
-with open("dati/nodi_prob.json", "r") as f:
-    nodes_prob = json.load(f)
+from trip_sampler import ODSampler
 
-# Create cumulative distributions
-origins = [(n["ID"], n["origin_prob"]) for n in nodes_prob if n["origin_prob"] > 0]
-destinations = [(n["ID"], n["dest_prob"]) for n in nodes_prob if n["dest_prob"] > 0]
+# Uso: python generate_trips.py [NUM_TRIPS] [SEED]
+NUM_TRIPS = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+SEED = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+OUTPUT_PATH = f"dati/trips_{NUM_TRIPS}.json"
 
-def weighted_choice(items):
-    """Sceglie un item in base alla sua probabilità"""
-    total = sum(w for _, w in items)
-    r = random.uniform(0, total)
-    upto = 0
-    for item, weight in items:
-        if upto + weight >= r:
-            return item
-        upto += weight
-    return items[-1][0]  # fallback
+# Campionamento vettoriale di origine, destinazione (!= origine), partenza e preferenza
+sampler = ODSampler.from_json("dati/nodi_prob.json")
+t0 = time.time()
+trips = sampler.trips(NUM_TRIPS, seed=SEED)
+print(f"[INFO] {NUM_TRIPS:,} richieste campionate in {time.time() - t0:.2f}s")
 
-# Genera le richieste
-NUM_TRIPS = 1
-trips = []
-for i in range(NUM_TRIPS):
-    origin = weighted_choice(origins)
-    dest = weighted_choice(destinations)
-    while dest == origin:
-        dest = weighted_choice(destinations)
+# Salva (indentato solo per set piccoli: l'encoder con indent non usa la versione C)
+with open(OUTPUT_PATH, "w") as f:
+    json.dump(trips, f, indent=4 if NUM_TRIPS <= 10000 else None)
 
-    # Departure time e day
-    departure_time = random.randint(0, 104) 
-    if departure_time <= 52:
-        day = 1
-        real_departure_time = departure_time  # tempo invariato
-    else:
-        day = 2
-        real_departure_time = departure_time -52   #  corrisponde a 0 del secondo giorno
-
-    # Preferences
-    preference = random.randint(0, 2)
-
-    trip = {
-        "ID": f"trip_{i+1}",
-        "origin": origin,
-        "destination": dest,
-        "departure_day": day,
-        "departure_time": real_departure_time,
-        "preferences": preference
-    }
-    trips.append(trip)
-
-# Salva
-with open("dati/trips_1.json", "w") as f:
-    json.dump(trips, f, indent=4)
-
-print("✅ Richieste generate in dati/trips_10.json")
+print(f"✅ Richieste generate in {OUTPUT_PATH}")
@@ -1,6 +1,9 @@
 import json
 import pandas as pd
 import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from dataset_cache import load_dataset
 
 # === CONFIGURAZIONE ===
 TRIPS_TEMPORAL_PATH = "dati/trips_with_paths_temporal_15minuti_1.json"
@@ -115,4 +118,7 @@ with pd.ExcelWriter(OUTPUT_EXCEL, engine='openpyxl') as writer:
     df_trips.to_excel(writer, sheet_name='trips', index=False)
     df_nodes.to_excel(writer, sheet_name='nodes', index=False)
 
-print(f"✅ File Excel generato: {OUTPUT_EXCEL}")
\ No newline at end of file
+print(f"✅ File Excel generato: {OUTPUT_EXCEL}")
+
+# Compile the cache right away so the first model build skips the Excel parse
+load_dataset(OUTPUT_EXCEL)
\ No newline at end of file
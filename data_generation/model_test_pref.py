@@ -1,6 +1,9 @@
 import json
 from pyomo.environ import *
-from collections import defaultdict
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from option_index import incidence_from_trips_json, trip_option_index
 
 # === Caricamento dati ===
 with open("dati/nodes_test.json") as f:
@@ -86,25 +89,14 @@ for c in TRIPS:
                 is_pref[c, p, t_int] = 1 if t_int == PREF[c] else 0
 
 model.CTP = Set(initialize=ctp_list, dimen=3)
+TRIP_OPTIONS = trip_option_index(ctp_list)
 model.is_pref = Param(model.CTP, initialize=is_pref, within=Binary)
 
 print("\n✅ CTP e preferenze caricate!")
 
 # === π_cpτ^{at} ===
-PI = defaultdict(int)
-for c in TRIPS:
-    for p, path in enumerate(trips_data[c]["paths"]):
-        arcs = [(a[0], a[1]) for a in path["arcs"]]
-        fftts = path["base_times"]
-        for tau in path["possible_departure_times"]:
-            t = int(tau)
-            if f"{c}_{p}_{t}" not in c_cost_data:
-                continue
-            for (a, tt) in zip(arcs, fftts):
-                for offset in range(tt):
-                    snapshot = t + offset
-                    if snapshot in TIME:
-                        PI[c, p, t, a, snapshot] = 1
+ARC_POS = {a: n for n, a in enumerate(ARCS)}
+PI = incidence_from_trips_json(trips_data, ARCS, ctp_list, TIME)
 
 print("\n✅ π_cpt caricati!")
 
@@ -146,13 +138,12 @@ print("\n✅ Parametri costo caricati!")
 # === Vincoli ===
 
 def demand_rule(m, c):
-    return sum(m.y[c, p, tau] for (c2, p, tau) in m.CTP if c2 == c) == m.dem[c]
+    return sum(m.y[opt] for opt in TRIP_OPTIONS.get(c, [])) == m.dem[c]
 model.demand_satisfied = Constraint(model.C, rule=demand_rule)
 
 def flow_rule(m, i, j, t):
     return m.x[i, j, t] == m.Z[i, j, t] + sum(
-        PI[c, p, tau, (i, j), t] * m.y[c, p, tau]
-        for (c, p, tau) in m.CTP if (c, p, tau, (i, j), t) in PI
+        m.y[ctp_list[o]] for o in PI.options_of(ARC_POS[(i, j)], t - TIME[0]).tolist()
     )
 model.flow_def = Constraint(model.A * model.T, rule=flow_rule)
 
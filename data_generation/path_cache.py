@@ -0,0 +1,115 @@
+"""
+Persistent K-shortest-path table for the path generators.
+
+nx.shortest_simple_paths (Yen, pure Python) is by far the slowest step of
+generate_paths_15minuti.py, and trips repeat the same OD pairs many times.
+k_shortest_paths returns the K shortest simple paths of every requested
+(origin, destination) pair from a table on disk, and computes only the
+pairs the table does not have yet, in a process pool.
+
+One table per (K, weight attribute, graph hash), pickled as
+{(origin, destination): [node list, ...]} (empty list: no path). The graph
+hash covers nodes, edges and weights, so a changed network never reuses an
+old table. Tables live in dati/.ksp_cache unless KSP_CACHE_DIR is set;
+KSP_CACHE=0 disables them, KSP_WORKERS caps the pool (default: all cores).
+"""
+
+import hashlib
+import os
+import pathlib
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import networkx as nx
+
+CACHE_VERSION = 1
+MIN_PARALLEL = 32  # below this many missing pairs the pool costs more than it saves
+
+_G = None  # graph of the worker processes
+
+
+def graph_hash(G, weight="weight"):
+    """SHA-1 of the node list and the weighted edge list of G"""
+    h = hashlib.sha1()
+    for n in sorted(G.nodes, key=str):
+        h.update(f"n{n};".encode())
+    for u, v, w in sorted(G.edges(data=weight), key=lambda e: (str(e[0]), str(e[1]))):
+        h.update(f"e{u},{v},{w!r};".encode())
+    return h.hexdigest()
+
+
+def _cache_file(K, weight, digest):
+    cache_dir = pathlib.Path(os.getenv("KSP_CACHE_DIR", "dati/.ksp_cache"))
+    return cache_dir / f"ksp.v{CACHE_VERSION}.K{K}.{weight}.{digest[:16]}.pkl"
+
+
+def _paths(G, origin, destination, K, weight):
+    if not G.has_node(origin) or not G.has_node(destination):
+        return []
+    try:
+        return [list(p) for p in islice(nx.shortest_simple_paths(G, origin, destination, weight=weight), K)]
+    except nx.NetworkXNoPath:
+        return []
+
+
+def _init_worker(G):
+    global _G
+    _G = G
+
+
+def _worker(args):
+    origin, destination, K, weight = args
+    return _paths(_G, origin, destination, K, weight)
+
+
+def k_shortest_paths(G, od_pairs, K, weight="weight", workers=None):
+    """
+    K shortest simple paths of each OD pair, from the persisted table.
+
+    Parameters:
+    -----------
+    G : nx.DiGraph
+    od_pairs : iterable of (origin, destination)
+        Pairs needed; duplicates are looked up once
+    K : int
+        Paths per pair
+    weight : str
+        Edge attribute minimized
+    workers : int, optional
+        Processes for the missing pairs; defaults to KSP_WORKERS / all cores
+
+    Returns:
+    --------
+    dict (origin, destination) -> list of node lists, shortest first
+    """
+    pairs = list(dict.fromkeys(od_pairs))
+    use_cache = os.getenv("KSP_CACHE", "1") != "0"
+    target = _cache_file(K, weight, graph_hash(G, weight))
+    table = {}
+    if use_cache and target.exists():
+        with open(target, "rb") as f:
+            table = pickle.load(f)
+
+    missing = [od for od in pairs if od not in table]
+    print(f"[INFO] K-shortest paths: {len(pairs)} coppie OD, {len(pairs) - len(missing)} in cache, "
+          f"{len(missing)} da calcolare")
+    if missing:
+        workers = workers or int(os.getenv("KSP_WORKERS", "0")) or os.cpu_count() or 1
+        if workers > 1 and len(missing) >= MIN_PARALLEL:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(G,)) as pool:
+                found = list(pool.map(_worker, [(o, d, K, weight) for o, d in missing],
+                                      chunksize=max(1, len(missing) // (4 * workers))))
+        else:
+            found = [_paths(G, o, d, K, weight) for o, d in missing]
+        table.update(zip(missing, found))
+
+        if use_cache:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            tmp = target.with_name(target.name + ".tmp")
+            with open(tmp, "wb") as f:
+                pickle.dump(table, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, target)
+            print(f"💾 Cache K-shortest paths: {target} ({len(table)} coppie)")
+
+    return {od: table[od] for od in pairs}
@@ -0,0 +1,95 @@
+"""
+Vectorized sampler of trip requests from the node probabilities.
+
+ODSampler draws N trips at once from the origin_prob / dest_prob weights
+of dati/nodi_prob.json: origins and destinations by binary search on the
+cumulative weights, destinations equal to their origin redrawn over the
+array until none is left, departure slot (0-104, split into day 1 / day 2
+as in generate_trips.py) and preference (0-2) uniformly. Each call with a
+seed is reproducible.
+
+    sampler = ODSampler.from_json("dati/nodi_prob.json")
+    trips = sampler.trips(100_000, seed=0)      # list of generate_trips dicts
+    arrays = sampler.sample(100_000, seed=0)    # the same draws as arrays
+"""
+
+import json
+
+import numpy as np
+
+N_DEPARTURES = 105  # departure slots 0..104 over the two days
+DAY_SLOTS = 52      # day 1: slots 0..52, day 2 starts at 53 (= slot 1 of the second day)
+N_PREFERENCES = 3
+
+
+class ODSampler:
+    """
+    Trip sampler over the nodes of a probability table.
+
+    Parameters:
+    -----------
+    nodes_prob : list of dict
+        Entries with ID, origin_prob and dest_prob (dati/nodi_prob.json);
+        nodes with zero weight are never drawn
+    """
+
+    def __init__(self, nodes_prob):
+        self.ids = np.array([str(n["ID"]) for n in nodes_prob])
+        p_orig = np.array([float(n["origin_prob"]) for n in nodes_prob])
+        p_dest = np.array([float(n["dest_prob"]) for n in nodes_prob])
+        if not np.any(p_orig > 0):
+            raise ValueError("No node with origin_prob > 0")
+        if np.count_nonzero(p_dest > 0) < 2:
+            raise ValueError("At least two nodes with dest_prob > 0 are needed (destination != origin)")
+        self.cum_orig = np.cumsum(np.clip(p_orig, 0.0, None))
+        self.cum_dest = np.cumsum(np.clip(p_dest, 0.0, None))
+
+    @classmethod
+    def from_json(cls, filepath="dati/nodi_prob.json"):
+        with open(filepath, "r") as f:
+            return cls(json.load(f))
+
+    @staticmethod
+    def _draw(cum, u):
+        # first node whose cumulative weight exceeds u * total (u in [0, 1)); a zero-weight
+        # node repeats the previous value and is never the first to exceed it
+        return np.minimum(np.searchsorted(cum, u * cum[-1], side="right"), len(cum) - 1)
+
+    def sample(self, n, seed=None):
+        """
+        Draw n trips as arrays.
+
+        Returns:
+        --------
+        dict with origin, destination (node indices into self.ids),
+        departure_time (0-104), departure_day (1/2), real_departure_time
+        (slot within the day) and preferences (0-2)
+        """
+        rng = np.random.default_rng(seed)
+        origin = self._draw(self.cum_orig, rng.random(n))
+        dest = self._draw(self.cum_dest, rng.random(n))
+        clash = np.flatnonzero(dest == origin)
+        while len(clash):
+            dest[clash] = self._draw(self.cum_dest, rng.random(len(clash)))
+            clash = clash[dest[clash] == origin[clash]]
+
+        departure = rng.integers(0, N_DEPARTURES, n)
+        day2 = departure > DAY_SLOTS
+        return {
+            "origin": origin,
+            "destination": dest,
+            "departure_time": departure,
+            "departure_day": np.where(day2, 2, 1),
+            "real_departure_time": np.where(day2, departure - DAY_SLOTS, departure),
+            "preferences": rng.integers(0, N_PREFERENCES, n),
+        }
+
+    def trips(self, n, seed=None, first_id=1):
+        """n trips as the request dicts written by generate_trips.py"""
+        s = self.sample(n, seed)
+        return [{"ID": f"trip_{first_id + k}", "origin": o, "destination": d, "departure_day": day,
+                 "departure_time": t, "preferences": p}
+                for k, (o, d, day, t, p) in enumerate(zip(
+                    self.ids[s["origin"]].tolist(), self.ids[s["destination"]].tolist(),
+                    s["departure_day"].tolist(), s["real_departure_time"].tolist(),
+                    s["preferences"].tolist()))]
@@ -0,0 +1,237 @@
+"""
+Compiled cache of the dataset workbooks.
+
+Reading nodes/arcs/trips with openpyxl and parsing path_k /
+possible_departure_times_k row by row is by far the slowest part of loading
+an instance. The first load of a workbook compiles it into a .npz bundle
+of plain arrays; later loads read the bundle directly:
+
+    arc_from, arc_to, arc_capacity, arc_fftt   one entry per arc (sheet order,
+                                               followed by arcs that appear only
+                                               in paths; n_sheet_arcs marks the split)
+    node_id
+    trip_id, trip_demand, trip_ptr             trip -> its paths (CSR)
+    path_k, path_tempo, path_pref              one entry per kept path
+    path_arc_ptr, path_arcs                    path -> arc indices (CSR)
+    path_dep_ptr, path_dep                     path -> sorted departure slots (CSR)
+
+Bundles are keyed by the SHA-1 of the workbook, so editing or regenerating
+a workbook invalidates its cache automatically. The file name also carries
+a hash of the workbook's folder, so same-named workbooks from different
+folders can share a cache directory. Bundles live in
+<workbook dir>/.dataset_cache unless DATASET_CACHE_DIR is set;
+DATASET_CACHE=0 disables the cache.
+
+read_excel_cached gives the same treatment to plain sheet reads (pickled
+DataFrames) for the analysis scripts that need whole sheets.
+"""
+
+import hashlib
+import os
+import pathlib
+
+import numpy as np
+import pandas as pd
+
+CACHE_VERSION = 1
+
+
+def _num(x):
+    if x is None or (isinstance(x, float) and np.isnan(x)):
+        return 0.0
+    s = str(x).strip().replace(" ", "")
+    if s.count(",") == 1 and s.count(".") == 0:
+        s = s.replace(",", ".")
+    elif s.count(".") > 1 and "," not in s:
+        s = s.replace(".", "")
+    elif s.count(",") > 1 and "." not in s:
+        s = s.replace(",", "")
+    return float(s)
+
+def _parse_path_string(pstr):
+    arcs = []
+    if pstr is None or (isinstance(pstr, float) and np.isnan(pstr)):
+        return arcs
+    for tok in str(pstr).split(","):
+        tok = tok.strip()
+        if not tok or "_" not in tok:
+            continue
+        a, b = tok.split("_")
+        arcs.append((str(a), str(b)))
+    return arcs
+
+def _parse_int_list(csv_like):
+    if csv_like is None or (isinstance(csv_like, float) and np.isnan(csv_like)):
+        return []
+    out = []
+    for s in str(csv_like).split(","):
+        s = s.strip()
+        if not s:
+            continue
+        try:
+            out.append(int(float(s)))
+        except:
+            pass
+    return out
+
+
+def workbook_hash(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _cache_file(xls_path, digest, suffix):
+    """Bundle path: workbook stem, a hash of its resolved folder, cache version and content hash"""
+    path = pathlib.Path(xls_path)
+    cache_dir = pathlib.Path(os.getenv("DATASET_CACHE_DIR", path.parent / ".dataset_cache"))
+    folder = hashlib.sha1(str(path.resolve().parent).encode()).hexdigest()[:8]
+    return cache_dir / f"{path.stem}.{folder}.v{CACHE_VERSION}.{digest[:16]}{suffix}"
+
+
+def _store(target, write):
+    """Write through a temporary file and drop older bundles of the same workbook"""
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(target.name + ".tmp")
+    write(tmp)
+    os.replace(tmp, target)
+    # key = stem + folder hash: the content digest and suffix never contain ".v"
+    key, tail = target.name.rsplit(".v", 1)
+    suffix = tail.split(".", 2)[2]
+    for old in target.parent.glob(f"*.{suffix}"):
+        if old != target and old.name.rsplit(".v", 1)[0] == key:
+            old.unlink(missing_ok=True)
+
+
+def compile_workbook(xls_path):
+    """Parse the nodes/arcs/trips sheets of a workbook into the cached array layout"""
+    df_nodes = pd.read_excel(xls_path, sheet_name="nodes")
+    df_arcs = pd.read_excel(xls_path, sheet_name="arcs")
+    df_trips = pd.read_excel(xls_path, sheet_name="trips")
+    return compile_frames(df_nodes, df_arcs, df_trips)
+
+
+def compile_frames(df_nodes, df_arcs, df_trips):
+    """
+    The cached array layout of nodes/arcs/trips sheets as DataFrames.
+
+    Paths follow the rules of model_MULTI.read_dataset: scanning stops at
+    the first path_k without a path or tempo, paths whose arcs do not parse
+    or that have no departure slot are skipped.
+    """
+    arc_keys = [(str(a), str(b)) for a, b in zip(df_arcs["from_node"], df_arcs["to_node"])]
+    arc_pos = {a: n for n, a in enumerate(arc_keys)}
+    n_sheet_arcs = len(arc_keys)
+    capacity = [_num(v) for v in df_arcs["capacity"]]
+    fftt = [_num(v) for v in df_arcs["fftt"]]
+
+    trip_ptr, path_k, path_tempo, path_pref = [0], [], [], []
+    path_arc_ptr, path_arcs, path_dep_ptr, path_dep = [0], [], [0], []
+    for row in df_trips.to_dict("records"):
+        k = 0
+        while f"path_{k}" in row:
+            pstr = row.get(f"path_{k}", None)
+            tcol = f"tempo_{k}"
+            if pd.isna(pstr) or tcol not in row or pd.isna(row[tcol]):
+                break
+            arcs_on_path = _parse_path_string(pstr)
+            dep_times = sorted(set(_parse_int_list(row.get(f"possible_departure_times_{k}", ""))))
+            if arcs_on_path and dep_times:
+                for a in arcs_on_path:
+                    if a not in arc_pos:
+                        arc_pos[a] = len(arc_keys)
+                        arc_keys.append(a)
+                        capacity.append(0.0)
+                        fftt.append(0.0)
+                path_arcs.extend(arc_pos[a] for a in arcs_on_path)
+                path_arc_ptr.append(len(path_arcs))
+                path_dep.extend(dep_times)
+                path_dep_ptr.append(len(path_dep))
+                path_k.append(k)
+                path_tempo.append(float(pd.to_numeric(row[tcol], errors="coerce")))
+                path_pref.append(str(row.get(f"preferenza_{k}", "entrambi")).strip())
+            k += 1
+        trip_ptr.append(len(path_k))
+
+    return {
+        "version": np.int64(CACHE_VERSION),
+        "n_sheet_arcs": np.int64(n_sheet_arcs),
+        "arc_from": np.array([a for a, b in arc_keys], dtype=str),
+        "arc_to": np.array([b for a, b in arc_keys], dtype=str),
+        "arc_capacity": np.array(capacity, dtype=float),
+        "arc_fftt": np.array(fftt, dtype=float),
+        "node_id": df_nodes["ID"].astype(str).to_numpy(dtype=str),
+        "trip_id": df_trips["trip_id"].astype(np.int64).to_numpy(),
+        "trip_demand": df_trips["demand"].astype(float).to_numpy(),
+        "trip_ptr": np.array(trip_ptr, dtype=np.int64),
+        "path_k": np.array(path_k, dtype=np.int64),
+        "path_tempo": np.array(path_tempo, dtype=float),
+        "path_pref": np.array(path_pref, dtype=str),
+        "path_arc_ptr": np.array(path_arc_ptr, dtype=np.int64),
+        "path_arcs": np.array(path_arcs, dtype=np.int64),
+        "path_dep_ptr": np.array(path_dep_ptr, dtype=np.int64),
+        "path_dep": np.array(path_dep, dtype=np.int64),
+    }
+
+
+def load_dataset(xls_path, refresh=False):
+    """
+    Compiled arrays of a dataset workbook, from the cache when it is current.
+
+    Parameters:
+    -----------
+    xls_path : str
+        Workbook with nodes/arcs/trips sheets
+    refresh : bool
+        Recompile even if a current bundle exists
+    """
+    if os.getenv("DATASET_CACHE", "1") == "0":
+        return compile_workbook(xls_path)
+    target = _cache_file(xls_path, workbook_hash(xls_path), ".npz")
+    if target.exists() and not refresh:
+        with np.load(target, allow_pickle=False) as bundle:
+            return {k: bundle[k] for k in bundle.files}
+    data = compile_workbook(xls_path)
+    store_dataset(xls_path, data, target)
+    return data
+
+
+def store_dataset(xls_path, data, target=None):
+    """
+    Store compiled arrays as the bundle of the current xls_path, e.g. from
+    compile_frames on the frames a generator just wrote (no re-parse).
+    """
+    if os.getenv("DATASET_CACHE", "1") == "0":
+        return
+    target = target or _cache_file(xls_path, workbook_hash(xls_path), ".npz")
+    def write(tmp):
+        with open(tmp, "wb") as f:
+            np.savez(f, **data)
+    _store(target, write)
+    print(f"💾 Dataset cache written: {target}")
+
+
+def read_excel_cached(xls_path, sheet_name=0):
+    """
+    pd.read_excel for whole sheets, memoized on disk by workbook hash.
+
+    sheet_name accepts a sheet name/index or a list of them, with the same
+    return types as pd.read_excel.
+    """
+    if os.getenv("DATASET_CACHE", "1") == "0":
+        return pd.read_excel(xls_path, sheet_name=sheet_name)
+    target = _cache_file(xls_path, workbook_hash(xls_path), ".sheets.pkl")
+    sheets = pd.read_pickle(target) if target.exists() else {}
+
+    wanted = sheet_name if isinstance(sheet_name, list) else [sheet_name]
+    missing = [s for s in wanted if s not in sheets]
+    if missing:
+        read = pd.read_excel(xls_path, sheet_name=missing)
+        sheets.update(read)
+        _store(target, lambda tmp: pd.to_pickle(sheets, tmp))
+
+    if isinstance(sheet_name, list):
+        return {s: sheets[s] for s in sheet_name}
+    return sheets[sheet_name]
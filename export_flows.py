@@ -6,9 +6,10 @@ Run this AFTER your solve_1.py completes
 
 import pandas as pd
 import json
-from pyomo.environ import value
 
-def export_time_specific_flows(model, ARCS, TIME_SLOTS, output_file="arc_flows_by_time.json"):
+from solution_report import flow_array
+
+def export_time_specific_flows(model, ARCS, TIME_SLOTS, output_file="arc_flows_by_time.json", flows=None):
     """
     Export arc flows for each time slot to JSON
     
@@ -18,26 +19,18 @@ def export_time_specific_flows(model, ARCS, TIME_SLOTS, output_file="arc_flows_b
     ARCS : List of (from, to) tuples
     TIME_SLOTS : List of time slot indices
     output_file : Output JSON filename
+    flows : optional (arcs x slots) array, e.g. extract_solution(model)["x"];
+            read from model.x in bulk when not given
     """
     print("\n" + "="*60)
     print("EXPORTING TIME-SPECIFIC FLOW DATA")
     print("="*60)
     
-    flows_by_time = {}
-    
-    for (i, j) in ARCS:
-        arc_key = f"{i},{j}"
-        flows_by_time[arc_key] = {}
-        
-        for t in TIME_SLOTS:
-            try:
-                flow = value(model.x[i, j, t], exception=False)
-                if flow is not None:
-                    flows_by_time[arc_key][str(t)] = float(flow)
-                else:
-                    flows_by_time[arc_key][str(t)] = 0.0
-            except:
-                flows_by_time[arc_key][str(t)] = 0.0
+    if flows is None:
+        flows = flow_array(model, ARCS, TIME_SLOTS)
+    slot_keys = [str(t) for t in TIME_SLOTS]
+    flows_by_time = {f"{i},{j}": dict(zip(slot_keys, row))
+                     for (i, j), row in zip(ARCS, flows.tolist())}
     
     # Save to JSON
     with open(output_file, 'w', encoding='utf-8') as f:
@@ -51,9 +44,10 @@ def export_time_specific_flows(model, ARCS, TIME_SLOTS, output_file="arc_flows_b
     return flows_by_time
 
 
-def export_to_excel_with_time(model, ARCS, TIME_SLOTS, FFTT, CAPACITY, output_file="arc_flows_detailed.xlsx"):
+def export_to_excel_with_time(model, ARCS, TIME_SLOTS, FFTT, CAPACITY, output_file="arc_flows_detailed.xlsx", flows=None):
     """
     Export detailed arc flows to Excel with separate columns for key time slots
+    (flows as in export_time_specific_flows)
     """
     print("\n" + "="*60)
     print("EXPORTING DETAILED FLOW DATA TO EXCEL")
@@ -64,19 +58,13 @@ def export_to_excel_with_time(model, ARCS, TIME_SLOTS, FFTT, CAPACITY, output_fi
     # Time slots we care about (8AM, 12PM, 6PM)
     key_slots = [8, 24, 48]
     
-    for (i, j) in ARCS:
+    if flows is None:
+        flows = flow_array(model, ARCS, TIME_SLOTS)
+
+    for (i, j), flows_all in zip(ARCS, flows.tolist()):
         ff = FFTT.get((i, j), 0)
         mu = CAPACITY.get((i, j), 0)
         
-        # Get flows at all time slots
-        flows_all = []
-        for t in TIME_SLOTS:
-            try:
-                flow = value(model.x[i, j, t], exception=False)
-                flows_all.append(flow if flow is not None else 0.0)
-            except:
-                flows_all.append(0.0)
-        
         # Get flows at key times
         flow_8am = flows_all[8] if len(flows_all) > 8 else 0.0
         flow_12pm = flows_all[24] if len(flows_all) > 24 else 0.0
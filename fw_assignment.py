@@ -0,0 +1,299 @@
+"""
+LP-free assignment engine for the MULTI model: Frank-Wolfe / MSA in NumPy.
+
+Solves the same problem as model_MULTI.create_model with the exact BPR
+functions instead of the PWL approximation:
+
+    min  sum_k sigma_k(x_k) + PEN_DEM * sum_c r_c + PEN_TTI * sum_k (x_k - cap_k)+
+    s.t. x = Z + A y,   sum_{o in c} y_o + r_c = dem_c,   y, r >= 0
+
+with cell k = (arc, slot), sigma_k = bpr_sigma_arc / dur (the Beckmann term
+of the eta PWL), A the option -> cell incidence of build_instance and
+cap_k = u_max * mu. The gradient of sigma_k is the per-cell latency u_lat,
+so the fixed point is the time-dependent user equilibrium over CTP options,
+with unmet demand r acting as a dummy option priced at PEN_DEM.
+
+Usage: XLS_PATH=... python fw_assignment.py
+    FW_METHOD   "fw" (bisection line search, default) or "msa" (step 1/k)
+    FW_MAX_ITER maximum number of iterations (default 200)
+    FW_GAP      relative gap to stop at (default 1e-4)
+    FW_OUT      output workbook (default solution_FW.xlsx)
+    UE_TIME_DEPENDENT=1  carry per-(arc, slot) effective times between UE iterations
+    UE_RULE / UE_DAMPING / UE_MEMORY / UE_GAP  outer-loop update and stop rule (ue_update.py)
+"""
+
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from model_MULTI import build_instance, option_travel_times, read_dataset, trip_best_times
+from solution_report import (arc_statistics, bpr_latency, effective_time_matrix,
+                             effective_times_from_flows, summary_frame)
+from ue_update import TravelTimeUpdate, fixed_point_residual, relative_gap
+
+
+def fw_arrays(inst):
+    """
+    Flatten an instance from build_instance into the arrays used by solve_fw.
+
+    Returns:
+    --------
+    dict with the cell x option incidence "A", background "Z", per-cell
+    BPR data (ff, mu, dur, cap), the option -> trip map and the demands
+    """
+    ARCS, TIME_SLOTS, TRIPS, ctp_set = inst["ARCS"], inst["TIME_SLOTS"], inst["TRIPS"], inst["ctp_set"]
+    nA, nT, nO = len(ARCS), len(TIME_SLOTS), len(ctp_set)
+    inc = inst["INCIDENCE"]
+    trip_index = {c: n for n, c in enumerate(TRIPS)}
+
+    A = sparse.csr_matrix((np.ones(len(inc.opt_cells)), (inc.opt_cells, inc.opt_of_entry)),
+                          shape=(nA * nT, nO))
+
+    Z = inst["Z"].astype(float)
+
+    ff = np.array([inst["FFTT"][a] for a in ARCS], dtype=float)
+    mu = np.array([inst["CAPACITY"][a] for a in ARCS], dtype=float)
+    dur = np.array([inst["ARC_DURATION"][a] for a in ARCS], dtype=float)
+
+    return {
+        "A": A, "AT": A.T.tocsr(), "Z": Z.ravel(),
+        "ff": np.repeat(ff, nT), "mu": np.repeat(mu, nT), "dur": np.repeat(dur, nT),
+        "cap": np.repeat(inst["u_max"] * mu, nT),
+        "opt_trip": np.fromiter((trip_index[c] for (c, p, tau) in ctp_set), dtype=np.int64, count=nO),
+        "dem": np.array([inst["TRIPS_DATA"][c]["demand"] for c in TRIPS], dtype=float),
+        "pen_dem": inst["PEN_DEM"] / inst["OBJ_SCALE"],
+        "pen_tti": inst["PEN_TTI"] / inst["OBJ_SCALE"] if inst["RELAX_TTI"] else 0.0,
+        "shape": (nA, nT),
+    }
+
+
+def _cell_cost(fa, x):
+    """Marginal cost of each cell: latency / dur plus the over-capacity penalty"""
+    return bpr_latency(fa["ff"], fa["mu"], x) / fa["dur"] + fa["pen_tti"] * (x > fa["cap"])
+
+
+def _beckmann(fa, x):
+    """Per-cell Beckmann term bpr_sigma_arc / dur (the eta of the LP)"""
+    mu = fa["mu"]
+    sigma = np.where(mu > 0, fa["ff"] * (x + 0.15 * x ** 5 / (5.0 * np.where(mu > 0, mu, 1.0) ** 4)),
+                     fa["ff"] * x)
+    return sigma / fa["dur"]
+
+
+def _objective(fa, x, r):
+    return (_beckmann(fa, x).sum() + fa["pen_tti"] * np.maximum(x - fa["cap"], 0.0).sum()
+            + fa["pen_dem"] * r.sum())
+
+
+def _all_or_nothing(fa, opt_cost):
+    """Cheapest option per trip, or the unmet-demand dummy if that is cheaper"""
+    nO, nC = len(opt_cost), len(fa["dem"])
+    order = np.lexsort((opt_cost, fa["opt_trip"]))
+    trips = fa["opt_trip"][order]
+    first = order[np.flatnonzero(np.r_[True, trips[1:] != trips[:-1]])]
+    best_cost = np.full(nC, np.inf)
+    best_cost[fa["opt_trip"][first]] = opt_cost[first]
+    take = opt_cost[first] < fa["pen_dem"]
+
+    y = np.zeros(nO)
+    y[first[take]] = fa["dem"][fa["opt_trip"][first[take]]]
+    r = fa["dem"].copy()
+    r[fa["opt_trip"][first[take]]] = 0.0
+    return y, r, np.minimum(best_cost, fa["pen_dem"])
+
+
+def _line_search(fa, x, dx, r, dr, tol=1e-6):
+    """Bisection on the directional derivative of the objective over [0, 1]"""
+    def slope(a):
+        return _cell_cost(fa, x + a * dx) @ dx + fa["pen_dem"] * dr.sum()
+
+    if slope(1.0) <= 0:
+        return 1.0
+    lo, hi = 0.0, 1.0
+    while hi - lo > tol:
+        mid = 0.5 * (lo + hi)
+        if slope(mid) > 0:
+            hi = mid
+        else:
+            lo = mid
+    return 0.5 * (lo + hi)
+
+
+def solve_fw(inst, method=None, max_iter=None, gap=None, y0=None, verbose=True):
+    """
+    Frank-Wolfe (or MSA) on the Beckmann/TSTT objective.
+
+    Parameters:
+    -----------
+    inst : dict
+        Instance data returned by model_MULTI.build_instance
+    method : str, optional
+        "fw" or "msa"; defaults to FW_METHOD
+    max_iter, gap : optional
+        Iteration limit and relative-gap target; default to FW_MAX_ITER / FW_GAP
+    y0 : array, optional
+        Starting option flows (e.g. a previous solution); all-or-nothing at
+        free-flow costs if None
+
+    Returns:
+    --------
+    dict with option flows "y", unmet demand "r", cell flows "x"
+    (arcs x slots), option travel times "TT", the objective, the
+    relative gap and per-iteration history
+    """
+    method = (method or os.getenv("FW_METHOD", "fw")).lower()
+    max_iter = int(max_iter or os.getenv("FW_MAX_ITER", "200"))
+    gap_target = float(gap or os.getenv("FW_GAP", "1e-4"))
+
+    t0 = time.time()
+    fa = fw_arrays(inst)
+    A, AT, Z = fa["A"], fa["AT"], fa["Z"]
+
+    if y0 is None:
+        y, r, _ = _all_or_nothing(fa, AT @ _cell_cost(fa, Z))
+    else:
+        y = np.array(y0, dtype=float)
+        r = np.maximum(fa["dem"] - np.bincount(fa["opt_trip"], weights=y, minlength=len(fa["dem"])), 0.0)
+    x = Z + A @ y
+
+    history = []
+    rel_gap = np.inf
+    for k in range(1, max_iter + 1):
+        opt_cost = AT @ _cell_cost(fa, x)
+        y_aon, r_aon, best = _all_or_nothing(fa, opt_cost)
+
+        current = opt_cost @ y + fa["pen_dem"] * r.sum()
+        lower = best @ fa["dem"]
+        rel_gap = (current - lower) / max(current, 1e-12)
+        obj = _objective(fa, x, r)
+        history.append({"Iteration": k, "Objective": obj, "Relative_Gap": rel_gap})
+        if verbose and (k == 1 or k % 10 == 0):
+            print(f"   it {k:>4}: objective={obj:,.2f}  gap={rel_gap:.2e}")
+        if rel_gap <= gap_target:
+            break
+
+        dy, dr = y_aon - y, r_aon - r
+        dx = A @ dy
+        step = 1.0 / (k + 1) if method == "msa" else _line_search(fa, x, dx, r, dr)
+        y += step * dy
+        r += step * dr
+        x += step * dx
+
+    lat = bpr_latency(fa["ff"], fa["mu"], x) / fa["dur"]
+    return {
+        "y": y, "r": r, "x": x.reshape(fa["shape"]),
+        "TT": AT @ lat,
+        "TSTT": _beckmann(fa, x).sum(), "objective": _objective(fa, x, r), "gap": rel_gap,
+        "iterations": len(history), "history": history,
+        "over_capacity": float(np.maximum(x - fa["cap"], 0.0).sum()),
+        "solve_time": time.time() - t0, "method": method,
+    }
+
+
+def write_solution(out_xls, inst, sol, effective_times, convergence=None):
+    """Summary / Convergence / Arc_Statistics / Assignments, as solve_model_MULTI.py writes them"""
+    ARCS, FFTT, CAPACITY = inst["ARCS"], inst["FFTT"], inst["CAPACITY"]
+    ctp_set, TRIPS_DATA = inst["ctp_set"], inst["TRIPS_DATA"]
+    total_demand = inst["total_demand"]
+
+    ff_path = np.array([inst["freeflow_tt_map"][(c, p)] for (c, p, tau) in ctp_set])
+    inconv = np.where(ff_path > 1e-9, sol["TT"] / np.where(ff_path > 1e-9, ff_path, 1.0), 1.0)
+    used = sol["y"] > 1e-6
+    I_bar = float(inconv[used] @ sol["y"][used] / sol["y"][used].sum()) if used.any() else 0.0
+    assign_rate = 100 * sol["y"].sum() / total_demand
+
+    df_arc_stats, overall_stats = arc_statistics(sol["x"], ARCS, FFTT, CAPACITY)
+    n_iter = len(convergence) if convergence is not None else 1
+    df_summary = summary_frame(total_demand, len(ctp_set), n_iter,
+                               assign_rate, sol["TSTT"], I_bar, overall_stats)
+
+    effective_opt = option_travel_times(inst, effective_times)
+    assignments = []
+    for n in np.flatnonzero(sol["y"] > 1e-4).tolist():
+        c, p, t = ctp_set[n]
+        assignments.append({
+            "Trip_ID": c,
+            "Path_ID": p,
+            "Departure_Slot": t,
+            "Vehicles_Assigned": sol["y"][n],
+            "Demand": TRIPS_DATA[c]["demand"],
+            "FreeFlow_Time_min": round(ff_path[n], 2),
+            "Effective_Time_min": round(float(effective_opt[n]), 2),
+            "TravelTime_PWL_min": round(sol["TT"][n], 2),   # exact BPR here, same column as the LP
+            "Inconvenience_PWL": round(inconv[n], 4),
+        })
+
+    with pd.ExcelWriter(out_xls, engine="openpyxl") as xl:
+        df_summary.to_excel(xl, sheet_name="Summary", index=False)
+        if convergence is not None:
+            pd.DataFrame(convergence).to_excel(xl, sheet_name="Convergence", index=False)
+        df_arc_stats.to_excel(xl, sheet_name="Arc_Statistics", index=False)
+        if assignments:
+            pd.DataFrame(assignments).to_excel(xl, sheet_name="Assignments", index=False)
+        pd.DataFrame(sol["history"]).to_excel(xl, sheet_name="FW_History", index=False)
+    return assign_rate, I_bar
+
+
+if __name__ == "__main__":
+    OUT_XLS = os.getenv("FW_OUT", "solution_FW.xlsx")
+    MAX_ITERATIONS = int(os.getenv("MAX_ITERATIONS", "3"))
+    CONVERGENCE_THRESHOLD = float(os.getenv("CONV_THRESHOLD", "0.05"))
+    UE_TIME_DEPENDENT = os.getenv("UE_TIME_DEPENDENT", "0") == "1"
+    UE_GAP = float(os.getenv("UE_GAP", "0"))
+
+    print("\n" + "=" * 70)
+    print("🚀 FRANK-WOLFE / MSA ASSIGNMENT (no LP solver)")
+    print("=" * 70)
+
+    dataset = read_dataset()
+    ue_update = TravelTimeUpdate(dataset["ARCS"], dataset["FFTT"])
+    effective_travel_times = None
+    convergence = []
+    sol = prev_y = prev_opts = None
+    for iteration in range(MAX_ITERATIONS):
+        inst = build_instance(effective_travel_times, iteration, dataset)
+
+        # Carry flows over to the options that survive the new filtering
+        y0 = None
+        if prev_y is not None:
+            pos = inst["OPT_POS"]
+            y0 = np.zeros(len(inst["ctp_set"]))
+            for o, val in zip(prev_opts, prev_y):
+                if o in pos:
+                    y0[pos[o]] = val
+
+        sol = solve_fw(inst, y0=y0)
+        print(f"⏱️ Iteration {iteration + 1}: {sol['iterations']} {sol['method'].upper()} steps in "
+              f"{sol['solve_time']:.1f}s, TSTT={sol['TSTT']:,.2f}, gap={sol['gap']:.2e}, "
+              f"over capacity={sol['over_capacity']:,.1f}")
+
+        if UE_TIME_DEPENDENT:
+            new_effective_times = effective_time_matrix(sol["x"], inst["ARCS"], inst["FFTT"], inst["CAPACITY"])
+        else:
+            new_effective_times = effective_times_from_flows(sol["x"], inst["ARCS"], inst["FFTT"], inst["CAPACITY"])
+        used_times = effective_travel_times if effective_travel_times is not None else inst["FFTT"]
+        gap = relative_gap(inst["ctp_set"], sol["y"], option_travel_times(inst, new_effective_times),
+                           trip_best_times(inst, new_effective_times))
+        residual = fixed_point_residual(used_times, new_effective_times, inst["ARCS"])
+        change = 0.0
+        if convergence:
+            change = abs(sol["TSTT"] - convergence[-1]["TSTT"]) / convergence[-1]["TSTT"]
+        convergence.append({"Iteration": iteration + 1, "TSTT": sol["TSTT"],
+                            "Solve_Time_s": sol["solve_time"], "Change_%": change * 100,
+                            "Relative_Gap": gap, "Time_Residual": residual})
+        print(f"   UE gap {gap:.4%}, effective-time residual {residual:.4f} ({ue_update.rule})")
+        effective_travel_times = ue_update(used_times, new_effective_times)
+        prev_y, prev_opts = sol["y"], inst["ctp_set"]
+        stop = gap < UE_GAP if UE_GAP > 0 else (iteration > 0 and change < CONVERGENCE_THRESHOLD)
+        if stop:
+            print(f"\n✅ CONVERGED after {iteration + 1} iterations!")
+            break
+
+    assign_rate, I_bar = write_solution(OUT_XLS, inst, sol, new_effective_times, convergence)
+    print(f"\n✅ COMPLETE - Final Assignment: {assign_rate:.1f}%")
+    print(f"   TSTT: {sol['TSTT']:,.2f}")
+    print(f"   Average Inconvenience: {I_bar:.4f}")
+    print(f"💾 Results saved to: {OUT_XLS}")
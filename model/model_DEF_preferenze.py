@@ -1,6 +1,9 @@
 import json
 from pyomo.environ import *
-from collections import defaultdict
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from option_index import incidence_from_trips_json, trip_option_index
 
 # === Caricamento dati ===
 with open("dati/nodes.json") as f:
@@ -110,6 +113,7 @@ for c in TRIPS:
             if tau_int in TIME and p in PATHS_RANGE:
                 ctp_set_temp.append((c, p, tau_int))
 model.CTP = Set(initialize=ctp_set_temp, dimen=3)
+TRIP_OPTIONS = trip_option_index(ctp_set_temp)
 
 
 
@@ -211,29 +215,18 @@ model.c_cost = Param(model.CTP, initialize=COST_filtered, default=999999)
 
 
 # --- Parametro PI ---
-PI = defaultdict(int)
-for c in TRIPS:
-    for p, path in enumerate(trips_data[c]["paths"]):
-        arcs = [(a[0], a[1]) for a in path["arcs"]]
-        fftts = path["base_times"]
-        for tau in path["possible_departure_times"]:
-            t = int(tau)
-            for (a, tt) in zip(arcs, fftts):
-                for offset in range(tt):
-                    snapshot = t + offset
-                    if snapshot in model.T:
-                        PI[c, p, t, a, snapshot] = 1
+ARC_POS = {a: n for n, a in enumerate(ARCS)}
+PI = incidence_from_trips_json(trips_data, ARCS, ctp_set_temp, TIME)
 
 # === Vincoli ===
 
 def demand_rule(m, c):
-    return sum(m.y[c_idx, p, tau] for (c_idx, p, tau) in m.CTP if c_idx == c) == m.dem[c]
+    return sum(m.y[opt] for opt in TRIP_OPTIONS.get(c, [])) == m.dem[c]
 model.demand_satisfied = Constraint(model.C, rule=demand_rule)
 
 def flow_rule(m, i, j, t):
     return m.x[i, j, t] == m.Z[i, j, t] + sum(
-        PI[c, p, tau_dep, (i, j), t] * m.y[c, p, tau_dep]
-        for (c, p, tau_dep) in m.CTP if (c, p, tau_dep, (i, j), t) in PI
+        m.y[ctp_set_temp[o]] for o in PI.options_of(ARC_POS[(i, j)], t - TIME[0]).tolist()
     )
 model.flow_def = Constraint(model.A * model.T, rule=flow_rule)
 
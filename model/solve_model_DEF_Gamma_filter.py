@@ -1,15 +1,19 @@
+import os
+import sys
 from pyomo.environ import *
 from model_DEF_Gamma_filter import model, TRIPS_DATA, gamma
 import pandas as pd
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from solver_backend import SolverBackend
+
 # === Solving ===
 print("\n🔧 Avvio risoluzione...")
-solver = SolverFactory("gurobi")
-if not solver.available():
-    print("❌ Gurobi non disponibile, provo con GLPK...")
-    solver = SolverFactory("glpk")
+solver = SolverBackend()  # SOLVER, default: Gurobi, poi HiGHS / CBC / GLPK
+print(f"   Solver: {solver.describe()}")
 
 results = solver.solve(model, tee=True)
+print(f"⏱️ Tempo: {solver.last['wall_s']:.1f}s (ottimizzatore: {solver.last['solver_s']}), stato: {solver.last['termination']}")
 
 # Check solve status
 if results.solver.termination_condition == TerminationCondition.optimal:
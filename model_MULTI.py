@@ -2,61 +2,17 @@ import json
 import math
 import os
 import pathlib
-from collections import defaultdict
+import time
 
 import numpy as np
-import pandas as pd
 from pyomo.environ import (ConcreteModel, Set, Param, Var, NonNegativeReals, Objective,
-                           Constraint, Expression, minimize, value)
-
-def _num(x):
-    if x is None or (isinstance(x, float) and np.isnan(x)):
-        return 0.0
-    s = str(x).strip().replace(" ", "")
-    if s.count(",") == 1 and s.count(".") == 0:
-        s = s.replace(",", ".")
-    elif s.count(".") > 1 and "," not in s:
-        s = s.replace(".", "")
-    elif s.count(",") > 1 and "." not in s:
-        s = s.replace(",", "")
-    return float(s)
-
-def _pfloat(x):
-    if isinstance(x, (int, float, np.floating)):
-        return float(x)
-    if x is None or (isinstance(x, float) and np.isnan(x)):
-        return float('nan')
-    s = str(x).strip().replace(",", ".")
-    try:
-        return float(s)
-    except:
-        return float('nan')
-
-def _parse_path_string(pstr):
-    arcs = []
-    if pstr is None or (isinstance(pstr, float) and np.isnan(pstr)):
-        return arcs
-    for tok in str(pstr).split(","):
-        tok = tok.strip()
-        if not tok or "_" not in tok:
-            continue
-        a, b = tok.split("_")
-        arcs.append((str(a), str(b)))
-    return arcs
-
-def _parse_int_list(csv_like):
-    if csv_like is None or (isinstance(csv_like, float) and np.isnan(csv_like)):
-        return []
-    out = []
-    for s in str(csv_like).split(","):
-        s = s.strip()
-        if not s:
-            continue
-        try:
-            out.append(int(float(s)))
-        except:
-            pass
-    return out
+                           Constraint, Expression, minimize)
+
+from dataset_cache import load_dataset
+from option_index import CellIncidence, PathSlots, trajectory_times, trip_option_index
+from profiler import PROFILER
+from pwl_breakpoints import arc_breakpoints, breakpoint_config, pad
+from solution_report import effective_time_matrix, effective_times_from_flows, flow_array
 
 def bpr_latency_arc(ff, mu, x):
     """BPR latency function: returns EFFECTIVE travel time on an arc"""
@@ -70,17 +26,170 @@ def bpr_sigma_arc(ff, mu, x):
         return ff * x
     return ff * (x + 0.15 * (x ** 5) / (5.0 * (mu ** 4)))
 
-def create_model(effective_travel_times=None, iteration=0):
+BPR_MODELS = ("pwl", "exact")
+
+def bpr_model():
+    """
+    BPR_MODEL: pwl (default) approximates the Beckmann potential and the
+    latency of every cell by H chords, an LP; exact keeps both as the BPR
+    polynomials of x, a convex NLP with no segment variables that needs a
+    nonlinear solver (SolverBackend(nonlinear=True)).
+    """
+    form = os.getenv("BPR_MODEL", "pwl").lower()
+    if form not in BPR_MODELS:
+        raise ValueError(f"BPR_MODEL must be one of {BPR_MODELS}, got '{form}'")
+    return form
+
+MODEL_BUILDS = ("rules", "matrix")
+
+def model_build():
+    """
+    MODEL_BUILD: rules (default) builds the Pyomo model one rule per row;
+    matrix assembles the same PWL LP as sparse arrays (model_MULTI_matrix)
+    and solves it in memory with HiGHS, without Pyomo objects.
+    """
+    mode = os.getenv("MODEL_BUILD", "rules").lower()
+    if mode not in MODEL_BUILDS:
+        raise ValueError(f"MODEL_BUILD must be one of {MODEL_BUILDS}, got '{mode}'")
+    return mode
+
+_PWL_CACHE = {}
+
+TRAFFIC_FILES = {
+    "LOW": "dati/traffic_DEF_L.json",
+    "MEDIUM": "dati/traffic_DEF_N.json",
+    "HIGH": "dati/traffic_DEF_H.json",
+    "NULL": "dati/traffic_DEF_null.json",
+}
+
+def background_traffic(ARCS, CAPACITY, TIME_SLOTS, u_max, traffic=None, z_scale=None):
+    """
+    Background traffic of a traffic profile as a float32 (arcs x slots)
+    array in ARCS order, scaled by Z_SCALE and clipped to u_max * mu - 2 so
+    the TTI cap stays feasible. Arcs missing from the profile are zero.
+
+    Parameters:
+    -----------
+    traffic : str, optional
+        Level name from TRAFFIC_FILES or path of a traffic JSON;
+        defaults to TRAFFIC (dati/traffic_DEF_N.json)
+    z_scale : float, optional
+        Multiplier on the profile; defaults to Z_SCALE
+    """
+    if traffic is None:
+        traffic = os.getenv("TRAFFIC", "dati/traffic_DEF_N.json")
+    z_path = TRAFFIC_FILES.get(str(traffic).upper(), traffic)
+    Z_SCALE = float(os.getenv("Z_SCALE", "0.6")) if z_scale is None else float(z_scale)
+    if Z_SCALE != 1.0:
+        print(f"🔧 Background traffic scaled by {Z_SCALE}")
+
+    if not pathlib.Path(z_path).exists():
+        raise FileNotFoundError(f"❌ Background traffic file {z_path} not found")
+    with open(z_path, "r", encoding="utf-8") as f:
+        traffic_data = json.load(f)
+
+    arc_pos = {a: n for n, a in enumerate(ARCS)}
+    slot_keys = [str(t) for t in TIME_SLOTS]
+    Z = np.zeros((len(ARCS), len(TIME_SLOTS)), dtype=np.float32)
+    for arc_key, d in traffic_data.items():
+        try:
+            i, j = [s.strip() for s in arc_key.split(",")]
+            row = arc_pos.get((str(i), str(j)))
+            if row is None:
+                continue
+            Z[row] = [float(d.get(t, 0.0)) for t in slot_keys]
+        except:
+            pass
+    Z *= Z_SCALE
+
+    z_cap = np.maximum(0.0, u_max * np.array([CAPACITY[a] for a in ARCS]) - 2.0).astype(np.float32)
+    over = Z > z_cap[:, None]
+    clips = int(over.sum())
+    np.minimum(Z, z_cap[:, None], out=Z)
+
+    total_Z = float(Z.sum(dtype=np.float64))
+    print(f"🚗 Background traffic: {z_path}")
+    print(f"✂️ Z clipped on {clips} cells")
+    print(f"📊 Total background traffic: {total_Z:,.0f}")
+    return Z
+
+def read_dataset(xls_path=None):
     """
-    Create the optimization model.
+    Load the nodes/arcs/trips sheets of a dataset workbook once, with the
+    path strings and departure windows already parsed (compiled cache of
+    dataset_cache.py). Nothing here depends on travel times, so the result
+    can be reused across UE iterations.
+
+    Parameters:
+    -----------
+    xls_path : str, optional
+        Workbook path; defaults to the XLS_PATH environment variable
+    """
+    if xls_path is None:
+        xls_path = os.getenv("XLS_PATH", "./INPUT_DATASETS/MEDIUM/OTT/dataset_medium_traffic_250.xlsx")
+    if not pathlib.Path(xls_path).exists():
+        raise FileNotFoundError(f"❌ Excel file '{xls_path}' not found")
+    data = load_dataset(xls_path)
+    print(f"📂 Dataset: {xls_path}")
+
+    n_trips = len(data["trip_id"])
+    MAX_TRIPS = int(os.getenv("MAX_TRIPS", "0"))
+    if MAX_TRIPS > 0:
+        n_trips = min(n_trips, MAX_TRIPS)
+        print(f"🔧 Using first {n_trips} trips (MAX_TRIPS={MAX_TRIPS})")
+
+    # Process Arcs
+    arc_keys = list(zip(data["arc_from"].tolist(), data["arc_to"].tolist()))
+    n_sheet = int(data["n_sheet_arcs"])
+    ARCS = arc_keys[:n_sheet]
+    NODES = data["node_id"].tolist()
+    CAPACITY_HR = dict(zip(ARCS, data["arc_capacity"][:n_sheet].tolist()))
+    CAPACITY = {(i, j): CAPACITY_HR[(i, j)] / 4.0 for (i, j) in ARCS}
+    FFTT = dict(zip(ARCS, data["arc_fftt"][:n_sheet].tolist()))
+
+    # Trips: CSR arrays back to per-trip path lists
+    trip_ptr, arc_ptr, dep_ptr = data["trip_ptr"], data["path_arc_ptr"], data["path_dep_ptr"]
+    path_arcs, path_dep = data["path_arcs"].tolist(), data["path_dep"].tolist()
+    path_pref = data["path_pref"].tolist()
+    TRIP_ROWS = []
+    for n in range(n_trips):
+        paths = []
+        for q in range(trip_ptr[n], trip_ptr[n + 1]):
+            paths.append({
+                "arcs": [arc_keys[a] for a in path_arcs[arc_ptr[q]:arc_ptr[q + 1]]],
+                "dep_times": path_dep[dep_ptr[q]:dep_ptr[q + 1]],
+                "pref": path_pref[q]
+            })
+        TRIP_ROWS.append({"trip_id": int(data["trip_id"][n]), "demand": float(data["trip_demand"][n]),
+                          "paths": paths})
+
+    return {"xls_path": xls_path, "ARCS": ARCS, "NODES": NODES,
+            "CAPACITY": CAPACITY, "FFTT": FFTT, "TRIP_ROWS": TRIP_ROWS}
+
+
+
+def build_instance(effective_travel_times=None, iteration=0, dataset=None):
+    """
+    Load the dataset and precompute everything the model builders need
+    (arcs, background traffic, CTP options, PWL data, option incidence).
     
     Parameters:
     -----------
-    effective_travel_times : dict, optional
+    effective_travel_times : dict or array, optional
         Dictionary mapping (i,j) -> effective travel time (in minutes)
         If None, uses free-flow times
+        An (arcs x slots) array switches to time-dependent mode: every
+        (path, departure) option follows its own trajectory, spending
+        ceil(eff[arc, entry slot] / DELTA_MIN) slots on each arc
     iteration : int
         Current iteration number (0 = first run with FF times)
+    dataset : dict, optional
+        Parsed workbook from read_dataset; read from XLS_PATH if None
+
+    Returns:
+    --------
+    dict with the instance data, shared by create_model and the
+    matrix builder in model_MULTI_matrix.py
     """
     print("\n" + "=" * 60)
     print(f"🚀 BUILDING MODEL - ITERATION {iteration}")
@@ -102,34 +211,32 @@ def create_model(effective_travel_times=None, iteration=0):
     u_max_raw = ((U_TTI - 1.0) / 0.15) ** 0.25
     u_max = u_max_raw * 1.10
     print(f"🔧 U_TTI={U_TTI}, u_max={u_max:.3f}, GAMMA={GAMMA}")
-    
-    Z_SCALE = float(os.getenv("Z_SCALE", "0.6"))
-    if Z_SCALE != 1.0:
-        print(f"🔧 Background traffic scaled by {Z_SCALE}")
 
     # Load Dataset
-    xls_path = os.getenv("XLS_PATH", "./INPUT_DATASETS/MEDIUM/OTT/dataset_medium_traffic_250.xlsx")
-    if not pathlib.Path(xls_path).exists():
-        raise FileNotFoundError(f"❌ Excel file '{xls_path}' not found")
-    df_nodes = pd.read_excel(xls_path, sheet_name="nodes")
-    df_arcs = pd.read_excel(xls_path, sheet_name="arcs")
-    df_trips = pd.read_excel(xls_path, sheet_name="trips")
-    print(f"📂 Dataset: {xls_path}")
+    if dataset is None:
+        with PROFILER.phase("read_dataset"):
+            dataset = read_dataset()
+    ARCS, NODES = dataset["ARCS"], dataset["NODES"]
+    CAPACITY, FFTT = dataset["CAPACITY"], dataset["FFTT"]
 
-    # Process Arcs
-    ARCS = [(str(r["from_node"]), str(r["to_node"])) for _, r in df_arcs.iterrows()]
-    NODES = df_nodes["ID"].astype(str).tolist()
-    CAPACITY_HR = {(str(r["from_node"]), str(r["to_node"])): _num(r["capacity"]) for _, r in df_arcs.iterrows()}
-    CAPACITY = {(i, j): CAPACITY_HR[(i, j)] / 4.0 for (i, j) in ARCS}
-    FFTT = {(str(r["from_node"]), str(r["to_node"])): _num(r["fftt"]) for _, r in df_arcs.iterrows()}
     
     # ============================================================
     # KEY CHANGE: Use effective travel times if provided
     # ============================================================
+    EFF_MATRIX = None
     if effective_travel_times is None:
         # First iteration: use free-flow times
         TRAVEL_TIMES = FFTT.copy()
         print("   📏 Using FREE-FLOW travel times for path selection")
+    elif isinstance(effective_travel_times, np.ndarray):
+        # Time-dependent: options follow eff[arc, slot]; the slot mean per
+        # arc only sets the PWL cell scaling (ARC_DURATION) and path times
+        EFF_MATRIX = np.asarray(effective_travel_times, dtype=float)
+        TRAVEL_TIMES = {a: float(EFF_MATRIX[n].mean()) for n, a in enumerate(ARCS)}
+        print("   📏 Using TIME-DEPENDENT effective travel times (arc x slot)")
+        ff = np.array([FFTT[a] for a in ARCS])
+        factors = EFF_MATRIX[ff > 0] / ff[ff > 0, None]
+        print(f"   📊 Congestion factor: mean {factors.mean():.3f}, peak {factors.max():.3f}")
     else:
         # Subsequent iterations: use effective times from previous solution
         TRAVEL_TIMES = effective_travel_times.copy()
@@ -146,72 +253,23 @@ def create_model(effective_travel_times=None, iteration=0):
     ARC_DURATION = {(i, j): arc_duration_slots(i, j) for (i, j) in ARCS}
 
     # Load Background Traffic
-    z_path = "dati/traffic_DEF_N.json"
-    if not pathlib.Path(z_path).exists():
-        raise FileNotFoundError(f"❌ Background traffic file {z_path} not found")
-    with open(z_path, "r", encoding="utf-8") as f:
-        traffic_data = json.load(f)
+    with PROFILER.phase("background_traffic"):
+        Z = background_traffic(ARCS, CAPACITY, TIME_SLOTS, u_max)
 
-    Z = {}
-    clips = 0
-    for arc_key, d in traffic_data.items():
-        try:
-            i, j = [s.strip() for s in arc_key.split(",")]
-            i, j = str(i), str(j)
-            if (i, j) not in CAPACITY:
-                continue
-            mu = CAPACITY[(i, j)]
-            z_cap = max(0.0, u_max * mu - 2.0)
-            for t in TIME_SLOTS:
-                val = float(d.get(str(t), 0.0)) * Z_SCALE
-                if val > z_cap:
-                    val = z_cap
-                    clips += 1
-                Z[((i, j), t)] = val
-        except:
-            pass
-
-    total_Z = sum(Z.values())
-    print(f"✂️ Z clipped on {clips} cells")
-    print(f"📊 Total background traffic: {total_Z:,.0f}")
-
-    # Parse Trips - NOW USING TRAVEL_TIMES INSTEAD OF FFTT
+    # Trips - path times use TRAVEL_TIMES instead of FFTT
     TRIPS, PATHS_PER_TRIP, TRIPS_DATA = [], {}, {}
     total_demand = 0.0
-    for _, row in df_trips.iterrows():
-        c = int(row["trip_id"])
-        demand = float(row["demand"])
+    for trip in dataset["TRIP_ROWS"]:
+        c = trip["trip_id"]
+        demand = trip["demand"]
         total_demand += demand
         paths = []
-        k = 0
-        while f"path_{k}" in row:
-            pstr = row.get(f"path_{k}", None)
-            tcol = f"tempo_{k}"
-            if pd.isna(pstr) or tcol not in row or pd.isna(row[tcol]):
-                break
-            
-            arcs_on_path = _parse_path_string(pstr)
-            if not arcs_on_path:
-                k += 1
-                continue
-            
+        for pdata in trip["paths"]:
             # ============================================================
             # KEY CHANGE: Calculate path time using TRAVEL_TIMES
             # ============================================================
-            path_time = sum(TRAVEL_TIMES[(i, j)] for (i, j) in arcs_on_path)
-            
-            dep_col = f"possible_departure_times_{k}"
-            dep_times = _parse_int_list(row.get(dep_col, ""))
-            pref_col = f"preferenza_{k}"
-            pref = str(row.get(pref_col, "entrambi")).strip()
-            if dep_times:
-                paths.append({
-                    "arcs": arcs_on_path, 
-                    "time": path_time,  # Now uses effective times
-                    "dep_times": sorted(set(dep_times)), 
-                    "pref": pref
-                })
-            k += 1
+            path_time = sum(TRAVEL_TIMES[(i, j)] for (i, j) in pdata["arcs"])
+            paths.append(dict(pdata, time=path_time))  # Now uses effective times
         if paths:
             TRIPS.append(c)
             PATHS_PER_TRIP[c] = list(range(len(paths)))
@@ -239,84 +297,329 @@ def create_model(effective_travel_times=None, iteration=0):
     # ============================================================
     # Filter Options - NOW USING TRAVEL_TIMES
     # ============================================================
-    min_travel_times = {c: min(p["time"] for p in TRIPS_DATA[c]["paths"]) for c in TRIPS}
-    ctp_set = []
-    for c in TRIPS:
-        for p_idx, pdata in enumerate(TRIPS_DATA[c]["paths"]):
+    with PROFILER.phase("ctp_filter"):
+        candidates = _candidate_options(TRIPS, TRIPS_DATA, ARCS)
+        path_arcs, trip_first, trip_npaths, cand, cand_trip, cand_path, cand_tau = candidates
+        if EFF_MATRIX is not None:
+            PATH_SLOTS = None
+            keep = _time_dependent_ctp(candidates, EFF_MATRIX, GAMMA, DELTA_MIN)
+        else:
+            # Slot offsets of every path once; a departure fits if the whole path ends in the horizon
+            PATH_SLOTS = PathSlots(path_arcs, [ARC_DURATION[a] for a in ARCS])
             # Filter based on GAMMA using TRAVEL_TIMES
-            if pdata["time"] > (1.0 + GAMMA) * min_travel_times[c]:
-                continue
-            pref = pdata.get("pref", "entrambi")
-            for tau in pdata["dep_times"]:
-                if pref == "giorno1" and tau >= 52:
-                    continue
-                if pref == "giorno2" and tau <= 51:
-                    continue
-                offset = 0
-                ok = True
-                for (i, j) in pdata["arcs"]:
-                    dur = ARC_DURATION[(i, j)]
-                    t_start = tau + offset
-                    t_end = t_start + dur - 1
-                    if t_start < 0 or t_end > TIME_SLOTS[-1]:
-                        ok = False
-                        break
-                    offset += dur
-                if ok:
-                    ctp_set.append((c, p_idx, tau))
+            path_time = np.array([pdata["time"] for c in TRIPS for pdata in TRIPS_DATA[c]["paths"]], dtype=float)
+            min_travel_times = np.full(len(TRIPS), np.inf)
+            np.minimum.at(min_travel_times, np.repeat(np.arange(len(TRIPS)), trip_npaths), path_time)
+            keep = np.flatnonzero((path_time[cand_path] <= (1.0 + GAMMA) * min_travel_times[cand_trip])
+                                  & PATH_SLOTS.feasible(cand_path, cand_tau, len(TIME_SLOTS)))
+        ctp_set = [cand[n] for n in keep.tolist()]
+        opt_path, opt_tau = cand_path[keep], cand_tau[keep]
 
     print(f"🔧 [CTP] Options: {len(ctp_set):,} (GAMMA={GAMMA})")
     if len(ctp_set) == 0:
         raise ValueError("ERROR: No options available")
 
+    TRIP_OPTIONS = trip_option_index(ctp_set)
+
     PATH_ARCS = {(c, p_idx): list(pdata["arcs"])
                  for c in TRIPS for p_idx, pdata in enumerate(TRIPS_DATA[c]["paths"])}
 
     # PWL with SCALING
-    H = int(os.getenv("PWL_SEGMENTS", "10"))
-    pwl_data = {}
+    PWL_CFG = breakpoint_config()
+    with PROFILER.phase("pwl_slopes"):
+        pwl_data = {}
 
-    for (i, j) in ARCS:
-        mu_slot = CAPACITY[(i, j)]
-        ff_arc = FFTT[(i, j)]
-        dur = ARC_DURATION[(i, j)]
-        ff_cell = ff_arc / dur
+        arc_bpts, arc_err = {}, {}
+        for a in ARCS:
+            key = (FFTT[a], CAPACITY[a], u_max, PWL_CFG["mode"], PWL_CFG["segments"],
+                   PWL_CFG["arc_tol"].get(a, PWL_CFG["tol"]), PWL_CFG["max_segments"])
+            if key not in _PWL_CACHE:  # breakpoints do not depend on travel times
+                funcs = [lambda x, ff=FFTT[a], mu=CAPACITY[a]: bpr_sigma_arc(ff, mu, x),
+                         lambda x, ff=FFTT[a], mu=CAPACITY[a]: bpr_latency_arc(ff, mu, x)]
+                _PWL_CACHE[key] = arc_breakpoints(funcs, max(1e-6, u_max * CAPACITY[a]), a, PWL_CFG)
+            arc_bpts[a], arc_err[a] = _PWL_CACHE[key]
+        n_seg = np.array([len(arc_bpts[a]) - 1 for a in ARCS])
+        H = int(n_seg.max())  # arcs with fewer segments get zero-length ones on top
+
+        for (i, j) in ARCS:
+            mu_slot = CAPACITY[(i, j)]
+            ff_arc = FFTT[(i, j)]
+            dur = ARC_DURATION[(i, j)]
+            ff_cell = ff_arc / dur
         
-        bmax = max(1e-6, u_max * mu_slot)
-        bpts = np.linspace(0.0, bmax, H + 1)
-        seglen = np.diff(bpts)
+            bpts = pad(arc_bpts[(i, j)], H)
+            seglen = np.diff(bpts)
 
-        def sigma_arc(x): return bpr_sigma_arc(ff_arc, mu_slot, x)
-        def lat_arc(x): return bpr_latency_arc(ff_arc, mu_slot, x)
+            def sigma_arc(x): return bpr_sigma_arc(ff_arc, mu_slot, x)
+            def lat_arc(x): return bpr_latency_arc(ff_arc, mu_slot, x)
         
-        kappa_cell = []
-        kappa_u_cell = []
-        for h_idx in range(H):
-            a, b = bpts[h_idx], bpts[h_idx+1]
-            ds = max(1e-6, b - a)
+            kappa_cell = []
+            kappa_u_cell = []
+            for h_idx in range(H):
+                a, b = bpts[h_idx], bpts[h_idx+1]
+                if b <= a:  # padding: keep the slopes nondecreasing
+                    kappa_cell.append(kappa_cell[-1])
+                    kappa_u_cell.append(kappa_u_cell[-1])
+                    continue
+                ds = max(1e-6, b - a)
             
-            # Beckmann slope WITH SCALING
-            sig_a, sig_b = sigma_arc(a), sigma_arc(b)
-            slope_raw = (sig_b - sig_a) / ds / dur
-            slope_scaled = slope_raw * OBJ_SCALE
-            kappa_cell.append(max(slope_scaled, 1e-9))
+                # Beckmann slope WITH SCALING
+                sig_a, sig_b = sigma_arc(a), sigma_arc(b)
+                slope_raw = (sig_b - sig_a) / ds / dur
+                slope_scaled = slope_raw * OBJ_SCALE
+                kappa_cell.append(max(slope_scaled, 1e-9))
             
-            # Latency slope (NO scaling)
-            u_a, u_b = lat_arc(a) / dur, lat_arc(b) / dur
-            u_slope = (u_b - u_a) / ds
-            kappa_u_cell.append(max(u_slope, 0.0))
-
-        pwl_data[(i, j)] = {
-            "bpts": bpts,
-            "seglen": seglen,
-            "kappa": kappa_cell,
-            "kappa_u": kappa_u_cell,
-            "u0": ff_cell,
-            "dur": dur
-        }
+                # Latency slope (NO scaling)
+                u_a, u_b = lat_arc(a) / dur, lat_arc(b) / dur
+                u_slope = (u_b - u_a) / ds
+                kappa_u_cell.append(max(u_slope, 0.0))
+
+            pwl_data[(i, j)] = {
+                "bpts": bpts,
+                "seglen": seglen,
+                "kappa": kappa_cell,
+                "kappa_u": kappa_u_cell,
+                "u0": ff_cell,
+                "dur": dur,
+                "segments": len(arc_bpts[(i, j)]) - 1,
+                "error": arc_err[(i, j)],  # max relative chord error (Beckmann, latency)
+            }
+
+        err = np.array([arc_err[a] for a in ARCS])
+        target = f" (tol {PWL_CFG['tol']:.2%})" if PWL_CFG["mode"] == "adaptive" else ""
+        print(f"📐 PWL breakpoints: {PWL_CFG['mode']}{target}, {n_seg.min()}-{n_seg.max()} segments/arc "
+              f"(mean {n_seg.mean():.1f}), max error Beckmann {err[:, 0].max():.3%}, latency {err[:, 1].max():.3%}")
 
     USE_PREFIX = os.getenv("PWL_PREFIX", "0") == "1"
-    print(f"🧩 PWL: {H} segments, prefix={'ON' if USE_PREFIX else 'OFF'}")
+    # full: floor + cap + untouched cells, floor: only segments below Z (duals stay valid for pricing)
+    PWL_REDUCE = os.getenv("PWL_REDUCE", "full").lower()
+    PWL_REDUCE = {"1": "full", "0": None, "off": None}.get(PWL_REDUCE, PWL_REDUCE)
+    if PWL_REDUCE not in (None, "full", "floor"):
+        raise ValueError(f"PWL_REDUCE must be full, floor or 0, got '{PWL_REDUCE}'")
+    BPR_MODEL = bpr_model()
+    if BPR_MODEL == "exact":
+        USE_PREFIX, PWL_REDUCE = False, None  # no segments to bound or fix
+        print("🧩 BPR: exact Beckmann / latency polynomials (nonlinear)")
+    else:
+        print(f"🧩 PWL: {H} segments, prefix={'ON' if USE_PREFIX else 'OFF'}, reduction={PWL_REDUCE or 'OFF'}")
+
+    # Soft-constraint penalties (scaled like the objective)
+    PEN_DEM_RAW = float(os.getenv("PEN_DEM", "1e5"))
+    PEN_DEM = PEN_DEM_RAW * OBJ_SCALE
+    print(f"🔧 Soft demand penalty (scaled): {PEN_DEM:.2e}")
+
+    RELAX_TTI = os.getenv("RELAX_TTI", "1") == "1"
+    if RELAX_TTI:
+        PEN_TTI_RAW = float(os.getenv("PEN_TTI", "1e3"))
+        PEN_TTI = PEN_TTI_RAW * OBJ_SCALE
+        print(f"🔧 TTI penalty (scaled): {PEN_TTI:.2e}")
+    else:
+        PEN_TTI = 0.0
+
+    # Incidence: option <-> (arc, slot) cells as CSR integer arrays
+    with PROFILER.phase("incidence"):
+        ARC_POS = {a: n for n, a in enumerate(ARCS)}
+        OPT_POS = {opt: n for n, opt in enumerate(ctp_set)}
+        # opt_path follows _candidate_options, i.e. the PATH_ARCS order
+        if EFF_MATRIX is not None:
+            INCIDENCE = CellIncidence.from_trajectories(path_arcs, opt_path, opt_tau, EFF_MATRIX, DELTA_MIN)
+        else:
+            INCIDENCE = CellIncidence.from_path_slots(PATH_SLOTS, opt_path, opt_tau, len(ARCS), len(TIME_SLOTS))
+
+    freeflow_tt_map = {}
+    for c in TRIPS:
+        for p in PATHS_PER_TRIP[c]:
+            freeflow_tt_map[(c, p)] = sum(FFTT[(i, j)] for (i, j) in PATH_ARCS[(c, p)])
+
+    return {
+        "ARCS": ARCS, "NODES": NODES, "TIME_SLOTS": TIME_SLOTS,
+        "FFTT": FFTT, "CAPACITY": CAPACITY, "TRAVEL_TIMES": TRAVEL_TIMES,
+        "ARC_DURATION": ARC_DURATION, "Z": Z, "EFF_MATRIX": EFF_MATRIX, "DELTA_MIN": DELTA_MIN,
+        "TRIPS": TRIPS, "PATHS_PER_TRIP": PATHS_PER_TRIP, "TRIPS_DATA": TRIPS_DATA,
+        "PATH_ARCS": PATH_ARCS, "ctp_set": ctp_set, "TRIP_OPTIONS": TRIP_OPTIONS,
+        "ARC_POS": ARC_POS, "OPT_POS": OPT_POS, "INCIDENCE": INCIDENCE,
+        "freeflow_tt_map": freeflow_tt_map,
+        "pwl_data": pwl_data, "H": H, "USE_PREFIX": USE_PREFIX, "PWL_REDUCE": PWL_REDUCE, "BPR_MODEL": BPR_MODEL,
+        "u_max": u_max, "GAMMA": GAMMA, "EPSILON": EPSILON,
+        "total_demand": total_demand, "OBJ_SCALE": OBJ_SCALE, "TARGET_SCALE": TARGET_SCALE,
+        "PEN_DEM": PEN_DEM, "RELAX_TTI": RELAX_TTI, "PEN_TTI": PEN_TTI,
+        "dataset": dataset,
+    }
+
+
+def _candidate_options(TRIPS, TRIPS_DATA, ARCS):
+    """
+    Every (c, p, tau) allowed by the departure windows and day preferences,
+    with the arc positions of each path: (path_arcs, trip_first, trip_npaths,
+    options, option trip index, option path index, option tau).
+    """
+    arc_pos = {a: n for n, a in enumerate(ARCS)}
+    path_arcs, trip_first, trip_npaths = [], [], []
+    cand, cand_trip, cand_path, cand_tau = [], [], [], []
+    for n, c in enumerate(TRIPS):
+        trip_first.append(len(path_arcs))
+        trip_npaths.append(len(TRIPS_DATA[c]["paths"]))
+        for p_idx, pdata in enumerate(TRIPS_DATA[c]["paths"]):
+            q = len(path_arcs)
+            path_arcs.append([arc_pos[a] for a in pdata["arcs"]])
+            pref = pdata.get("pref", "entrambi")
+            for tau in pdata["dep_times"]:
+                if pref == "giorno1" and tau >= 52:
+                    continue
+                if pref == "giorno2" and tau <= 51:
+                    continue
+                cand.append((c, p_idx, tau))
+                cand_trip.append(n)
+                cand_path.append(q)
+                cand_tau.append(tau)
+    return (path_arcs, np.array(trip_first, dtype=np.int64), np.array(trip_npaths, dtype=np.int64),
+            cand, np.array(cand_trip, dtype=np.int64), np.array(cand_path, dtype=np.int64),
+            np.array(cand_tau, dtype=np.int64))
+
+
+def _time_dependent_ctp(candidates, EFF_MATRIX, GAMMA, DELTA_MIN):
+    """
+    Positions of the candidates (_candidate_options) kept under a
+    time-dependent effective-time matrix.
+
+    Same rules as the static filter, evaluated per departure slot: an
+    option is kept if its trajectory ends inside the horizon and its travel
+    time is within (1 + GAMMA) of the fastest path of the trip departing in
+    the same slot. With a matrix constant over slots this is exactly the
+    static filter.
+    """
+    path_arcs, trip_first, trip_npaths, cand, cand_trip, cand_path, cand_tau = candidates
+    if not cand:
+        return np.zeros(0, dtype=np.int64)
+
+    # Fastest path of each (trip, departure slot)
+    pairs, pair_of_cand = np.unique(np.column_stack([cand_trip, cand_tau]), axis=0, return_inverse=True)
+    npaths = trip_npaths[pairs[:, 0]]
+    within = np.arange(int(npaths.sum())) - np.repeat(np.cumsum(npaths) - npaths, npaths)
+    ref_time, _ = trajectory_times(path_arcs, np.repeat(trip_first[pairs[:, 0]], npaths) + within,
+                                   np.repeat(pairs[:, 1], npaths), EFF_MATRIX, DELTA_MIN)
+    best = np.full(len(pairs), np.inf)
+    np.minimum.at(best, np.repeat(np.arange(len(pairs)), npaths), ref_time)
+
+    travel, end = trajectory_times(path_arcs, cand_path, cand_tau, EFF_MATRIX, DELTA_MIN)
+    keep = (cand_tau >= 0) & (end <= EFF_MATRIX.shape[1] - 1) \
+        & (travel <= (1.0 + GAMMA) * best[pair_of_cand.ravel()])
+    return np.flatnonzero(keep)
+
+
+def option_travel_times(inst, effective_travel_times):
+    """
+    Travel time (minutes) of every option of inst["ctp_set"] under per-arc
+    (dict) or time-dependent (arcs x slots array) effective times.
+    """
+    ctp_set, PATH_ARCS = inst["ctp_set"], inst["PATH_ARCS"]
+    if not isinstance(effective_travel_times, np.ndarray):
+        path_time = {key: sum(effective_travel_times[a] for a in arcs) for key, arcs in PATH_ARCS.items()}
+        return np.array([path_time[(c, p)] for (c, p, tau) in ctp_set])
+    keys = list(PATH_ARCS)
+    pos = {key: n for n, key in enumerate(keys)}
+    travel, _ = trajectory_times([[inst["ARC_POS"][a] for a in PATH_ARCS[key]] for key in keys],
+                                 [pos[(c, p)] for (c, p, tau) in ctp_set], [tau for (c, p, tau) in ctp_set],
+                                 effective_travel_times, inst["DELTA_MIN"])
+    return travel
+
+
+def trip_best_times(inst, effective_travel_times):
+    """
+    Fastest (path, departure) of every trip over all its candidates, not
+    only the filtered ctp_set, under per-arc or time-dependent effective
+    times; options that would leave the horizon are ignored.
+
+    Returns dict trip -> minutes (trips without a feasible option omitted).
+    """
+    ARCS, TRIPS = inst["ARCS"], inst["TRIPS"]
+    n_slots = len(inst["TIME_SLOTS"])
+    if isinstance(effective_travel_times, np.ndarray):
+        eff = np.asarray(effective_travel_times, dtype=float)
+    else:
+        eff = np.repeat([[effective_travel_times[a]] for a in ARCS], n_slots, axis=1)
+    path_arcs, _, _, cand, cand_trip, cand_path, cand_tau = _candidate_options(TRIPS, inst["TRIPS_DATA"], ARCS)
+    if not cand:
+        return {}
+    travel, end = trajectory_times(path_arcs, cand_path, cand_tau, eff, inst["DELTA_MIN"])
+    ok = end <= n_slots - 1
+    best = np.full(len(TRIPS), np.inf)
+    np.minimum.at(best, cand_trip[ok], travel[ok])
+    return {c: float(best[n]) for n, c in enumerate(TRIPS) if np.isfinite(best[n])}
+
+
+def _demand_expr(m, inst, c):
+    lhs = sum(m.y[opt] for opt in inst["TRIP_OPTIONS"].get(c, []))
+    return lhs + m.r[c] == m.dem[c]
+
+
+def _flow_expr(m, inst, i, j, t):
+    ctp_set = inst["ctp_set"]
+    options = inst["INCIDENCE"].options_of(inst["ARC_POS"][(i, j)], t).tolist()
+    return m.x[i, j, t] == m.Z[i, j, t] + sum(m.y[ctp_set[o]] for o in options)
+
+
+def _tt_expr(m, inst, c, p, tau):
+    ARCS, TIME_SLOTS, INCIDENCE = inst["ARCS"], inst["TIME_SLOTS"], inst["INCIDENCE"]
+    arcs, slots = INCIDENCE.arc_slot(INCIDENCE.cells_of(inst["OPT_POS"][(c, p, tau)]))
+    return m.TT[c, p, tau] == sum(m.u_lat[ARCS[a], TIME_SLOTS[t]] for a, t in zip(arcs.tolist(), slots.tolist()))
+
+
+def _inconvenience_expr(m, inst, c, p, tau):
+    denom = inst["freeflow_tt_map"][(c, p)]
+    if denom > 1e-9:
+        return m.I[c, p, tau] * denom == m.TT[c, p, tau]
+    else:
+        return m.I[c, p, tau] == 1.0
+
+
+def _model_tuple(model, inst):
+    return (model, inst["TRIPS_DATA"], inst["ARCS"], inst["TIME_SLOTS"], inst["FFTT"], inst["CAPACITY"],
+            inst["Z"], inst["PATH_ARCS"], inst["GAMMA"], inst["total_demand"], inst["OBJ_SCALE"],
+            inst["TRAVEL_TIMES"])
+
+
+def create_model(effective_travel_times=None, iteration=0, dataset=None, inst=None):
+    """
+    Create the optimization model: the PWL LP, or the convex NLP with the
+    exact BPR terms when BPR_MODEL=exact. With MODEL_BUILD=matrix the LP is
+    a model_MULTI_matrix.MatrixModel instead of a Pyomo model.
+
+    Parameters:
+    -----------
+    effective_travel_times : dict, optional
+        Dictionary mapping (i,j) -> effective travel time (in minutes)
+        If None, uses free-flow times
+    iteration : int
+        Current iteration number (0 = first run with FF times)
+    dataset : dict, optional
+        Parsed workbook from read_dataset, reused across iterations
+    inst : dict, optional
+        Prebuilt instance (e.g. restrict_instance for column generation);
+        the arguments above are ignored when given
+    """
+    with PROFILER.phase("create_model"):
+        if inst is None:
+            with PROFILER.phase("build_instance"):
+                inst = build_instance(effective_travel_times, iteration, dataset)
+        if model_build() == "matrix":
+            from model_MULTI_matrix import MatrixModel
+            model = MatrixModel(inst)
+        else:
+            with PROFILER.pyomo_components():
+                model = _construct_model(inst)
+    return _model_tuple(model, inst)
+
+
+def _construct_model(inst):
+    """Pyomo model of an instance from build_instance"""
+    ARCS, TIME_SLOTS = inst["ARCS"], inst["TIME_SLOTS"]
+    FFTT, CAPACITY, Z = inst["FFTT"], inst["CAPACITY"], inst["Z"]
+    TRIPS, PATHS_PER_TRIP, TRIPS_DATA = inst["TRIPS"], inst["PATHS_PER_TRIP"], inst["TRIPS_DATA"]
+    ctp_set, pwl_data, ARC_DURATION = inst["ctp_set"], inst["pwl_data"], inst["ARC_DURATION"]
+    H, USE_PREFIX, u_max = inst["H"], inst["USE_PREFIX"], inst["u_max"]
+    EPSILON, OBJ_SCALE, TARGET_SCALE = inst["EPSILON"], inst["OBJ_SCALE"], inst["TARGET_SCALE"]
+    PEN_DEM, RELAX_TTI, PEN_TTI = inst["PEN_DEM"], inst["RELAX_TTI"], inst["PEN_TTI"]
 
     # Pyomo Model
     model = ConcreteModel()
@@ -328,9 +631,9 @@ def create_model(effective_travel_times=None, iteration=0):
 
     model.fftt = Param(model.A, initialize=FFTT)
     model.mu = Param(model.A, initialize=CAPACITY)
-    model.dur = Param(model.A, initialize=ARC_DURATION)
+    model.dur = Param(model.A, initialize=ARC_DURATION, mutable=True)
     model.dem = Param(model.C, initialize={c: TRIPS_DATA[c]["demand"] for c in TRIPS})
-    model.Z = Param(model.A, model.T, initialize=lambda m,i,j,t: Z.get(((i,j),t), 0.0))
+    model.Z = Param(model.A, model.T, initialize=_z_values(inst, Z, nonzero=True), default=0.0, mutable=True)
     model.u_max = Param(initialize=u_max)
     model.OBJ_SCALE = Param(initialize=OBJ_SCALE, mutable=False)
 
@@ -341,112 +644,82 @@ def create_model(effective_travel_times=None, iteration=0):
     model.u_lat = Var(model.A, model.T, domain=NonNegativeReals, initialize=0.0)
     model.TT = Var(model.CTP, domain=NonNegativeReals, initialize=0.0)
     model.I = Var(model.CTP, domain=NonNegativeReals, initialize=1.0)
-
-    Hset = list(range(1, H + 1))
-    model.Hset = Set(initialize=Hset)
-    model.lmbd = Var(model.A, model.T, model.Hset, domain=NonNegativeReals, initialize=0.0)
+    model.u0 = Param(model.A, mutable=True, initialize=lambda m, i, j: pwl_data[(i, j)]["u0"])
 
     # Soft demand with SCALED penalty
     model.r = Var(model.C, domain=NonNegativeReals, initialize=0.0)
-    PEN_DEM_RAW = float(os.getenv("PEN_DEM", "1e5"))
-    PEN_DEM = PEN_DEM_RAW * OBJ_SCALE
-    print(f"🔧 Soft demand penalty (scaled): {PEN_DEM:.2e}")
 
-    # Constraints
-    def x_def_rule(m, i, j, t):
-        return m.x[i, j, t] == sum(m.lmbd[i, j, t, h] for h in m.Hset)
-    model.x_def = Constraint(model.A, model.T, rule=x_def_rule)
-
-    def lambda_bounds_rule(m, i, j, t, h):
-        seglen = pwl_data[(i, j)]["seglen"][h - 1]
-        return m.lmbd[i, j, t, h] <= seglen
-    model.lambda_bounds = Constraint(model.A, model.T, model.Hset, rule=lambda_bounds_rule)
-
-    if USE_PREFIX:
-        def prefix_rule(m, i, j, t, h):
-            b_h = pwl_data[(i, j)]["bpts"][h]
-            return sum(m.lmbd[i, j, t, s] for s in range(1, h + 1)) <= b_h
-        model.prefix = Constraint(model.A, model.T, model.Hset, rule=prefix_rule)
-
-    def eta_def_rule(m, i, j, t):
-        ks = pwl_data[(i, j)]["kappa"]
-        return m.eta[i, j, t] == sum(ks[h - 1] * m.lmbd[i, j, t, h] for h in m.Hset)
-    model.eta_def = Constraint(model.A, model.T, rule=eta_def_rule)
-
-    def u_def_rule(m, i, j, t):
-        ku = pwl_data[(i, j)]["kappa_u"]
-        u0 = pwl_data[(i, j)]["u0"]
-        return m.u_lat[i, j, t] == u0 + sum(ku[h - 1] * m.lmbd[i, j, t, h] for h in m.Hset)
-    model.u_def = Constraint(model.A, model.T, rule=u_def_rule)
+    if inst["BPR_MODEL"] == "exact":
+        # eta >= the convex Beckmann term is tight at the optimum; u_lat only
+        # feeds TT / I, so the equality does not cut the (y, x) region
+        def eta_def_rule(m, i, j, t):
+            return m.eta[i, j, t] >= m.OBJ_SCALE / m.dur[i, j] * bpr_sigma_arc(FFTT[(i, j)], CAPACITY[(i, j)], m.x[i, j, t])
+        model.eta_def = Constraint(model.A, model.T, rule=eta_def_rule)
+
+        def u_def_rule(m, i, j, t):
+            return m.u_lat[i, j, t] == bpr_latency_arc(FFTT[(i, j)], CAPACITY[(i, j)], m.x[i, j, t]) / m.dur[i, j]
+        model.u_def = Constraint(model.A, model.T, rule=u_def_rule)
+    else:
+        Hset = list(range(1, H + 1))
+        model.Hset = Set(initialize=Hset)
+        model.lmbd = Var(model.A, model.T, model.Hset, domain=NonNegativeReals, initialize=0.0)
+
+        # PWL coefficients depend on ARC_DURATION, so they are mutable
+        model.kappa = Param(model.A, model.Hset, mutable=True,
+                            initialize=lambda m, i, j, h: pwl_data[(i, j)]["kappa"][h - 1])
+        model.kappa_u = Param(model.A, model.Hset, mutable=True,
+                              initialize=lambda m, i, j, h: pwl_data[(i, j)]["kappa_u"][h - 1])
+
+        # Constraints
+        def x_def_rule(m, i, j, t):
+            return m.x[i, j, t] == sum(m.lmbd[i, j, t, h] for h in m.Hset)
+        model.x_def = Constraint(model.A, model.T, rule=x_def_rule)
+
+        def lambda_bounds_rule(m, i, j, t, h):
+            seglen = pwl_data[(i, j)]["seglen"][h - 1]
+            return m.lmbd[i, j, t, h] <= seglen
+        model.lambda_bounds = Constraint(model.A, model.T, model.Hset, rule=lambda_bounds_rule)
+
+        if USE_PREFIX:
+            def prefix_rule(m, i, j, t, h):
+                b_h = pwl_data[(i, j)]["bpts"][h]
+                return sum(m.lmbd[i, j, t, s] for s in range(1, h + 1)) <= b_h
+            model.prefix = Constraint(model.A, model.T, model.Hset, rule=prefix_rule)
+
+        def eta_def_rule(m, i, j, t):
+            return m.eta[i, j, t] == sum(m.kappa[i, j, h] * m.lmbd[i, j, t, h] for h in m.Hset)
+        model.eta_def = Constraint(model.A, model.T, rule=eta_def_rule)
+
+        def u_def_rule(m, i, j, t):
+            return m.u_lat[i, j, t] == m.u0[i, j] + sum(m.kappa_u[i, j, h] * m.lmbd[i, j, t, h] for h in m.Hset)
+        model.u_def = Constraint(model.A, model.T, rule=u_def_rule)
 
     # TTI cap
-    RELAX_TTI = os.getenv("RELAX_TTI", "1") == "1"
     if RELAX_TTI:
         model.slack_tti = Var(model.A, model.T, domain=NonNegativeReals, initialize=0.0)
-        PEN_TTI_RAW = float(os.getenv("PEN_TTI", "1e3"))
-        PEN_TTI = PEN_TTI_RAW * OBJ_SCALE
         def tti_bound_rule(m, i, j, t):
             return m.x[i, j, t] <= m.u_max * m.mu[i, j] + m.slack_tti[i, j, t]
         model.tti_bound = Constraint(model.A, model.T, rule=tti_bound_rule)
-        print(f"🔧 TTI penalty (scaled): {PEN_TTI:.2e}")
     else:
-        PEN_TTI = 0.0
         def tti_bound_rule(m, i, j, t):
             return m.x[i, j, t] <= m.u_max * m.mu[i, j]
         model.tti_bound = Constraint(model.A, model.T, rule=tti_bound_rule)
 
     # Demand
     def demand_rule(m, c):
-        lhs = sum(m.y[c, p, tau] for (cc, p, tau) in m.CTP if cc == c)
-        return lhs + m.r[c] == m.dem[c]
+        return _demand_expr(m, inst, c)
     model.demand = Constraint(model.C, rule=demand_rule)
 
-    # Incidence
-    arc_time_to_options = defaultdict(list)
-    tt_cells_map = defaultdict(list)
-
-    def get_occupied_cells(c, p, tau):
-        cells = []
-        offset = 0
-        for (i, j) in PATH_ARCS[(c, p)]:
-            dur = ARC_DURATION[(i, j)]
-            for d in range(dur):
-                t_use = tau + offset + d
-                if t_use < 0 or t_use > TIME_SLOTS[-1]:
-                    return None
-                cells.append((i, j, t_use))
-            offset += dur
-        return cells
-
-    for (c, p, tau) in ctp_set:
-        cells = get_occupied_cells(c, p, tau)
-        if cells is None:
-            continue
-        tt_cells_map[(c, p, tau)] = cells
-        for (i, j, t) in cells:
-            arc_time_to_options[(i, j, t)].append((c, p, tau))
-
     def flow_rule(m, i, j, t):
-        options = arc_time_to_options.get((i, j, t), [])
-        return m.x[i, j, t] == m.Z[i, j, t] + sum(m.y[c, p, tau] for (c, p, tau) in options)
+        return _flow_expr(m, inst, i, j, t)
     model.flow = Constraint(model.A, model.T, rule=flow_rule)
 
     def tt_proxy_rule(m, c, p, tau):
-        cells = tt_cells_map[(c, p, tau)]
-        return m.TT[c, p, tau] == sum(m.u_lat[i, j, t] for (i, j, t) in cells)
+        return _tt_expr(m, inst, c, p, tau)
     model.path_travel_time = Constraint(model.CTP, rule=tt_proxy_rule)
 
-    freeflow_tt_map = {}
-    for c in TRIPS:
-        for p in PATHS_PER_TRIP[c]:
-            freeflow_tt_map[(c, p)] = sum(FFTT[(i, j)] for (i, j) in PATH_ARCS[(c, p)])
-    
     def inconvenience_rule(m, c, p, tau):
-        denom = freeflow_tt_map[(c, p)]
-        if denom > 1e-9:
-            return m.I[c, p, tau] * denom == m.TT[c, p, tau]
-        else:
-            return m.I[c, p, tau] == 1.0
+        return _inconvenience_expr(m, inst, c, p, tau)
     model.inconvenience = Constraint(model.CTP, rule=inconvenience_rule)
 
     def I_floor_rule(m, c, p, tau):
@@ -479,51 +752,376 @@ def create_model(effective_travel_times=None, iteration=0):
     model.eps_cap = Constraint(rule=eps_cap_rule)
     model.eps_cap.deactivate()
 
+    model.inst = inst
+    if inst["PWL_REDUCE"]:
+        reduce_pwl(model)
+
     print("✅ Model created with SCALED coefficients")
     print(f"   Expected objective: O({TARGET_SCALE:.0e})")
     
-    return model, TRIPS_DATA, ARCS, TIME_SLOTS, FFTT, CAPACITY, Z, PATH_ARCS, GAMMA, total_demand, OBJ_SCALE, TRAVEL_TIMES
+    return model
+
+
+def update_travel_times(model, effective_travel_times, iteration):
+    """
+    Move a live model from create_model to new effective travel times.
+
+    Only what depends on TRAVEL_TIMES is touched: the PWL Params of each arc
+    (ARC_DURATION), the flow rows of cells whose option set changed, the
+    travel-time rows of options whose cells moved, and the active option
+    set after GAMMA/horizon filtering.
+    Options that drop out are fixed to zero with their rows deactivated,
+    new ones are added to CTP. Variable values of the previous solve stay
+    in place as the warm start.
 
+    A persistent solver (appsi) removes and re-adds every edited row, at a
+    cost that grows with the model, so the edit only pays off for a few
+    rows. When more than UE_WARM_MAX_ROWS (default 100) rows would change,
+    a fresh model is built from the new instance instead.
 
-def compute_effective_travel_times(model, ARCS, TIME_SLOTS, FFTT, CAPACITY):
+    Returns the same tuple as create_model.
+    """
+    old = model.inst
+    with PROFILER.phase("build_instance"):
+        inst = build_instance(effective_travel_times, iteration, dataset=old["dataset"])
+    inst["Z"] = old["Z"]  # keep a profile swapped in by set_background_traffic
+
+    max_rows = int(os.getenv("UE_WARM_MAX_ROWS", "100"))
+    n_rows = edited_rows(model, inst)
+    if n_rows > max_rows:
+        print(f"♻️ {n_rows:,} rows would change (> UE_WARM_MAX_ROWS={max_rows}): building a fresh model")
+        return create_model(inst=inst)
+    t0 = time.time()
+
+    # PWL coefficients
+    for a in inst["ARCS"]:
+        pw = inst["pwl_data"][a]
+        model.dur[a] = pw["dur"]
+        model.u0[a] = pw["u0"]
+        if inst["BPR_MODEL"] == "exact":
+            continue  # the polynomials read dur directly
+        for h in model.Hset:
+            model.kappa[a + (h,)] = pw["kappa"][h - 1]
+            model.kappa_u[a + (h,)] = pw["kappa_u"][h - 1]
+    changed_arcs = {a for a in inst["ARCS"] if inst["ARC_DURATION"][a] != old["ARC_DURATION"][a]}
+
+    with PROFILER.phase("sync_options"):
+        added, revived, dropped, cells = sync_options(model, inst)
+
+    # Travel-time rows of options whose cells moved (revived rows may be stale)
+    common = [o for o in inst["ctp_set"] if o in old["OPT_POS"]]
+    moved = inst["INCIDENCE"].moved_options(old["INCIDENCE"], [inst["OPT_POS"][o] for o in common],
+                                            [old["OPT_POS"][o] for o in common])
+    rebuild = [o for o, m in zip(common, moved.tolist()) if m] + list(revived)
+    for o in rebuild:
+        model.path_travel_time[o].set_value(_tt_expr(model, inst, *o))
+    n_tt = len(rebuild)
+
+    print(f"♻️ Model updated in place ({time.time() - t0:.1f}s): "
+          f"{len(changed_arcs)} arcs changed duration, {len(cells)} flow rows, {n_tt + len(added)} TT rows, "
+          f"options +{len(added) + len(revived)}/-{len(dropped)}")
+
+    return _model_tuple(model, inst)
+
+
+def _option_changes(model, inst):
+    """Options of inst that are new to the model, revived, and dropped from the active set"""
+    old_active, new_active = set(model.inst["ctp_set"]), set(inst["ctp_set"])
+    added = [o for o in inst["ctp_set"] if o not in model.CTP]
+    revived = [o for o in inst["ctp_set"] if o not in old_active and o in model.CTP]
+    dropped = [o for o in model.inst["ctp_set"] if o not in new_active]
+    return added, revived, dropped
+
+
+def edited_rows(model, inst):
+    """
+    Number of rows update_travel_times would add, rewrite or (de)activate
+    to move a live model to inst: flow rows of changed cells, travel-time
+    rows of moved options, the three rows of every added, revived or
+    dropped option and the demand rows of their trips.
+    """
+    old = model.inst
+    added, revived, dropped = _option_changes(model, inst)
+    gid = {o: n for n, o in enumerate(list(model.CTP) + added)}
+    cells = inst["INCIDENCE"].changed_cells(old["INCIDENCE"],
+                                            [gid[o] for o in inst["ctp_set"]],
+                                            [gid[o] for o in old["ctp_set"]])
+    common = [o for o in inst["ctp_set"] if o in old["OPT_POS"]]
+    moved = inst["INCIDENCE"].moved_options(old["INCIDENCE"], [inst["OPT_POS"][o] for o in common],
+                                            [old["OPT_POS"][o] for o in common])
+    changes = added + revived + dropped
+    return len(cells) + int(moved.sum()) + 3 * len(changes) + len({o[0] for o in changes})
+
+
+def sync_options(model, inst):
+    """
+    Make the active option set of a live model equal to inst["ctp_set"].
+
+    Options that leave the set are fixed to zero with their rows
+    deactivated, options seen before are revived, new ones are added to CTP
+    with their travel-time/inconvenience rows. Flow rows are rebuilt only
+    for cells whose option set changed, demand rows only for affected
+    trips. inst must share the PWL data of the model (same travel times).
+
+    Returns (added, revived, dropped, changed cell ids) and sets model.inst.
+    """
+    old = model.inst
+    added, revived, dropped = _option_changes(model, inst)
+
+    for o in dropped:
+        model.y[o].fix(0.0)
+        model.path_travel_time[o].deactivate()
+        model.inconvenience[o].deactivate()
+        model.I_floor[o].deactivate()
+    for o in revived:
+        model.y[o].unfix()
+        model.path_travel_time[o].activate()
+        model.inconvenience[o].activate()
+        model.I_floor[o].activate()
+    for o in added:
+        model.CTP.add(o)
+        model.path_travel_time[o] = _tt_expr(model, inst, *o)
+        model.inconvenience[o] = _inconvenience_expr(model, inst, *o)
+        model.I_floor[o] = model.I[o] >= 0.99
+
+    # Flow rows of cells whose option set changed
+    gid = {o: n for n, o in enumerate(model.CTP)}
+    cells = inst["INCIDENCE"].changed_cells(old["INCIDENCE"],
+                                            [gid[o] for o in inst["ctp_set"]],
+                                            [gid[o] for o in old["ctp_set"]])
+    nT = len(inst["TIME_SLOTS"])
+    for k in cells.tolist():
+        (i, j), t = inst["ARCS"][k // nT], inst["TIME_SLOTS"][k % nT]
+        model.flow[i, j, t].set_value(_flow_expr(model, inst, i, j, t))
+
+    # Demand rows and inconvenience objective follow the option set
+    touched_trips = {o[0] for o in added + revived + dropped}
+    for c in touched_trips:
+        model.demand[c].set_value(_demand_expr(model, inst, c))
+    if touched_trips:
+        model.obj_inconv.expr = sum(model.I[o] * model.y[o] for o in inst["ctp_set"])
+
+    model.inst = inst
+    if inst.get("PWL_REDUCE"):
+        reduce_pwl(model)
+    return added, revived, dropped, cells
+
+
+def pwl_reduction(inst):
+    """
+    Which PWL segments of each cell can be fixed, as a (cells x H) array:
+    the fixed lmbd value, NaN where the segment stays free; plus the mask
+    of the cells no active option touches.
+
+    Segments are filled in order at the optimum (kappa and kappa_u are
+    nondecreasing), so the ones below the background floor Z are full and
+    the ones starting above Z + the demand of every trip that can reach
+    the cell stay empty. A cell no option touches has x = Z: all its
+    segments are fixed to the fill of Z. Zero-length segments (padding of
+    arcs with fewer adaptive breakpoints) are fixed to zero.
+
+    With inst["PWL_REDUCE"] == "floor" only the full segments are fixed:
+    the flow-row duals then still price options outside the model
+    (column generation), which capped segments and folded rows would not.
+    """
+    ARCS, H, inc = inst["ARCS"], inst["H"], inst["INCIDENCE"]
+    nT = len(inst["TIME_SLOTS"])
+    bpts = np.repeat(np.array([inst["pwl_data"][a]["bpts"] for a in ARCS], dtype=float), nT, axis=0)
+    z = inst["Z"].ravel().astype(float)[:, None]
+
+    nC = len(inst["TRIPS"])
+    trip_pos = {c: n for n, c in enumerate(inst["TRIPS"])}
+    trip_dem = np.array([inst["TRIPS_DATA"][c]["demand"] for c in inst["TRIPS"]], dtype=float)
+    opt_trip = np.array([trip_pos[c] for (c, p, tau) in inst["ctp_set"]], dtype=np.int64)
+    pairs = np.unique(inc.opt_cells * nC + opt_trip[inc.opt_of_entry])  # each (cell, trip) once
+    reach = np.bincount(pairs // nC, weights=trip_dem[pairs % nC], minlength=inc.n_cells)
+    untouched = np.diff(inc.cell_ptr) == 0
+
+    lo, hi = bpts[:, :-1], bpts[:, 1:]
+    fixed = np.full((inc.n_cells, H), np.nan)
+    fill = np.clip(z - lo, 0.0, hi - lo)
+    fixed[hi <= z] = (hi - lo)[hi <= z]
+    fixed[hi <= lo] = 0.0  # zero-length padding of arcs with fewer breakpoints
+    if inst["PWL_REDUCE"] == "floor":
+        return fixed, np.zeros(inc.n_cells, dtype=bool)
+    fixed[lo >= z + reach[:, None]] = 0.0
+    fixed[untouched] = fill[untouched]
+    return fixed, untouched
+
+
+def reduce_pwl(model):
+    """
+    Fix the PWL segments and fold the untouched cells of pwl_reduction
+    into constants on a live model, changing only what differs from the
+    last call: fixed lmbd lose their lambda_bounds row (and prefix rows
+    made of fixed lmbd only), an untouched cell keeps x fixed to Z and
+    loses its x_def/flow/tti_bound rows. eta_def and u_def stay, so the
+    constants follow kappa updates. Solvers drop fixed variables and
+    inactive rows from the LP.
+
+    Returns (fixed segments, folded cells, variables removed, rows removed).
+    """
+    inst = model.inst
+    ARCS, TIME_SLOTS, H = inst["ARCS"], inst["TIME_SLOTS"], inst["H"]
+    nT = len(TIME_SLOTS)
+    fixed, untouched = pwl_reduction(inst)
+    z = inst["Z"].ravel()
+    prev = getattr(model, "_pwl_state", None)
+    if prev is None:
+        prev_fixed = np.full_like(fixed, np.nan)
+        prev_untouched = np.zeros_like(untouched)
+        prev_z = np.full_like(z, np.nan)
+    else:
+        prev_fixed, prev_untouched, prev_z = prev
+
+    def cell(k):
+        (i, j), t = ARCS[k // nT], TIME_SLOTS[k % nT]
+        return i, j, t
+
+    # Segments
+    is_fixed, was_fixed = ~np.isnan(fixed), ~np.isnan(prev_fixed)
+    moved = (is_fixed != was_fixed) | (is_fixed & (fixed != prev_fixed))
+    for k, h in zip(*np.nonzero(moved)):
+        i, j, t = cell(int(k))
+        var, row = model.lmbd[i, j, t, int(h) + 1], model.lambda_bounds[i, j, t, int(h) + 1]
+        if is_fixed[k, h]:
+            var.fix(float(fixed[k, h]))
+            row.deactivate()
+        else:
+            var.unfix()
+            row.activate()
+    if inst["USE_PREFIX"]:
+        closed = np.logical_and.accumulate(is_fixed, axis=1)
+        was_closed = np.logical_and.accumulate(was_fixed, axis=1)
+        for k, h in zip(*np.nonzero(closed != was_closed)):
+            i, j, t = cell(int(k))
+            row = model.prefix[i, j, t, int(h) + 1]
+            if closed[k, h]:
+                row.deactivate()
+            else:
+                row.activate()
+
+    # Cells without options: x = Z
+    relax = inst["RELAX_TTI"]
+    for k in np.flatnonzero((untouched != prev_untouched) | (untouched & (z != prev_z))).tolist():
+        i, j, t = cell(k)
+        rows = [model.x_def[i, j, t], model.flow[i, j, t], model.tti_bound[i, j, t]]
+        if untouched[k]:
+            model.x[i, j, t].fix(float(z[k]))
+            if relax:
+                model.slack_tti[i, j, t].fix(0.0)
+            for row in rows:
+                row.deactivate()
+        else:
+            model.x[i, j, t].unfix()
+            if relax:
+                model.slack_tti[i, j, t].unfix()
+            for row in rows:
+                row.activate()
+
+    model._pwl_state = (fixed, untouched, z.copy())
+    n_fixed, n_folded = int(is_fixed.sum()), int(untouched.sum())
+    n_vars = n_fixed + n_folded * (2 if relax else 1)
+    n_rows = n_fixed + n_folded * 3
+    if inst["USE_PREFIX"]:
+        n_rows += int(np.logical_and.accumulate(is_fixed, axis=1).sum())
+    if prev is None:
+        total_vars = sum(len(v) for v in model.component_objects(Var))
+        total_rows = sum(len(c) for c in model.component_objects(Constraint))
+        print(f"🧩 PWL reduction: {n_fixed:,} of {fixed.size:,} segments fixed, {n_folded:,} of {len(z):,} cells "
+              f"without options folded into constants: -{n_vars:,} of {total_vars:,} variables, "
+              f"-{n_rows:,} of {total_rows:,} rows")
+    return n_fixed, n_folded, n_vars, n_rows
+
+
+def restrict_instance(inst, opts):
+    """
+    Copy of inst keeping only the options at positions opts of its
+    ctp_set (the option-dependent keys are rebuilt, the rest is shared).
+    """
+    opts = np.unique(np.asarray(opts, dtype=np.int64))
+    ctp_set = [inst["ctp_set"][o] for o in opts.tolist()]
+    sub = dict(inst)
+    sub.update(ctp_set=ctp_set, TRIP_OPTIONS=trip_option_index(ctp_set),
+               OPT_POS={opt: n for n, opt in enumerate(ctp_set)},
+               INCIDENCE=inst["INCIDENCE"].subset(opts))
+    return sub
+
+
+def _z_values(inst, Z, nonzero=False, cells=None):
+    """{(i, j, t): Z} for all cells, the nonzero ones or the given cell ids (arc * nT + slot)"""
+    ARCS, TIME_SLOTS = inst["ARCS"], inst["TIME_SLOTS"]
+    nT = len(TIME_SLOTS)
+    flat = Z.ravel()
+    if cells is None:
+        cells = np.flatnonzero(flat) if nonzero else np.arange(flat.size)
+    return {(*ARCS[k // nT], TIME_SLOTS[k % nT]): float(v) for k, v in zip(cells.tolist(), flat[cells].tolist())}
+
+
+def set_background_traffic(model, traffic=None, z_scale=None):
+    """
+    Swap the background traffic of a live model (e.g. LOW -> MEDIUM -> HIGH).
+
+    Z only enters the right-hand side of the flow rows, so the model
+    structure and the current variable values are kept; the next solve can
+    start from them (persistent solvers such as appsi_highs only push the
+    changed coefficients).
+
+    Parameters:
+    -----------
+    model : ConcreteModel
+        Model returned by create_model
+    traffic : str, optional
+        Level name from TRAFFIC_FILES or path of a traffic JSON
+    z_scale : float, optional
+        Multiplier on the profile; defaults to Z_SCALE
+
+    Returns the new Z array.
+    """
+    inst = model.inst
+    Z = background_traffic(inst["ARCS"], inst["CAPACITY"], inst["TIME_SLOTS"], inst["u_max"], traffic, z_scale)
+    changed = np.flatnonzero(Z.ravel() != inst["Z"].ravel())  # only these right-hand sides move
+    model.Z.store_values(_z_values(inst, Z, cells=changed))
+    inst["Z"] = Z
+    if inst.get("PWL_REDUCE"):
+        reduce_pwl(model)
+    return Z
+
+
+def compute_effective_travel_times(model, ARCS, TIME_SLOTS, FFTT, CAPACITY, solution=None, time_dependent=False):
     """
     Compute effective (congested) travel times from the current solution.
     Returns a dictionary mapping (i,j) -> average effective travel time.
+
+    solution : dict, optional
+        Arrays from solution_report.extract_solution; model.x is read in
+        bulk when not given
+    time_dependent : bool
+        Return the (arcs x slots) array of BPR times of every cell instead,
+        for the time-dependent mode of build_instance
     """
     print("\n" + "=" * 60)
     print("📊 COMPUTING EFFECTIVE TRAVEL TIMES")
     print("=" * 60)
-    
-    effective_times = {}
-    
+
+    x = solution["x"] if solution is not None else flow_array(model, ARCS, TIME_SLOTS)
+    if time_dependent:
+        eff = effective_time_matrix(x, ARCS, FFTT, CAPACITY)
+        ff = np.array([FFTT[a] for a in ARCS])
+        factors = eff[ff > 0] / ff[ff > 0, None]
+        print(f"   Mean congestion factor (arc x slot): {factors.mean():.3f}")
+        print(f"   Peak congestion factor: {factors.max():.3f}")
+        print(f"   Cells with >50% delay: {int((factors > 1.5).sum()):,} of {factors.size:,}")
+        print(f"   Arcs with a >50% delay peak: {int((factors > 1.5).any(axis=1).sum())}")
+        return eff
+
+    # BPR at the mean of the positive flows of each arc, FFTT on unused arcs
+    effective_times = effective_times_from_flows(x, ARCS, FFTT, CAPACITY)
+
     for (i, j) in ARCS:
-        ff = FFTT[(i, j)]
-        mu = CAPACITY[(i, j)]
-        
-        # Collect all flows on this arc across time
-        flows = []
-        for t in TIME_SLOTS:
-            try:
-                x_val = value(model.x[i, j, t], exception=False)
-                if x_val is not None and x_val > 0:
-                    flows.append(x_val)
-            except:
-                pass
-        
-        if not flows:
-            # No traffic on this arc
-            effective_times[(i, j)] = ff
-            continue
-        
-        # Compute average flow
-        avg_flow = np.mean(flows)
-        
-        # Compute effective travel time using BPR
-        eff_time = bpr_latency_arc(ff, mu, avg_flow)
-        effective_times[(i, j)] = eff_time
-        
+        ff, eff_time = FFTT[(i, j)], effective_times[(i, j)]
         # Report if significantly congested
-        congestion_factor = eff_time / ff
+        congestion_factor = eff_time / ff if ff > 0 else 1.0
         if congestion_factor > 1.5:
             print(f"   Arc ({i},{j}): FF={ff:.1f}min, Eff={eff_time:.1f}min (x{congestion_factor:.2f})")
     
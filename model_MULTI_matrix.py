@@ -0,0 +1,361 @@
+"""
+Matrix construction mode for the MULTI model.
+
+Builds the same LP as model_MULTI.create_model, but assembles it directly as
+sparse NumPy/SciPy arrays (COO blocks -> CSR) instead of evaluating one Pyomo
+rule per (arc, slot[, segment]) and per CTP option. The LP is handed to HiGHS
+through its in-memory matrix interface (highspy), with scipy's linprog as a
+fallback when highspy is not installed.
+
+Column layout (cell k = arc_index * |T| + slot):
+    y[o], x[k], eta[k], u_lat[k], TT[o], I[o], lmbd[k*H + h], r[c], slack_tti[k]
+
+The `lambda_bounds` and `I_floor` rows of the rule-based model are expressed
+as column bounds here; everything else is one row per Pyomo constraint.
+
+solve_model_MULTI.py uses this builder with MODEL_BUILD=matrix: create_model
+then returns a MatrixModel, solved by solve_matrix_model with the
+SOLVER_THREADS / SOLVER_TIME_LIMIT settings. check_matrix_model.py checks
+it against the rule-based model.
+"""
+
+import os
+import time
+
+import numpy as np
+from scipy import sparse
+
+from model_MULTI import build_instance
+from solver_backend import settings
+
+
+def build_lp_arrays(inst):
+    """
+    Assemble the MULTI LP as sparse arrays.
+
+    Parameters:
+    -----------
+    inst : dict
+        Instance data returned by model_MULTI.build_instance
+
+    Returns:
+    --------
+    dict with cost vector "c", CSR matrix "A", row/column bounds and the
+    column/row block offsets ("cols", "rows") used to unpack solutions
+    """
+    if inst["BPR_MODEL"] != "pwl":
+        raise ValueError("The matrix builder assembles the PWL LP only; use create_model for BPR_MODEL=exact")
+    t0 = time.time()
+    ARCS, TIME_SLOTS = inst["ARCS"], inst["TIME_SLOTS"]
+    TRIPS, ctp_set = inst["TRIPS"], inst["ctp_set"]
+    H = inst["H"]
+    pwl_data = inst["pwl_data"]
+
+    nA, nT, nO, nC = len(ARCS), len(TIME_SLOTS), len(ctp_set), len(TRIPS)
+    nK = nA * nT
+    trip_index = {c: n for n, c in enumerate(TRIPS)}
+
+    # Per-arc data as arrays
+    mu = np.array([inst["CAPACITY"][a] for a in ARCS], dtype=float)
+    seglen = np.array([pwl_data[a]["seglen"] for a in ARCS], dtype=float).reshape(nA, H)
+    bpts = np.array([pwl_data[a]["bpts"] for a in ARCS], dtype=float).reshape(nA, H + 1)
+    kappa = np.array([pwl_data[a]["kappa"] for a in ARCS], dtype=float).reshape(nA, H)
+    kappa_u = np.array([pwl_data[a]["kappa_u"] for a in ARCS], dtype=float).reshape(nA, H)
+    u0 = np.array([pwl_data[a]["u0"] for a in ARCS], dtype=float)
+
+    Z = inst["Z"].astype(float)
+
+    inc = inst["INCIDENCE"]
+    opt_ptr, opt_cells, opt_of_entry = inc.opt_ptr, inc.opt_cells, inc.opt_of_entry
+    opt_trip = np.fromiter((trip_index[c] for (c, p, tau) in ctp_set), dtype=np.int64, count=nO)
+    dem = np.array([inst["TRIPS_DATA"][c]["demand"] for c in TRIPS], dtype=float)
+    ff_denom = np.fromiter((inst["freeflow_tt_map"][(c, p)] for (c, p, tau) in ctp_set),
+                           dtype=float, count=nO)
+
+    # ------------------------------------------------------------
+    # Columns
+    # ------------------------------------------------------------
+    col_sizes = [("y", nO), ("x", nK), ("eta", nK), ("u_lat", nK),
+                 ("TT", nO), ("I", nO), ("lmbd", nK * H), ("r", nC)]
+    if inst["RELAX_TTI"]:
+        col_sizes.append(("slack_tti", nK))
+    cols, n_cols = {}, 0
+    for name, size in col_sizes:
+        cols[name] = (n_cols, n_cols + size)
+        n_cols += size
+
+    def col(name, idx):
+        return cols[name][0] + idx
+
+    col_lb = np.zeros(n_cols)
+    col_ub = np.full(n_cols, np.inf)
+    s, e = cols["lmbd"]
+    col_ub[s:e] = np.broadcast_to(seglen[:, None, :], (nA, nT, H)).ravel()
+    s, e = cols["I"]
+    col_lb[s:e] = 0.99
+
+    c = np.zeros(n_cols)
+    s, e = cols["eta"]
+    c[s:e] = 1.0
+    s, e = cols["r"]
+    c[s:e] = inst["PEN_DEM"]
+    if inst["RELAX_TTI"]:
+        s, e = cols["slack_tti"]
+        c[s:e] = inst["PEN_TTI"]
+
+    # ------------------------------------------------------------
+    # Rows, assembled as COO blocks
+    # ------------------------------------------------------------
+    rows_i, cols_i, vals = [], [], []
+    row_lb, row_ub = [], []
+    rows, n_rows = {}, 0
+
+    def add_block(name, n, r, cc, v, lb, ub):
+        nonlocal n_rows
+        rows[name] = (n_rows, n_rows + n)
+        rows_i.append(np.asarray(r, dtype=np.int64) + n_rows)
+        cols_i.append(np.asarray(cc, dtype=np.int64))
+        vals.append(np.broadcast_to(np.asarray(v, dtype=float), np.shape(r)).ravel())
+        row_lb.append(np.broadcast_to(np.asarray(lb, dtype=float), (n,)))
+        row_ub.append(np.broadcast_to(np.asarray(ub, dtype=float), (n,)))
+        n_rows += n
+
+    k = np.arange(nK)
+    kh = np.arange(nK * H)
+    k_of_kh = kh // H
+    h_of_kh = kh % H
+    a_of_kh = k_of_kh // nT
+    a_of_k = k // nT
+
+    # x_def: x[k] - sum_h lmbd[k,h] = 0
+    add_block("x_def", nK,
+              np.concatenate([k, k_of_kh]),
+              np.concatenate([col("x", k), col("lmbd", kh)]),
+              np.concatenate([np.ones(nK), -np.ones(nK * H)]),
+              0.0, 0.0)
+
+    # prefix: sum_{s<=h} lmbd[k,s] <= bpts[h]
+    if inst["USE_PREFIX"]:
+        hh, ss = np.tril_indices(H)
+        r = (k[:, None] * H + hh[None, :]).ravel()
+        cc = col("lmbd", (k[:, None] * H + ss[None, :]).ravel())
+        ub = bpts[:, 1:][a_of_k].ravel()
+        add_block("prefix", nK * H, r, cc, 1.0, -np.inf, ub)
+
+    # eta_def: eta[k] - sum_h kappa[a,h] lmbd[k,h] = 0
+    add_block("eta_def", nK,
+              np.concatenate([k, k_of_kh]),
+              np.concatenate([col("eta", k), col("lmbd", kh)]),
+              np.concatenate([np.ones(nK), -kappa[a_of_kh, h_of_kh]]),
+              0.0, 0.0)
+
+    # u_def: u_lat[k] - sum_h kappa_u[a,h] lmbd[k,h] = u0[a]
+    add_block("u_def", nK,
+              np.concatenate([k, k_of_kh]),
+              np.concatenate([col("u_lat", k), col("lmbd", kh)]),
+              np.concatenate([np.ones(nK), -kappa_u[a_of_kh, h_of_kh]]),
+              u0[a_of_k], u0[a_of_k])
+
+    # tti_bound: x[k] (- slack_tti[k]) <= u_max * mu[a]
+    cap = inst["u_max"] * mu[a_of_k]
+    if inst["RELAX_TTI"]:
+        add_block("tti_bound", nK,
+                  np.concatenate([k, k]),
+                  np.concatenate([col("x", k), col("slack_tti", k)]),
+                  np.concatenate([np.ones(nK), -np.ones(nK)]),
+                  -np.inf, cap)
+    else:
+        add_block("tti_bound", nK, k, col("x", k), 1.0, -np.inf, cap)
+
+    # demand: sum_{o in c} y[o] + r[c] = dem[c]
+    add_block("demand", nC,
+              np.concatenate([opt_trip, np.arange(nC)]),
+              np.concatenate([col("y", np.arange(nO)), col("r", np.arange(nC))]),
+              1.0, dem, dem)
+
+    # flow: x[k] - sum_{o on k} y[o] = Z[k]
+    add_block("flow", nK,
+              np.concatenate([k, opt_cells]),
+              np.concatenate([col("x", k), col("y", opt_of_entry)]),
+              np.concatenate([np.ones(nK), -np.ones(len(opt_cells))]),
+              Z.ravel(), Z.ravel())
+
+    # path_travel_time: TT[o] - sum_{k in o} u_lat[k] = 0
+    o = np.arange(nO)
+    add_block("path_travel_time", nO,
+              np.concatenate([o, opt_of_entry]),
+              np.concatenate([col("TT", o), col("u_lat", opt_cells)]),
+              np.concatenate([np.ones(nO), -np.ones(len(opt_cells))]),
+              0.0, 0.0)
+
+    # inconvenience: I[o] * ff[c,p] - TT[o] = 0  (I[o] = 1 when ff ~ 0)
+    has_ff = ff_denom > 1e-9
+    o_ff = o[has_ff]
+    rhs = np.where(has_ff, 0.0, 1.0)
+    add_block("inconvenience", nO,
+              np.concatenate([o, o_ff]),
+              np.concatenate([col("I", o), col("TT", o_ff)]),
+              np.concatenate([np.where(has_ff, ff_denom, 1.0), -np.ones(len(o_ff))]),
+              rhs, rhs)
+
+    A = sparse.coo_matrix((np.concatenate(vals), (np.concatenate(rows_i), np.concatenate(cols_i))),
+                          shape=(n_rows, n_cols)).tocsr()
+
+    build_time = time.time() - t0
+    print(f"🧮 [MATRIX] LP assembled: {n_rows:,} rows x {n_cols:,} cols, "
+          f"{A.nnz:,} nonzeros ({build_time:.2f}s)")
+
+    return {
+        "c": c, "A": A,
+        "row_lb": np.concatenate(row_lb), "row_ub": np.concatenate(row_ub),
+        "col_lb": col_lb, "col_ub": col_ub,
+        "cols": cols, "rows": rows,
+        "shape": (nA, nT, H), "n_options": nO, "n_trips": nC,
+        "Z": Z, "opt_ptr": opt_ptr, "opt_cells": opt_cells, "opt_trip": opt_trip,
+        "build_time": build_time,
+    }
+
+
+def _solve_highspy(lp, time_limit, threads, tee, method=None, crossover=None):
+    import highspy
+
+    A = lp["A"].tocsc()
+    inf = highspy.kHighsInf
+    hlp = highspy.HighsLp()
+    hlp.num_col_ = A.shape[1]
+    hlp.num_row_ = A.shape[0]
+    hlp.col_cost_ = lp["c"]
+    hlp.col_lower_ = np.where(np.isinf(lp["col_lb"]), -inf, lp["col_lb"])
+    hlp.col_upper_ = np.where(np.isinf(lp["col_ub"]), inf, lp["col_ub"])
+    hlp.row_lower_ = np.where(np.isinf(lp["row_lb"]), -inf, lp["row_lb"])
+    hlp.row_upper_ = np.where(np.isinf(lp["row_ub"]), inf, lp["row_ub"])
+    hlp.a_matrix_.format_ = highspy.MatrixFormat.kColwise
+    hlp.a_matrix_.num_col_ = A.shape[1]
+    hlp.a_matrix_.num_row_ = A.shape[0]
+    hlp.a_matrix_.start_ = A.indptr
+    hlp.a_matrix_.index_ = A.indices
+    hlp.a_matrix_.value_ = A.data
+
+    h = highspy.Highs()
+    h.setOptionValue("output_flag", bool(tee))
+    h.setOptionValue("solver", method or os.getenv("MATRIX_SOLVER", "ipm"))
+    h.setOptionValue("run_crossover", crossover or os.getenv("MATRIX_CROSSOVER", "off"))
+    if time_limit is not None:
+        h.setOptionValue("time_limit", float(time_limit))
+    if threads is not None:
+        h.setOptionValue("threads", int(threads))
+    h.passModel(hlp)
+    h.run()
+
+    sol = h.getSolution()
+    return {
+        "status": h.modelStatusToString(h.getModelStatus()),
+        "objective": h.getInfo().objective_function_value,
+        "col_value": np.asarray(sol.col_value),
+        "row_dual": np.asarray(sol.row_dual),
+    }
+
+
+def _solve_linprog(lp, time_limit, tee, method=None):
+    from scipy.optimize import linprog
+
+    A = lp["A"]
+    eq = lp["row_lb"] == lp["row_ub"]
+    ub = ~eq
+    options = {"disp": bool(tee)}
+    if time_limit is not None:
+        options["time_limit"] = float(time_limit)
+    res = linprog(lp["c"],
+                  A_ub=A[ub] if ub.any() else None, b_ub=lp["row_ub"][ub] if ub.any() else None,
+                  A_eq=A[eq], b_eq=lp["row_ub"][eq],
+                  bounds=np.column_stack([lp["col_lb"], lp["col_ub"]]),
+                  method="highs-ds" if method == "simplex" else "highs-ipm", options=options)
+    row_dual = np.zeros(A.shape[0])
+    if res.x is not None:
+        row_dual[eq] = res.eqlin.marginals
+        if ub.any():
+            row_dual[ub] = res.ineqlin.marginals
+    return {
+        "status": res.message,
+        "objective": res.fun,
+        "col_value": res.x if res.x is not None else np.zeros(A.shape[1]),
+        "row_dual": row_dual,
+    }
+
+
+def solve_lp_arrays(lp, time_limit=None, threads=None, tee=False, method=None, crossover=None):
+    """
+    Solve the assembled LP in memory (barrier, no crossover by default;
+    method / crossover override MATRIX_SOLVER / MATRIX_CROSSOVER).
+
+    Returns a dict with status, objective, col_value, row_dual and solve_time.
+    """
+    t0 = time.time()
+    try:
+        import highspy  # noqa: F401
+        res = _solve_highspy(lp, time_limit, threads, tee, method, crossover)
+        res["backend"] = "highspy"
+    except ImportError:
+        res = _solve_linprog(lp, time_limit, tee, method)
+        res["backend"] = "scipy-linprog"
+    res["solve_time"] = time.time() - t0
+    print(f"⏱️ [MATRIX] {res['backend']}: {res['status']} in {res['solve_time']:.1f}s")
+    return res
+
+
+def unpack_solution(lp, col_value):
+    """Split a flat column vector into named, reshaped arrays"""
+    nA, nT, H = lp["shape"]
+    out = {}
+    for name, (s, e) in lp["cols"].items():
+        v = col_value[s:e]
+        if name in ("x", "eta", "u_lat", "slack_tti"):
+            v = v.reshape(nA, nT)
+        elif name == "lmbd":
+            v = v.reshape(nA, nT, H)
+        out[name] = v
+    return out
+
+
+def create_matrix_model(effective_travel_times=None, iteration=0, dataset=None):
+    """Matrix counterpart of create_model: returns (lp, inst)"""
+    inst = build_instance(effective_travel_times, iteration, dataset)
+    lp = build_lp_arrays(inst)
+    return lp, inst
+
+
+class MatrixModel:
+    """
+    Assembled LP of an instance, in place of the Pyomo model of create_model
+    (MODEL_BUILD=matrix). Like the Pyomo model it carries the instance as
+    .inst; .lp holds the arrays of build_lp_arrays.
+    """
+
+    def __init__(self, inst):
+        self.inst = inst
+        self.lp = build_lp_arrays(inst)
+
+
+def solve_matrix_model(model, tee=False):
+    """
+    Solve a MatrixModel with the SOLVER_THREADS / SOLVER_TIME_LIMIT settings.
+
+    Returns (sol, last): the values in the layout of
+    solution_report.extract_solution (x, eta, y, TT, I, r, TSTT_scaled) and
+    a record with the keys of SolverBackend.last.
+    """
+    s = settings()
+    res = solve_lp_arrays(model.lp, time_limit=s["time_limit"], threads=s["threads"], tee=tee)
+    arrays = unpack_solution(model.lp, res["col_value"])
+    sol = {k: arrays[k] for k in ("x", "eta", "y", "TT", "I", "r")}
+    sol["TSTT_scaled"] = float(sol["eta"].sum())
+    last = {
+        "backend": res["backend"],
+        "termination": res["status"],
+        "status": res["status"],
+        "optimal": "Optimal" in res["status"],
+        "wall_s": res["solve_time"],
+        "load_s": None,
+        "solver_s": None,
+    }
+    return sol, last
@@ -0,0 +1,321 @@
+"""
+Shared indices over the CTP option set.
+
+Every model variant enumerates options as (trip, path, departure slot)
+triples; the helpers here build the lookup tables once, next to ctp_set,
+so constraint rules and reporting never rescan the whole option list.
+
+Cells are (arc, slot) pairs numbered cell = arc_index * n_slots + slot_index.
+
+With a time-dependent effective-time matrix eff[arc, slot] (minutes), an
+option no longer shares the cell pattern of its path: the time spent on an
+arc depends on the slot the vehicle enters it. walk_trajectories follows
+every option along its path in one vectorized pass per arc position.
+"""
+
+from collections import defaultdict
+from itertools import chain
+
+import numpy as np
+
+
+def trip_option_index(ctp_set):
+    """
+    Group CTP options by trip in a single pass.
+
+    Parameters:
+    -----------
+    ctp_set : iterable of (c, p, tau)
+
+    Returns:
+    --------
+    dict mapping trip c -> list of its (c, p, tau) options, in ctp_set order
+    """
+    index = defaultdict(list)
+    for opt in ctp_set:
+        index[opt[0]].append(opt)
+    return dict(index)
+
+
+def path_pattern(arc_ids, durations, cumulative=True):
+    """
+    Cells occupied by a path relative to its departure slot.
+
+    Parameters:
+    -----------
+    arc_ids : sequence of int
+        Position of each arc of the path in the model's arc list
+    durations : sequence of int
+        Number of slots spent on each arc
+    cumulative : bool
+        True: each arc starts when the previous one ends (model_MULTI).
+        False: every arc is counted from the departure slot, as in the
+        legacy PI construction of model_DEF and its variants.
+
+    Returns:
+    --------
+    (arc, offset) integer arrays, one entry per occupied slot
+    """
+    arc_ids = np.asarray(arc_ids, dtype=np.int64)
+    dur = np.asarray(durations, dtype=np.int64)
+    n = int(dur.sum())
+    first = np.repeat(np.cumsum(dur) - dur, dur)
+    within = np.arange(n, dtype=np.int64) - first
+    offset = within + first if cumulative else within
+    return np.repeat(arc_ids, dur), offset
+
+
+class PathSlots:
+    """
+    Cumulative slot offsets of every path, computed once for all paths.
+
+    Path q occupies arc[ptr[q]:ptr[q+1]] at offset[ptr[q]:ptr[q+1]] slots
+    after its departure, each arc starting when the previous one ends
+    (path_pattern with cumulative=True), total[q] slots in all.
+
+    Parameters:
+    -----------
+    path_arcs : list of int sequences
+        Arc positions of each path
+    arc_duration : int sequence
+        Slots spent on each arc, indexed by arc position
+    """
+
+    def __init__(self, path_arcs, arc_duration):
+        lengths = np.array([len(a) for a in path_arcs], dtype=np.int64)
+        flat = np.fromiter(chain.from_iterable(path_arcs), dtype=np.int64, count=int(lengths.sum()))
+        dur = np.asarray(arc_duration, dtype=np.int64)[flat]
+        end = np.cumsum(dur)
+        before = np.r_[0, end][np.r_[0, np.cumsum(lengths)]]  # slots of all earlier paths
+        self.total = np.diff(before)
+        arc_start = end - dur - np.repeat(before[:-1], lengths)
+        within = np.arange(int(dur.sum()), dtype=np.int64) - np.repeat(end - dur, dur)
+        self.arc = np.repeat(flat, dur)
+        self.offset = np.repeat(arc_start, dur) + within
+        self.ptr = np.r_[0, np.cumsum(self.total)]
+
+    def feasible(self, opt_path, opt_tau, n_slots):
+        """Mask of the departures whose path stays inside slots 0 .. n_slots - 1"""
+        opt_tau = np.asarray(opt_tau, dtype=np.int64)
+        total = self.total[np.asarray(opt_path, dtype=np.int64)]
+        return (total == 0) | ((opt_tau >= 0) & (opt_tau + total <= n_slots))
+
+
+def walk_trajectories(path_arcs, opt_path, opt_tau, eff, slot_minutes):
+    """
+    Time-dependent trajectory of each option.
+
+    Parameters:
+    -----------
+    path_arcs : list of int arrays
+        Arc positions of each path
+    opt_path, opt_tau : int arrays
+        Path position and departure slot of each option
+    eff : array (arcs x slots)
+        Effective travel time (minutes) of an arc for a vehicle entering it
+        in that slot
+    slot_minutes : float
+        Slot length; an arc entered in slot s is occupied for
+        max(1, ceil(eff[arc, s] / slot_minutes)) slots
+
+    Returns:
+    --------
+    (arcs, starts, durations) arrays (options x max path length), padded
+    with arc -1 / duration 0, and the travel time (minutes) of each option.
+    Slots past the horizon read eff at the last slot.
+    """
+    n_slots = eff.shape[1]
+    lengths = np.array([len(a) for a in path_arcs], dtype=np.int64)
+    padded = np.full((len(path_arcs), max(1, int(lengths.max(initial=0)))), -1, dtype=np.int64)
+    for n, arcs in enumerate(path_arcs):
+        padded[n, :len(arcs)] = arcs
+
+    arcs = padded[np.asarray(opt_path, dtype=np.int64)]
+    starts = np.zeros_like(arcs)
+    durations = np.zeros_like(arcs)
+    travel = np.zeros(len(arcs))
+    slot = np.asarray(opt_tau, dtype=np.int64).copy()
+    for k in range(arcs.shape[1]):
+        live = arcs[:, k] >= 0
+        minutes = np.where(live, eff[np.maximum(arcs[:, k], 0), np.minimum(slot, n_slots - 1)], 0.0)
+        dur = np.where(live, np.maximum(1, np.ceil(minutes / slot_minutes)), 0).astype(np.int64)
+        starts[:, k] = slot
+        durations[:, k] = dur
+        travel += minutes
+        slot += dur
+    return arcs, starts, durations, travel
+
+
+def trajectory_times(path_arcs, opt_path, opt_tau, eff, slot_minutes):
+    """Travel time (minutes) and last occupied slot of each option (see walk_trajectories)"""
+    arcs, starts, durations, travel = walk_trajectories(path_arcs, opt_path, opt_tau, eff, slot_minutes)
+    return travel, np.asarray(opt_tau, dtype=np.int64) + durations.sum(axis=1) - 1
+
+
+class CellIncidence:
+    """
+    Incidence of CTP options on (arc, slot) cells, stored as CSR arrays.
+
+    opt_ptr/opt_cells   option -> occupied cells
+    cell_ptr/cell_opts  cell -> options using it (transpose)
+    """
+
+    def __init__(self, opt_ptr, opt_cells, n_arcs, n_slots):
+        self.n_arcs = n_arcs
+        self.n_slots = n_slots
+        self.n_cells = n_arcs * n_slots
+        self.n_options = len(opt_ptr) - 1
+        self.opt_ptr = np.asarray(opt_ptr, dtype=np.int64)
+        self.opt_cells = np.asarray(opt_cells, dtype=np.int64)
+
+        self.opt_of_entry = np.repeat(np.arange(self.n_options, dtype=np.int64), np.diff(self.opt_ptr))
+        order = np.argsort(self.opt_cells, kind="stable")
+        self.cell_opts = self.opt_of_entry[order]
+        self.cell_ptr = np.zeros(self.n_cells + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.opt_cells, minlength=self.n_cells), out=self.cell_ptr[1:])
+
+    @classmethod
+    def from_paths(cls, patterns, opt_path, opt_tau, n_arcs, n_slots, slot0=0):
+        """
+        Expand per-path patterns to all options in one vectorized pass.
+
+        patterns     list of (arc, offset) arrays from path_pattern, one per path
+        opt_path     path position of each option
+        opt_tau      departure slot of each option (in model time units)
+        slot0        model time of slot index 0; cells outside the horizon
+                     and entries with a negative arc id are dropped
+        """
+        lengths = np.array([len(a) for a, _ in patterns], dtype=np.int64)
+        path_ptr = np.zeros(len(patterns) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=path_ptr[1:])
+        pat_arc = np.concatenate([a for a, _ in patterns]) if patterns else np.zeros(0, np.int64)
+        pat_off = np.concatenate([o for _, o in patterns]) if patterns else np.zeros(0, np.int64)
+        return cls._expand(path_ptr, pat_arc, pat_off, opt_path, opt_tau, n_arcs, n_slots, slot0)
+
+    @classmethod
+    def from_path_slots(cls, path_slots, opt_path, opt_tau, n_arcs, n_slots):
+        """from_paths with the precompiled offsets of PathSlots"""
+        return cls._expand(path_slots.ptr, path_slots.arc, path_slots.offset, opt_path, opt_tau, n_arcs, n_slots)
+
+    @classmethod
+    def _expand(cls, path_ptr, pat_arc, pat_off, opt_path, opt_tau, n_arcs, n_slots, slot0=0):
+        lengths = np.diff(path_ptr)
+        opt_path = np.asarray(opt_path, dtype=np.int64)
+        opt_tau = np.asarray(opt_tau, dtype=np.int64)
+        counts = lengths[opt_path]
+        starts = np.repeat(path_ptr[opt_path], counts)
+        first = np.repeat(np.cumsum(counts) - counts, counts)
+        gidx = starts + np.arange(int(counts.sum()), dtype=np.int64) - first
+
+        arc = pat_arc[gidx]
+        slot = np.repeat(opt_tau, counts) + pat_off[gidx] - slot0
+        keep = (arc >= 0) & (slot >= 0) & (slot < n_slots)
+        entry_opt = np.repeat(np.arange(len(opt_path), dtype=np.int64), counts)[keep]
+
+        opt_ptr = np.zeros(len(opt_path) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(entry_opt, minlength=len(opt_path)), out=opt_ptr[1:])
+        return cls(opt_ptr, arc[keep] * n_slots + slot[keep], n_arcs, n_slots)
+
+    @classmethod
+    def from_trajectories(cls, path_arcs, opt_path, opt_tau, eff, slot_minutes):
+        """
+        Incidence along time-dependent trajectories (walk_trajectories).
+        Every option must end inside the horizon (trajectory_times).
+        """
+        n_arcs, n_slots = eff.shape
+        arcs, starts, durations, _ = walk_trajectories(path_arcs, opt_path, opt_tau, eff, slot_minutes)
+        dur = durations.ravel()
+        entry = np.repeat(np.arange(dur.size, dtype=np.int64), dur)
+        within = np.arange(int(dur.sum()), dtype=np.int64) - np.repeat(np.cumsum(dur) - dur, dur)
+        cells = arcs.ravel()[entry] * n_slots + starts.ravel()[entry] + within
+        opt_ptr = np.zeros(len(arcs) + 1, dtype=np.int64)
+        np.cumsum(durations.sum(axis=1), out=opt_ptr[1:])
+        return cls(opt_ptr, cells, n_arcs, n_slots)
+
+    def subset(self, opts):
+        """Incidence restricted to option positions opts (renumbered 0..len-1)"""
+        opts = np.asarray(opts, dtype=np.int64)
+        counts = self.opt_ptr[opts + 1] - self.opt_ptr[opts]
+        ptr = np.zeros(len(opts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=ptr[1:])
+        first = np.repeat(ptr[:-1], counts)
+        gidx = np.repeat(self.opt_ptr[opts], counts) + np.arange(int(ptr[-1]), dtype=np.int64) - first
+        return CellIncidence(ptr, self.opt_cells[gidx], self.n_arcs, self.n_slots)
+
+    def cells_of(self, o):
+        """Cell ids occupied by option o"""
+        return self.opt_cells[self.opt_ptr[o]:self.opt_ptr[o + 1]]
+
+    def options_of(self, arc, slot):
+        """Option positions using cell (arc index, slot index)"""
+        cell = arc * self.n_slots + slot
+        return self.cell_opts[self.cell_ptr[cell]:self.cell_ptr[cell + 1]]
+
+    def changed_cells(self, other, ids, other_ids):
+        """
+        Cells whose set of options differs from `other` (same cell layout).
+
+        ids / other_ids map each incidence's option positions to shared
+        option ids, so the two incidences may enumerate options differently.
+        """
+        cnt, cnt_other = np.diff(self.cell_ptr), np.diff(other.cell_ptr)
+        changed = cnt != cnt_other
+        mine = self._sorted_cell_ids(ids)
+        theirs = other._sorted_cell_ids(other_ids)
+        same = ~changed
+        mine_same = np.repeat(same, cnt)
+        differs = mine[mine_same] != theirs[np.repeat(same, cnt_other)]
+        cell_of = np.repeat(np.arange(self.n_cells), cnt)[mine_same]
+        changed[cell_of[differs]] = True
+        return np.flatnonzero(changed)
+
+    def moved_options(self, other, opts, other_opts):
+        """
+        Mask over opts: True where option opts[k] occupies other cells than
+        option other_opts[k] of `other` (same cell layout).
+        """
+        opts = np.asarray(opts, dtype=np.int64)
+        other_opts = np.asarray(other_opts, dtype=np.int64)
+        counts = self.opt_ptr[opts + 1] - self.opt_ptr[opts]
+        moved = counts != other.opt_ptr[other_opts + 1] - other.opt_ptr[other_opts]
+        same = np.flatnonzero(~moved)
+        n = counts[same]
+        owner = np.repeat(same, n)
+        within = np.arange(int(n.sum()), dtype=np.int64) - np.repeat(np.cumsum(n) - n, n)
+        mine = self.opt_cells[self.opt_ptr[opts[owner]] + within]
+        theirs = other.opt_cells[other.opt_ptr[other_opts[owner]] + within]
+        moved[owner[mine != theirs]] = True
+        return moved
+
+    def _sorted_cell_ids(self, ids):
+        ids = np.asarray(ids, dtype=np.int64)[self.cell_opts]
+        cell_of = np.repeat(np.arange(self.n_cells), np.diff(self.cell_ptr))
+        return ids[np.lexsort((ids, cell_of))]
+
+    def arc_slot(self, cells):
+        """Split cell ids into (arc index, slot index)"""
+        return np.divmod(cells, self.n_slots)
+
+
+def incidence_from_trips_json(trips_data, arcs, ctp_set, time_slots):
+    """
+    Option -> cell incidence for the legacy JSON models (replaces PI).
+
+    Each arc of a path occupies base_times[k] slots counted from the
+    departure slot; slots outside time_slots and arcs not in the model are
+    skipped, exactly like the PI dictionary they replace.
+    """
+    arc_pos = {a: n for n, a in enumerate(arcs)}
+    path_keys = list(dict.fromkeys((c, p) for (c, p, tau) in ctp_set))
+    path_pos = {key: n for n, key in enumerate(path_keys)}
+    patterns = []
+    for (c, p) in path_keys:
+        path = trips_data[c]["paths"][p]
+        arc, off = path_pattern([arc_pos.get((a[0], a[1]), -1) for a in path["arcs"]],
+                                path["base_times"], cumulative=False)
+        pairs = np.unique(np.column_stack([arc, off]), axis=0)
+        patterns.append((pairs[:, 0], pairs[:, 1]))
+    return CellIncidence.from_paths(patterns,
+                                    [path_pos[(c, p)] for (c, p, tau) in ctp_set],
+                                    [int(tau) for (c, p, tau) in ctp_set],
+                                    len(arcs), len(time_slots), slot0=time_slots[0])
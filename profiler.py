@@ -0,0 +1,200 @@
+"""
+Phase profiler for the model build and the UE driver.
+
+PROFILER.phase(name) is a context manager that records wall time, CPU time
+and resident memory (at entry, at exit and the peak in between, sampled by
+a background thread) of one stage. Phases nest: a phase opened inside
+another one is recorded as "outer/inner", so the build of create_model
+shows up as build/create_model/build_instance/ctp_filter and so on.
+
+PROFILER.pyomo_components() records the construction time of every Pyomo
+component added while it is open (Pyomo's own ConstructionTimer records),
+one row per Var/Constraint/Objective.
+
+Labels set with PROFILER.label(iteration=2) are attached to every record.
+PROFILER.write(json_path, csv_path) dumps the run; PROFILER.frame() gives
+the same rows as a DataFrame for the Profile sheet of the workbook.
+
+    PROFILE_SAMPLE_S   RSS sampling period in seconds (default 0.05, 0 = off)
+"""
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_mb():
+    """Peak resident set size of the process so far"""
+    if resource is None:
+        return float("nan")
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024
+
+
+def current_rss_mb():
+    """Current resident set size (Linux /proc), peak RSS elsewhere"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        return peak_rss_mb()
+
+
+def solver_time(results):
+    """Optimizer time reported by the solver in a Pyomo results object, if any"""
+    try:
+        info = results.solver
+    except AttributeError:
+        return None
+    for key in ("wallclock_time", "time", "user_time"):
+        val = getattr(info, key, None)
+        val = getattr(val, "value", val)
+        if isinstance(val, (int, float)) and val == val:
+            return float(val)
+    return None
+
+
+class _ComponentTimes(logging.Handler):
+    def __init__(self, profiler):
+        super().__init__(logging.INFO)
+        self.profiler = profiler
+
+    def emit(self, record):
+        timer = record.msg
+        obj = getattr(timer, "obj", None)
+        if obj is None or not hasattr(obj, "parent_block") or obj.parent_block() is None:
+            return  # the model itself and implicit sets (Any, SetProduct_...)
+        ctype = getattr(getattr(obj, "ctype", None), "__name__", type(obj).__name__)
+        try:
+            size = len(obj) if obj.is_indexed() else 1
+        except Exception:
+            size = None
+        self.profiler.record(f"{ctype} {obj.local_name}", timer.timer, indices=size)
+
+
+class PhaseProfiler:
+    def __init__(self, sample_s=None):
+        self.sample_s = float(os.getenv("PROFILE_SAMPLE_S", "0.05")) if sample_s is None else sample_s
+        self.records = []
+        self.labels = {}
+        self._stack = []
+        self._high = []
+        self._lock = threading.Lock()
+        self._sampler = None
+        self.started = time.time()
+
+    # ------------------------------------------------------------
+    # RSS sampling
+    # ------------------------------------------------------------
+    def _sample(self):
+        while True:
+            time.sleep(self.sample_s)
+            rss = current_rss_mb()
+            with self._lock:
+                if self._high:
+                    self._high[-1] = max(self._high[-1], rss)
+
+    def _ensure_sampler(self):
+        if self._sampler is None and self.sample_s > 0:
+            self._sampler = threading.Thread(target=self._sample, name="rss-sampler", daemon=True)
+            self._sampler.start()
+
+    # ------------------------------------------------------------
+    # Recording
+    # ------------------------------------------------------------
+    def label(self, **labels):
+        """Labels (e.g. iteration=2) attached to every following record"""
+        self.labels.update(labels)
+
+    def path(self, name):
+        return "/".join(self._stack + [name])
+
+    def record(self, name, wall_s, **extra):
+        """Add a span measured elsewhere (e.g. solver-reported time) under the open phase"""
+        self.records.append({**self.labels, "phase": self.path(name), "depth": len(self._stack),
+                             "wall_s": wall_s, **extra})
+
+    @contextmanager
+    def phase(self, name):
+        self._ensure_sampler()
+        rss0 = current_rss_mb()
+        with self._lock:
+            self._high.append(rss0)
+        self._stack.append(name)
+        t0, c0 = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - t0, time.process_time() - c0
+            self._stack.pop()
+            rss1 = current_rss_mb()
+            with self._lock:
+                peak = max(self._high.pop(), rss1)
+                if self._high:
+                    self._high[-1] = max(self._high[-1], peak)
+            self.record(name, wall, cpu_s=cpu, rss_start_mb=rss0, rss_end_mb=rss1, rss_peak_mb=peak)
+
+    @contextmanager
+    def pyomo_components(self, name="components"):
+        """Per-component construction times of the Pyomo model built inside"""
+        logger = logging.getLogger("pyomo.common.timing.construction")
+        handler = _ComponentTimes(self)
+        level, propagate = logger.level, logger.propagate
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        try:
+            with self.phase(name):
+                yield
+        finally:
+            logger.removeHandler(handler)
+            logger.setLevel(level)
+            logger.propagate = propagate
+
+    # ------------------------------------------------------------
+    # Output
+    # ------------------------------------------------------------
+    def frame(self):
+        return pd.DataFrame(self.records)
+
+    def totals(self, depth=None):
+        """Wall time per phase name summed over labels (only phases at `depth` if given)"""
+        df = self.frame()
+        if df.empty:
+            return {}
+        if depth is not None:
+            df = df[df["depth"] == depth]
+        return df.groupby("phase", sort=False)["wall_s"].sum().to_dict()
+
+    def write(self, json_path=None, csv_path=None, **run_info):
+        run = {"started": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.started)),
+               "total_wall_s": time.time() - self.started, "peak_rss_mb": peak_rss_mb(), **run_info}
+        if json_path:
+            with open(json_path, "w", encoding="utf-8") as f:
+                json.dump({"run": run, "phases": self.records}, f, indent=2, default=str)
+        if csv_path:
+            self.frame().to_csv(csv_path, index=False)
+        return run
+
+    def report(self, top=10, out=print):
+        df = self.frame()
+        if df.empty:
+            return
+        df = df[df["depth"] <= 1].groupby("phase", sort=False)["wall_s"].sum().sort_values(ascending=False)
+        out(f"\n⏱️ Phase profile (top {min(top, len(df))}, peak RSS {peak_rss_mb():,.0f} MB):")
+        for name, wall in df.head(top).items():
+            out(f"   {name:<45} {wall:>9.2f}s")
+
+
+PROFILER = PhaseProfiler()
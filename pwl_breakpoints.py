@@ -0,0 +1,203 @@
+"""
+Breakpoints of the piecewise-linear Beckmann and latency approximations.
+
+build_instance replaces, on every arc, the Beckmann potential sigma(x) (the
+objective) and the BPR latency (the travel-time rows) by their chords
+between breakpoints on [0, u_max * mu]. Uniform breakpoints waste segments
+where the BPR curve is flat: the curvature grows like x^3 for sigma and
+x^2 for the latency, so nearly all of the chord error sits in the last
+segments while the first ones are exact to many digits.
+
+adaptive_breakpoints returns the fewest breakpoints whose chords stay
+within a factor 1 + tol of every function on [0, bmax], growing each
+segment as far as the chord error allows; they end up short where the
+curve bends and long where it is flat. The chords of a convex function lie above it, so
+the PWL Beckmann term of every cell, and the TSTT, overestimate the exact
+one by at most tol. The LP needs the same segment count on every
+arc: pad() repeats bmax, and the zero-length segments it adds are fixed
+to zero by the PWL reduction of model_MULTI.
+
+    PWL_BREAKPOINTS     uniform (default, PWL_SEGMENTS per arc) | adaptive
+    PWL_TOL             max relative chord error of adaptive breakpoints (default 0.002)
+    PWL_MAX_SEGMENTS    cap on adaptive segments per arc (default 40)
+    PWL_ARC_TOL         JSON file {"i,j": tol} overriding PWL_TOL on single arcs
+
+Run as a script to see the segments and errors reached per tolerance:
+
+    python pwl_breakpoints.py [dataset.xlsx] [tol ...]     (XLS_PATH by default)
+"""
+
+import json
+import os
+import sys
+
+import numpy as np
+
+MODES = ("uniform", "adaptive")
+N_GRID = 2049
+
+
+def breakpoint_config():
+    """PWL breakpoint settings from the environment"""
+    mode = os.getenv("PWL_BREAKPOINTS", "uniform").lower()
+    if mode not in MODES:
+        raise ValueError(f"PWL_BREAKPOINTS must be one of {MODES}, got '{mode}'")
+    arc_tol = {}
+    path = os.getenv("PWL_ARC_TOL")
+    if path:
+        with open(path, "r") as f:
+            for key, tol in json.load(f).items():
+                i, j = [s.strip() for s in key.split(",")]
+                arc_tol[(i, j)] = float(tol)
+    return {
+        "mode": mode,
+        "segments": int(os.getenv("PWL_SEGMENTS", "10")),
+        "tol": float(os.getenv("PWL_TOL", "0.002")),
+        "max_segments": int(os.getenv("PWL_MAX_SEGMENTS", "40")),
+        "arc_tol": arc_tol,
+    }
+
+
+def chord_error(funcs, bpts, n_grid=N_GRID):
+    """
+    Max error of the chords through bpts, per function.
+
+    Parameters:
+    -----------
+    funcs : list of callables
+        Vectorised functions of x
+    bpts : array
+        Increasing breakpoints (repeated ones allowed)
+    n_grid : int
+        Evaluation points on [bpts[0], bpts[-1]]
+
+    Returns an array of max |chord - f| / |f| (points where f = 0 skipped).
+    """
+    grid = np.linspace(bpts[0], bpts[-1], n_grid)
+    errors = []
+    for f in funcs:
+        vals = f(grid)
+        nz = np.abs(vals) > 1e-12 * max(np.abs(vals).max(), 1e-300)
+        dev = np.abs(np.interp(grid, bpts, f(bpts)) - vals)
+        errors.append(float(np.max(dev[nz] / np.abs(vals[nz]), initial=0.0)))
+    return np.array(errors)
+
+
+def equidistributed(funcs, bmax, n_seg, n_grid=N_GRID):
+    """n_seg segments on [0, bmax] carrying equal shares of the integral of sqrt(f'' / f)"""
+    grid = np.linspace(0.0, bmax, n_grid)
+    density = np.zeros(n_grid)
+    for f in funcs:
+        vals = f(grid)
+        level = np.maximum(np.abs(vals), 1e-12 * max(np.abs(vals).max(), 1e-300))
+        curv = np.abs(np.gradient(np.gradient(vals, grid), grid)) / level
+        density = np.maximum(density, np.sqrt(curv))
+    if not np.any(density > 0):  # linear: any breakpoints are exact
+        density = np.ones(n_grid)
+    cum = np.concatenate([[0.0], np.cumsum(0.5 * (density[1:] + density[:-1]) * np.diff(grid))])
+    bpts = np.interp(np.linspace(0.0, cum[-1], n_seg + 1), cum, grid)
+    bpts[0], bpts[-1] = 0.0, bmax
+    return bpts
+
+
+def adaptive_breakpoints(funcs, bmax, tol, max_segments=40, n_grid=N_GRID):
+    """
+    Fewest breakpoints on [0, bmax] whose chords stay within tol of funcs.
+
+    Segments are grown greedily from 0, each as long as the chord error
+    allows (bisection over the evaluation grid); for convex functions the
+    error of a chord only grows with its length, so no placement needs
+    fewer segments. When tol needs more than max_segments, the
+    max_segments equidistributed breakpoints are returned instead.
+
+    Parameters:
+    -----------
+    funcs : list of callables
+        Vectorised convex functions of x (Beckmann potential, latency)
+    bmax : float
+        Upper end of the approximation
+    tol : float
+        Max chord error relative to the function value
+    max_segments : int
+        Cap on the segment count
+
+    Returns (bpts, errors): the breakpoints and the error per function.
+    """
+    grid = np.linspace(0.0, bmax, n_grid)
+    vals = [f(grid) for f in funcs]
+    levels = [np.maximum(np.abs(v), 1e-12 * max(np.abs(v).max(), 1e-300)) for v in vals]
+
+    def fits(lo, hi):
+        w = (grid[lo:hi + 1] - grid[lo]) / (grid[hi] - grid[lo])
+        return all(np.all(np.abs(v[lo] + w * (v[hi] - v[lo]) - v[lo:hi + 1]) <= tol * lev[lo:hi + 1])
+                   for v, lev in zip(vals, levels))
+
+    cuts = [0]
+    while cuts[-1] < n_grid - 1 and len(cuts) <= max_segments:
+        lo, hi = cuts[-1], n_grid - 1
+        if not fits(lo, hi):
+            good, bad = lo + 1, hi  # largest good end by bisection
+            while bad - good > 1:
+                mid = (good + bad) // 2
+                good, bad = (mid, bad) if fits(lo, mid) else (good, mid)
+            hi = good
+        cuts.append(hi)
+    if cuts[-1] < n_grid - 1:
+        bpts = equidistributed(funcs, bmax, max_segments, n_grid)
+    else:
+        bpts = grid[cuts]
+        bpts[-1] = bmax
+    return bpts, chord_error(funcs, bpts, n_grid)
+
+
+def pad(bpts, n_seg):
+    """Breakpoints extended to n_seg segments with zero-length ones at the top"""
+    return np.concatenate([bpts, np.full(n_seg + 1 - len(bpts), bpts[-1])])
+
+
+def arc_breakpoints(funcs, bmax, arc, cfg):
+    """Breakpoints of one arc under breakpoint_config() and their chord errors"""
+    if cfg["mode"] == "uniform":
+        bpts = np.linspace(0.0, bmax, cfg["segments"] + 1)
+        return bpts, chord_error(funcs, bpts)
+    return adaptive_breakpoints(funcs, bmax, cfg["arc_tol"].get(arc, cfg["tol"]), cfg["max_segments"])
+
+
+def main():
+    from model_MULTI import bpr_latency_arc, bpr_sigma_arc, read_dataset
+
+    args = sys.argv[1:]
+    xls_path = args.pop(0) if args and args[0].endswith((".xlsx", ".xls")) else None
+    tols = [float(t) for t in args] or [0.05, 0.02, 0.01, 0.005, 0.002, 0.001]
+    data = read_dataset(xls_path)
+    ARCS, CAPACITY, FFTT = data["ARCS"], data["CAPACITY"], data["FFTT"]
+    u_max = ((float(os.getenv("U_TTI", "4.0")) - 1.0) / 0.15) ** 0.25 * 1.10  # as in build_instance
+    max_segments = int(os.getenv("PWL_MAX_SEGMENTS", "40"))
+
+    def funcs(a):
+        ff, mu = FFTT[a], CAPACITY[a]
+        return [lambda x: bpr_sigma_arc(ff, mu, x), lambda x: bpr_latency_arc(ff, mu, x)]
+
+    print(f"📐 PWL breakpoints: {len(ARCS)} arcs, u_max={u_max:.3f}")
+    print(f"{'tol':>8} | {'adaptive seg min/mean/max':>25} {'err Beckmann':>13} {'err latency':>12} | "
+          f"{'uniform seg':>11} {'err Beckmann':>13} {'err latency':>12}")
+    for tol in tols:
+        fits, uni = [], []
+        for a in ARCS:
+            bmax = max(1e-6, u_max * CAPACITY[a])
+            fits.append(adaptive_breakpoints(funcs(a), bmax, tol, max_segments))
+            for n_uni in range(1, max_segments + 1):
+                err_uni = chord_error(funcs(a), np.linspace(0.0, bmax, n_uni + 1))
+                if np.all(err_uni <= tol):
+                    break
+            uni.append((n_uni, err_uni))
+        n_seg = np.array([len(b) - 1 for b, _ in fits])
+        err = np.array([e for _, e in fits])
+        n_uni = np.array([n for n, _ in uni])
+        err_uni = np.array([e for _, e in uni])
+        print(f"{tol:>8.2%} | {f'{n_seg.min()}/{n_seg.mean():.1f}/{n_seg.max()}':>25} "
+              f"{err[:, 0].max():>13.3%} {err[:, 1].max():>12.3%} | "
+              f"{n_uni.max():>11} {err_uni[:, 0].max():>13.3%} {err_uni[:, 1].max():>12.3%}")
+
+if __name__ == "__main__":
+    main()
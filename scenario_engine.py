@@ -0,0 +1,274 @@
+"""
+Monte Carlo robustness of a fixed assignment under uncertain demand and background traffic.
+
+The option flows y of a solution workbook (Assignments sheet) are kept
+fixed and evaluated, without re-optimizing, on MC_SCENARIOS draws per
+traffic level:
+
+    demand    redrawn as generate_paths_15minuti.py / dataset_pipeline.py
+              assign it: trip weight p_gen(origin) * p_attr(destination) *
+              U(0.8, 2.2), with the nodi_prob weights of every node
+              perturbed by a unit-mean lognormal factor (MC_DEMAND_SIGMA)
+              and the dataset total by another (MC_TOTAL_SIGMA); every trip
+              keeps its split over options and its unmet share
+    traffic   the background traffic the model uses (background_traffic:
+              traffic_DEF_* x Z_SCALE, clipped) perturbed by perturb_traffic
+              of data_generation/generate_traffic.py (MC_Z_SIGMA, MC_Z_RHO,
+              MC_Z_ARC_SIGMA)
+
+Options occupy their cells at free-flow times (ARC_DURATION as in the
+first build_instance iteration); every scenario is one sparse product for
+the cell flows x = Z + A y and vectorized BPR on all cells at once. The
+scenarios are split into chunks of MC_CHUNK evaluated in a process pool;
+each chunk has its own seed, so the results do not depend on MC_WORKERS.
+Per scenario: TSTT (exact Beckmann, as Final_TSTT), vehicle-minutes of
+the assigned vehicles, vehicle-weighted mean / p95 / max inconvenience,
+flow above u_max * mu and the peak utilization.
+
+Usage: XLS_PATH=... SOLUTION_XLSX=... python scenario_engine.py
+    MC_TRAFFIC      comma list of levels or traffic JSON paths (default: TRAFFIC or MEDIUM)
+    MC_SCENARIOS    scenarios per level (default 200)
+    MC_SEED         seed of the whole run (default 0)
+    MC_WORKERS      processes (default: all cores), MC_CHUNK scenarios per task (default 25)
+    MC_OUT          per-scenario CSV (default scenario_results.csv)
+"""
+
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from data_generation.generate_traffic import perturb_traffic
+from model_MULTI import background_traffic, read_dataset
+from option_index import CellIncidence, PathSlots
+from solution_report import bpr_latency, bpr_sigma
+
+TIME_SLOTS = list(range(108))
+METRICS = ["TSTT", "Vehicle_Minutes", "Inconvenience_ave", "Inconvenience_p95", "Inconvenience_max",
+           "Over_Capacity", "Max_Util_%"]
+
+_EVAL = None  # evaluation arrays of the worker processes
+
+
+def scenario_config():
+    """Scenario settings from the environment"""
+    return {
+        "levels": os.getenv("MC_TRAFFIC", os.getenv("TRAFFIC", "MEDIUM")).split(","),
+        "scenarios": int(os.getenv("MC_SCENARIOS", "200")),
+        "seed": int(os.getenv("MC_SEED", "0")),
+        "demand_sigma": float(os.getenv("MC_DEMAND_SIGMA", "0.10")),
+        "total_sigma": float(os.getenv("MC_TOTAL_SIGMA", "0.05")),
+        "z_sigma": float(os.getenv("MC_Z_SIGMA", "0.10")),
+        "z_rho": float(os.getenv("MC_Z_RHO", "0.8")),
+        "z_arc_sigma": float(os.getenv("MC_Z_ARC_SIGMA", "0.05")),
+        "chunk": int(os.getenv("MC_CHUNK", "25")),
+        "workers": int(os.getenv("MC_WORKERS", "0")) or os.cpu_count() or 1,
+    }
+
+
+def fixed_assignment(dataset, assignments, nodes_prob):
+    """
+    Evaluation arrays of the assigned options of a solution.
+
+    Parameters:
+    -----------
+    dataset : dict
+        read_dataset() result of the workbook the solution was computed on
+    assignments : DataFrame
+        Assignments sheet (Trip_ID, Path_ID, Departure_Slot, Vehicles_Assigned)
+    nodes_prob : list of dict
+        dati/nodi_prob.json entries (ID, origin_prob, dest_prob)
+
+    Returns:
+    --------
+    dict with the cell x option incidence "A", per-cell BPR data (ff, mu,
+    dur, cap), option flows "y", option trip "opt_trip", free-flow option
+    times "ff_opt", trip demands "dem", trip origin / destination node
+    positions into the nodi_prob weights "p_orig" / "p_dest"
+    """
+    ARCS, FFTT, CAPACITY = dataset["ARCS"], dataset["FFTT"], dataset["CAPACITY"]
+    DELTA_MIN = int(os.getenv("DELTA_MIN", "15"))
+    U_TTI = float(os.getenv("U_TTI", "4.0"))
+    u_max = ((U_TTI - 1.0) / 0.15) ** 0.25 * 1.10  # as in build_instance
+    nA, nT = len(ARCS), len(TIME_SLOTS)
+    arc_pos = {a: n for n, a in enumerate(ARCS)}
+    duration = [max(1, int(math.ceil(FFTT[a] / DELTA_MIN))) for a in ARCS]
+
+    rows = {row["trip_id"]: row for row in dataset["TRIP_ROWS"] if row["paths"]}
+    trips = list(rows)
+    trip_index = {c: n for n, c in enumerate(trips)}
+    path_first, path_arcs = {}, []
+    for c in trips:
+        path_first[c] = len(path_arcs)
+        path_arcs += [[arc_pos[a] for a in p["arcs"]] for p in rows[c]["paths"]]
+
+    used = assignments[assignments["Vehicles_Assigned"] > 0]
+    keep = [c in rows and 0 <= p < len(rows[c]["paths"])
+            for c, p in zip(used["Trip_ID"], used["Path_ID"])]
+    if not all(keep):
+        lost = used.loc[[not k for k in keep], "Vehicles_Assigned"].sum()
+        print(f"⚠️ {len(keep) - sum(keep)} assignments ({lost:,.1f} vehicles) not in the dataset, skipped")
+    used = used[keep]
+    opt_trip = np.array([trip_index[c] for c in used["Trip_ID"]], dtype=np.int64)
+    opt_path = np.array([path_first[c] + p for c, p in zip(used["Trip_ID"], used["Path_ID"])], dtype=np.int64)
+    opt_tau = used["Departure_Slot"].to_numpy(dtype=np.int64)
+
+    inc = CellIncidence.from_path_slots(PathSlots(path_arcs, duration), opt_path, opt_tau, nA, nT)
+    A = sparse.csr_matrix((np.ones(len(inc.opt_cells)), (inc.opt_cells, inc.opt_of_entry)),
+                          shape=(nA * nT, len(opt_path)))
+
+    prob_pos = {str(n["ID"]): k for k, n in enumerate(nodes_prob)}
+    ends = [(rows[c]["paths"][0]["arcs"][0][0], rows[c]["paths"][0]["arcs"][-1][1]) for c in trips]
+    ff = np.array([FFTT[a] for a in ARCS], dtype=float)
+    mu = np.array([CAPACITY[a] for a in ARCS], dtype=float)
+    return {
+        "A": A, "AT": A.T.tocsr(),
+        "ff": np.repeat(ff, nT), "mu": np.repeat(mu, nT), "dur": np.repeat(np.array(duration, dtype=float), nT),
+        "cap": np.repeat(u_max * mu, nT), "u_max": u_max,
+        "y": used["Vehicles_Assigned"].to_numpy(dtype=float), "opt_trip": opt_trip,
+        "ff_opt": np.array([sum(FFTT[ARCS[k]] for k in path_arcs[q]) for q in opt_path.tolist()]),
+        "dem": np.array([rows[c]["demand"] for c in trips], dtype=float),
+        # nodes missing from nodi_prob point past the end: weight 0.0001 (fix_keys default)
+        "p_orig": np.array([prob_pos.get(str(o), len(nodes_prob)) for o, _ in ends], dtype=np.int64),
+        "p_dest": np.array([prob_pos.get(str(d), len(nodes_prob)) for _, d in ends], dtype=np.int64),
+        "w_orig": np.r_[[float(n["origin_prob"]) for n in nodes_prob], 1e-4],
+        "w_dest": np.r_[[float(n["dest_prob"]) for n in nodes_prob], 1e-4],
+    }
+
+
+def demand_factors(ev, n, cfg, rng):
+    """(trips x n) ratio of the redrawn demand to the dataset demand of each trip"""
+    def lognormal(sigma, size):
+        return np.exp(sigma * rng.standard_normal(size) - 0.5 * sigma ** 2)
+
+    n_trips, total = len(ev["dem"]), ev["dem"].sum()
+    w_orig = ev["w_orig"][:, None] * lognormal(cfg["demand_sigma"], (len(ev["w_orig"]), n))
+    w_dest = ev["w_dest"][:, None] * lognormal(cfg["demand_sigma"], (len(ev["w_dest"]), n))
+    weights = w_orig[ev["p_orig"]] * w_dest[ev["p_dest"]] * rng.uniform(0.8, 2.2, (n_trips, n))
+    demand = weights / weights.sum(axis=0) * total * lognormal(cfg["total_sigma"], n)
+    return demand / ev["dem"][:, None]
+
+
+def evaluate(ev, Z, factors):
+    """
+    Metrics of the fixed assignment on a batch of scenarios.
+
+    Parameters:
+    -----------
+    Z : array (n x arcs x slots)
+        Background traffic of each scenario
+    factors : array (trips x n)
+        Demand of each scenario relative to the dataset demand
+
+    Returns a dict metric -> (n,) array (METRICS, Total_Demand, Total_Z).
+    """
+    n = Z.shape[0]
+    Y = ev["y"][:, None] * factors[ev["opt_trip"]]              # options x n
+    X = Z.reshape(n, -1).T.astype(float) + ev["A"] @ Y           # cells x n
+    ff, mu, dur = ev["ff"][:, None], ev["mu"][:, None], ev["dur"][:, None]
+    TT = ev["AT"] @ (bpr_latency(ff, mu, X) / dur)               # options x n, minutes
+    ff_opt = ev["ff_opt"][:, None]
+    inconv = np.where(ff_opt > 1e-9, TT / np.where(ff_opt > 1e-9, ff_opt, 1.0), 1.0)
+
+    order = np.argsort(inconv, axis=0)
+    cum = np.cumsum(np.take_along_axis(Y, order, axis=0), axis=0)
+    p95 = np.take_along_axis(inconv, order, axis=0)[np.argmax(cum >= 0.95 * cum[-1], axis=0), np.arange(n)]
+    util = np.divide(X, mu, out=np.zeros_like(X), where=mu > 0)
+    return {
+        "TSTT": (bpr_sigma(ff, mu, X) / dur).sum(axis=0),
+        "Vehicle_Minutes": (Y * TT).sum(axis=0),
+        "Inconvenience_ave": (Y * inconv).sum(axis=0) / Y.sum(axis=0),
+        "Inconvenience_p95": p95,
+        "Inconvenience_max": inconv.max(axis=0),
+        "Over_Capacity": np.maximum(X - ev["cap"][:, None], 0.0).sum(axis=0),
+        "Max_Util_%": 100 * util.max(axis=0),
+        "Total_Demand": (ev["dem"][:, None] * factors).sum(axis=0),
+        "Total_Z": Z.reshape(n, -1).sum(axis=1, dtype=float),
+    }
+
+
+def _init_worker(ev, Z_levels, cfg):
+    global _EVAL
+    _EVAL = (ev, Z_levels, cfg)
+
+
+def _run_chunk(task):
+    level, first, n, seed = task
+    ev, Z_levels, cfg = _EVAL
+    rng = np.random.default_rng(seed)
+    Z = perturb_traffic(Z_levels[level], n, cfg["z_sigma"], cfg["z_rho"], cfg["z_arc_sigma"], rng)
+    out = evaluate(ev, Z, demand_factors(ev, n, cfg, rng))
+    return pd.DataFrame(dict(out, Traffic=level, Scenario=np.arange(first, first + n)))
+
+
+def run_scenarios(ev, Z_levels, cfg):
+    """
+    All scenarios of every level, chunked over a process pool.
+
+    Returns a DataFrame with one row per scenario (Traffic, Scenario, metrics).
+    """
+    tasks = []
+    for level in Z_levels:
+        for first in range(0, cfg["scenarios"], cfg["chunk"]):
+            tasks.append((level, first, min(cfg["chunk"], cfg["scenarios"] - first)))
+    seeds = np.random.SeedSequence(cfg["seed"]).spawn(len(tasks))
+    tasks = [task + (seed,) for task, seed in zip(tasks, seeds)]
+
+    workers = min(cfg["workers"], len(tasks))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(ev, Z_levels, cfg)) as pool:
+            frames = list(pool.map(_run_chunk, tasks))
+    else:
+        _init_worker(ev, Z_levels, cfg)
+        frames = [_run_chunk(task) for task in tasks]
+    return pd.concat(frames, ignore_index=True)
+
+
+def distribution_table(df):
+    """mean / std / percentiles of every metric per traffic level"""
+    stats = df.groupby("Traffic", sort=False)[METRICS].describe(percentiles=[0.05, 0.5, 0.95])
+    return stats.drop(columns=[c for c in stats.columns if c[1] in ("count", "25%", "75%")])
+
+
+if __name__ == "__main__":
+    XLS_PATH = os.getenv("XLS_PATH", "./INPUT_DATASETS/MEDIUM/OTT/dataset_medium_traffic_250.xlsx")
+    SOLUTION_XLSX = os.getenv("SOLUTION_XLSX", "solution_250_MEDIUM.xlsx")
+    OUT_CSV = os.getenv("MC_OUT", "scenario_results.csv")
+    cfg = scenario_config()
+
+    print("\n" + "=" * 70)
+    print("🎲 MONTE CARLO SCENARIOS (fixed assignment, demand + background traffic)")
+    print("=" * 70)
+
+    t0 = time.time()
+    dataset = read_dataset(XLS_PATH)
+    with open("dati/nodi_prob.json", "r") as f:
+        nodes_prob = json.load(f)
+    ev = fixed_assignment(dataset, pd.read_excel(SOLUTION_XLSX, sheet_name="Assignments"), nodes_prob)
+    Z_levels = {level: background_traffic(dataset["ARCS"], dataset["CAPACITY"], TIME_SLOTS, ev["u_max"], level)
+                for level in cfg["levels"]}
+    print(f"📦 {SOLUTION_XLSX}: {len(ev['y']):,} options, {ev['y'].sum():,.1f} of {ev['dem'].sum():,.0f} "
+          f"vehicles assigned, setup {time.time() - t0:.1f}s")
+
+    # Nominal scenario of each level: dataset demand, unperturbed traffic
+    for level, Z in Z_levels.items():
+        base = evaluate(ev, Z[None], np.ones((len(ev["dem"]), 1)))
+        print(f"   {level} nominal: TSTT={base['TSTT'][0]:,.2f}, "
+              f"inconvenience={base['Inconvenience_ave'][0]:.4f}")
+
+    t0 = time.time()
+    df = run_scenarios(ev, Z_levels, cfg)
+    print(f"⏱️ {len(df):,} scenarios in {time.time() - t0:.1f}s ({cfg['workers']} workers)")
+    df.to_csv(OUT_CSV, index=False)
+
+    with pd.option_context("display.width", 200, "display.max_columns", None, "display.float_format", "{:,.4f}".format):
+        for metric in ("TSTT", "Inconvenience_ave", "Inconvenience_p95"):
+            print(f"\n📈 {metric}:")
+            print(distribution_table(df)[metric].to_string())
+    print(f"\n💾 Saved: {OUT_CSV}")
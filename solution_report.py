@@ -0,0 +1,166 @@
+"""
+Reporting helpers shared by the solution writers.
+
+Both the Pyomo driver (solve_model_MULTI.py) and the NumPy assignment engine
+(fw_assignment.py) describe a solution by the flow array x[arc, slot]; the
+Arc_Statistics / Summary sheets are computed from it here so the two
+workbooks have identical columns and can be compared directly.
+
+extract_solution pulls every primal value (and the duals, when the model
+carries a dual Suffix) of a solved Pyomo model into arrays in one pass;
+statistics, effective times and exports read from those arrays instead of
+calling value() per index.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+SUMMARY_METRICS = [
+    "Total_Demand", "CTP_Options", "Iterations",
+    "Final_Assignment_%", "Final_TSTT", "Final_Inconvenience",
+    "Ave_Ave_Flow", "Ave_Ave_Util", "Ave_Max_Flow", "Ave_Max_Util",
+    "Ave_AumentoTTArco", "Max_Ave_Flow", "Max_Ave_Util",
+    "Max_Max_Flow", "Max_Max_Util", "Max_AumentoTTArco", "Inconvenience_ave"
+]
+
+
+def _values(var_data, n):
+    return np.fromiter(((v.value or 0.0) for v in var_data), dtype=float, count=n)
+
+
+def flow_array(model, ARCS, TIME_SLOTS):
+    """model.x as an (arcs x slots) array"""
+    n = len(ARCS) * len(TIME_SLOTS)
+    if len(model.x) == n:  # x is indexed by A x T in ARCS / TIME_SLOTS order
+        return _values(model.x.values(), n).reshape(len(ARCS), len(TIME_SLOTS))
+    return _values((model.x[i, j, t] for (i, j) in ARCS for t in TIME_SLOTS), n).reshape(len(ARCS), len(TIME_SLOTS))
+
+
+def extract_solution(model):
+    """
+    All values of a solved MULTI model (create_model) as NumPy arrays.
+
+    Returns:
+    --------
+    dict with
+        x, eta             (arcs x slots)  total flow / scaled Beckmann term per cell
+        y, TT, I           (options,)      aligned with model.inst["ctp_set"]
+        r                  (trips,)        unmet demand, aligned with inst["TRIPS"]
+        TSTT_scaled        float           value of model.TSTT_total
+        flow_dual          (arcs x slots)  duals of the flow rows      } only if
+        demand_dual        (trips,)        duals of the demand rows    } model.dual exists
+    """
+    inst = model.inst
+    ARCS, TIME_SLOTS, ctp_set, TRIPS = inst["ARCS"], inst["TIME_SLOTS"], inst["ctp_set"], inst["TRIPS"]
+    shape = (len(ARCS), len(TIME_SLOTS))
+    sol = {
+        "x": flow_array(model, ARCS, TIME_SLOTS),
+        "eta": _values(model.eta.values(), shape[0] * shape[1]).reshape(shape),
+        "y": _values((model.y[o] for o in ctp_set), len(ctp_set)),
+        "TT": _values((model.TT[o] for o in ctp_set), len(ctp_set)),
+        "I": _values((model.I[o] for o in ctp_set), len(ctp_set)),
+        "r": _values((model.r[c] for c in TRIPS), len(TRIPS)),
+    }
+    sol["TSTT_scaled"] = float(sol["eta"].sum())
+    dual = getattr(model, "dual", None)
+    if dual is not None:
+        sol["flow_dual"] = np.fromiter((dual.get(con, 0.0) for con in model.flow.values()),
+                                       dtype=float, count=shape[0] * shape[1]).reshape(shape)
+        sol["demand_dual"] = np.fromiter((dual.get(model.demand[c], 0.0) for c in TRIPS),
+                                         dtype=float, count=len(TRIPS))
+    return sol
+
+
+def bpr_latency(ff, mu, x):
+    """Vectorized bpr_latency_arc: ff/mu broadcast against the flow array x"""
+    ff = np.asarray(ff, dtype=float)
+    mu = np.asarray(mu, dtype=float)
+    ratio = np.divide(x, mu, out=np.zeros(np.broadcast(x, mu).shape), where=mu > 0)
+    return ff * (1.0 + 0.15 * ratio ** 4)
+
+
+def bpr_sigma(ff, mu, x):
+    """Vectorized bpr_sigma_arc (Beckmann potential) against the flow array x"""
+    ff = np.asarray(ff, dtype=float)
+    mu = np.asarray(mu, dtype=float)
+    ratio = np.divide(x, mu, out=np.zeros(np.broadcast(x, mu).shape), where=mu > 0)
+    return ff * x * (1.0 + 0.03 * ratio ** 4)
+
+
+def effective_times_from_flows(x, ARCS, FFTT, CAPACITY):
+    """
+    Same rule as model_MULTI.compute_effective_travel_times (BPR at the mean
+    of the positive flows of each arc), from an (arcs x slots) flow array.
+    """
+    x = np.asarray(x, dtype=float)
+    ff = np.array([FFTT[a] for a in ARCS], dtype=float)
+    mu = np.array([CAPACITY[a] for a in ARCS], dtype=float)
+    pos = x > 0
+    n_pos = pos.sum(axis=1)
+    avg = np.divide(np.where(pos, x, 0.0).sum(axis=1), n_pos, out=np.zeros(len(ARCS)), where=n_pos > 0)
+    eff = np.where(n_pos > 0, bpr_latency(ff, mu, avg), ff)
+    return {a: float(eff[n]) for n, a in enumerate(ARCS)}
+
+
+def effective_time_matrix(x, ARCS, FFTT, CAPACITY):
+    """BPR travel time of every (arc, slot) cell from an (arcs x slots) flow array"""
+    ff = np.array([FFTT[a] for a in ARCS], dtype=float)
+    mu = np.array([CAPACITY[a] for a in ARCS], dtype=float)
+    return bpr_latency(ff[:, None], mu[:, None], np.asarray(x, dtype=float))
+
+
+def arc_statistics(x, ARCS, FFTT, CAPACITY):
+    """
+    Per-arc flow / utilization / BPR delay statistics.
+
+    Parameters:
+    -----------
+    x : array (len(ARCS), len(TIME_SLOTS))
+        Total flow per (arc, slot) cell, background traffic included
+
+    Returns:
+    --------
+    (DataFrame for the Arc_Statistics sheet, dict of overall statistics)
+    """
+    x = np.asarray(x, dtype=float)
+    ff = np.array([FFTT[a] for a in ARCS], dtype=float)
+    mu = np.array([CAPACITY[a] for a in ARCS], dtype=float)
+
+    tt_inc = bpr_latency(ff[:, None], mu[:, None], x) - ff[:, None]
+    util = np.divide(x * 100.0, mu[:, None], out=np.zeros_like(x), where=mu[:, None] > 0)
+    has_mu = mu > 0
+
+    avg_flow, max_flow = x.mean(axis=1), x.max(axis=1)
+    avg_util = np.where(has_mu, util.mean(axis=1), 0.0)
+    max_util = np.where(has_mu, util.max(axis=1), 0.0)
+
+    df = pd.DataFrame({
+        "From": [i for (i, j) in ARCS],
+        "To": [j for (i, j) in ARCS],
+        "Ave_Ave_Flow": avg_flow.round(2),
+        "Ave_Ave_Util": avg_util.round(2),
+        "Ave_Max_Flow": max_flow.round(2),
+        "Ave_Max_Util": max_util.round(2),
+        "Ave_AumentoTTArco": tt_inc.mean(axis=1).round(2),
+        "Max_Ave_Flow": max_flow.round(2),
+        "Max_Ave_Util": max_util.round(2),
+        "Max_Max_Flow": max_flow.round(2),
+        "Max_Max_Util": max_util.round(2),
+        "Max_AumentoTTArco": tt_inc.max(axis=1).round(2),
+    })
+
+    overall = {}
+    for col in ("Ave_Ave_Flow", "Ave_Ave_Util", "Ave_Max_Flow", "Ave_Max_Util", "Ave_AumentoTTArco"):
+        overall[col] = df[col].mean()
+    for col in ("Max_Ave_Flow", "Max_Ave_Util", "Max_Max_Flow", "Max_Max_Util", "Max_AumentoTTArco"):
+        overall[col] = df[col].max()
+    return df, overall
+
+
+def summary_frame(total_demand, n_options, iterations, assign_rate, TSTT, I_bar, overall_stats):
+    """Summary sheet in the Metric/Value layout of solve_model_MULTI.py"""
+    values = [total_demand, n_options, iterations, assign_rate, TSTT, I_bar]
+    values += [overall_stats[k] for k in SUMMARY_METRICS[6:-1]]
+    values.append(I_bar)
+    return pd.DataFrame({"Metric": SUMMARY_METRICS, "Value": values})
@@ -12,22 +12,22 @@ from pyomo.opt import SolverFactory, TerminationCondition
 logging.basicConfig(level=logging.INFO)
 logging.getLogger("pyomo").setLevel(logging.WARNING)
 
-OUT_XLS = "solution_250_MEDIUM.xlsx"
-DEBUG_LOG = "debug_1.txt"
-
-def safe_value(expr, default=0.0):
-    try:
-        val = value(expr, exception=False)
-        return default if val is None else float(val)
-    except:
-        return default
+OUT_XLS = os.getenv("OUT_XLS", "solution_250_MEDIUM.xlsx")
+DEBUG_LOG = os.getenv("DEBUG_LOG", "debug_1.txt")
+PROFILE_JSON = os.getenv("PROFILE_JSON", os.path.splitext(OUT_XLS)[0] + "_profile.json")
+PROFILE_CSV = os.getenv("PROFILE_CSV", os.path.splitext(OUT_XLS)[0] + "_profile.csv")
 
 print("\n" + "="*70)
 print("🚀 ITERATIVE USER EQUILIBRIUM SOLVER")
 print("   Implements 2-3 iterations with effective travel time updates")
 print("="*70)
 
-from model_MULTI import create_model, compute_effective_travel_times, bpr_latency_arc
+from model_MULTI import (create_model, update_travel_times, read_dataset, bpr_model, model_build,
+                         compute_effective_travel_times, option_travel_times, trip_best_times)
+from solution_report import arc_statistics, extract_solution, summary_frame
+from profiler import PROFILER
+from solver_backend import SolverBackend
+from ue_update import TravelTimeUpdate, fixed_point_residual, relative_gap
 
 log_file = open(DEBUG_LOG, "w", encoding="utf-8")
 def log(msg):
@@ -40,31 +40,34 @@ def log(msg):
 # ============================================================
 MAX_ITERATIONS = int(os.getenv("MAX_ITERATIONS", "3"))
 CONVERGENCE_THRESHOLD = float(os.getenv("CONV_THRESHOLD", "0.05"))  # 5% change
+UE_TIME_DEPENDENT = os.getenv("UE_TIME_DEPENDENT", "0") == "1"  # per-(arc, slot) effective times
+UE_GAP = float(os.getenv("UE_GAP", "0"))  # > 0: stop on the relative UE gap instead of the TSTT change
 
 log(f"\n🔧 Iterative Parameters:")
 log(f"   Max iterations: {MAX_ITERATIONS}")
 log(f"   Convergence threshold: {CONVERGENCE_THRESHOLD*100:.1f}%")
+log(f"   Time-dependent effective times: {'ON' if UE_TIME_DEPENDENT else 'OFF'}")
 
 # ============================================================
 # SOLVER SETUP
 # ============================================================
-solver = SolverFactory("gurobi")
-if not solver.available():
-    raise RuntimeError("Gurobi not available")
-
-solver.options.clear()
-solver.options.update({
-    "Method": 2,              # Barrier
-    "Crossover": 0,           # No crossover
-    "Presolve": 2,
-    "Threads": 16,
-    "TimeLimit": 72000,        
-    "FeasibilityTol": 1e-3,
-    "OptimalityTol": 1e-3,
-    "BarConvTol": 1e-3,
-    "NumericFocus": 2,
-    "BarHomogeneous": 1,
-})
+# MODEL_BUILD=matrix: the LP is assembled as sparse arrays and solved in memory by HiGHS
+# (model_MULTI_matrix), rebuilt every iteration
+MODEL_BUILD = model_build()
+if MODEL_BUILD == "matrix":
+    from model_MULTI_matrix import solve_matrix_model
+    UE_WARM = False
+    log(f"   Model build: matrix (HiGHS in memory)")
+else:
+    # SOLVER (default auto: Gurobi, then HiGHS / CBC / GLPK; Ipopt for BPR_MODEL=exact)
+    solver = SolverBackend(nonlinear=bpr_model() == "exact")
+    # UE_WARM=1 keeps one model alive across iterations and edits it in place. Off by default:
+    # appsi replaces every edited row with a remove + add, and once the travel times move the
+    # whole TT block that costs more than a fresh build (5x slower on dataset_10_MEDIUM with HiGHS)
+    UE_WARM = os.getenv("UE_WARM", "0") == "1"
+    log(f"   Solver: {solver.describe()}{' [incremental]' if solver.incremental else ''}")
+log(f"   Warm in-place updates: {'ON' if UE_WARM else 'OFF'}")
+solver_history = []
 
 # ============================================================
 # ITERATIVE LOOP
@@ -72,8 +75,17 @@ solver.options.update({
 effective_times_history = []
 objective_history = []
 convergence_history = []
+gap_history = []
+residual_history = []
 
 effective_travel_times = None  # Start with None (will use FF times)
+with PROFILER.phase("read_dataset"):
+    dataset = read_dataset()  # Workbook parsed once for all iterations
+build_times = []
+ue_update = TravelTimeUpdate(dataset["ARCS"], dataset["FFTT"])
+log(f"   Effective-time update: {ue_update.rule}"
+    + (f" (alpha={ue_update.alpha})" if ue_update.rule in ("damping", "anderson") else ""))
+log(f"   Stop on: {f'relative gap < {UE_GAP:.2%}' if UE_GAP > 0 else 'TSTT change'}")
 
 # Variables to track final results
 TSTT_final = 0.0
@@ -85,18 +97,30 @@ for iteration in range(MAX_ITERATIONS):
     log("\n" + "="*70)
     log(f"ITERATION {iteration + 1}/{MAX_ITERATIONS}")
     log("="*70)
+    PROFILER.label(iteration=iteration + 1)
     
     # ============================================================
-    # BUILD MODEL WITH CURRENT TRAVEL TIMES
+    # BUILD (OR UPDATE) MODEL WITH CURRENT TRAVEL TIMES
     # ============================================================
-    model, TRIPS_DATA, ARCS, TIME_SLOTS, FFTT, CAPACITY, Z, PATH_ARCS, gamma, total_demand, OBJ_SCALE, TRAVEL_TIMES = create_model(
-        effective_travel_times=effective_travel_times,
-        iteration=iteration
-    )
+    t0 = time.time()
+    with PROFILER.phase("build"):
+        if UE_WARM and iteration > 0:
+            model, TRIPS_DATA, ARCS, TIME_SLOTS, FFTT, CAPACITY, Z, PATH_ARCS, gamma, total_demand, OBJ_SCALE, TRAVEL_TIMES = update_travel_times(
+                model, effective_travel_times, iteration
+            )
+        else:
+            model, TRIPS_DATA, ARCS, TIME_SLOTS, FFTT, CAPACITY, Z, PATH_ARCS, gamma, total_demand, OBJ_SCALE, TRAVEL_TIMES = create_model(
+                effective_travel_times=effective_travel_times,
+                iteration=iteration,
+                dataset=dataset
+            )
+    build_times.append(time.time() - t0)
+    n_options = len(model.inst["ctp_set"])
     
     log(f"\n📊 Instance Statistics (Iteration {iteration + 1}):")
+    log(f"   Build time: {build_times[-1]:.1f}s")
     log(f"   Total Demand: {total_demand:,.0f}")
-    log(f"   CTP Options: {len(model.CTP):,}")
+    log(f"   CTP Options: {n_options:,}")
     log(f"   Arcs: {len(ARCS)}")
     log(f"   Time Slots: {len(TIME_SLOTS)}")
     
@@ -110,43 +134,54 @@ for iteration in range(MAX_ITERATIONS):
     # Ensure correct objective is active
     if hasattr(model, 'obj_inconv'):
         model.obj_inconv.deactivate()
-    model.obj_TSTT.activate()
+    if hasattr(model, 'obj_TSTT'):
+        model.obj_TSTT.activate()
     if hasattr(model, 'eps_cap'):
         model.eps_cap.deactivate()
     
     log("\n⏳ Solving...")
-    t0 = time.time()
-    results = solver.solve(model, tee=True, load_solutions=True)
-    solve_time = time.time() - t0
+    with PROFILER.phase("solve"):
+        if MODEL_BUILD == "matrix":
+            sol, last = solve_matrix_model(model, tee=True)
+        else:
+            # previous y/x values are still loaded on a warm model
+            solver.solve(model, tee=True, warmstart=UE_WARM and iteration > 0)
+            last = solver.last
+        solve_time = last["wall_s"]
+        load_time = last["load_s"] or 0.0
+        optimize_time = last["solver_s"]
+        if last["load_s"] is not None:  # model handed to / updated in the persistent solver
+            PROFILER.record("load_model", load_time)
+        if optimize_time is not None:  # the rest is LP writing and solution reading/loading
+            PROFILER.record("optimize", optimize_time)
+            PROFILER.record("write_load", max(0.0, solve_time - load_time - optimize_time))
+    solver_history.append(last)
     
-    tc = results.solver.termination_condition
     log(f"\n{'='*70}")
-    log(f"Termination: {tc}")
+    log(f"Termination: {last['termination']} ({last['backend']})")
     log(f"Time: {solve_time:.1f}s ({solve_time/60:.1f} minutes)")
+    if optimize_time is not None:
+        log(f"   Optimizer: {optimize_time:.1f}s, model load/update: {load_time:.1f}s, "
+            f"write/read: {max(0.0, solve_time - load_time - optimize_time):.1f}s")
     
     # ============================================================
     # EVALUATE SOLUTION
     # ============================================================
-    TSTT_scaled = safe_value(model.TSTT_total)
-    TSTT = TSTT_scaled / OBJ_SCALE
-    
-    total_y = sum(safe_value(model.y[c,p,t]) for (c,p,t) in model.CTP)
-    total_slack = sum(safe_value(model.r[c]) for c in model.C)
-    assign_rate = 100 * total_y / total_demand
+    if MODEL_BUILD != "matrix":  # the matrix solve returns the arrays directly
+        with PROFILER.phase("extract"):
+            sol = extract_solution(model)  # every value read once, statistics below use the arrays
+
+    with PROFILER.phase("evaluate"):
+        TSTT_scaled = sol["TSTT_scaled"]
+        TSTT = TSTT_scaled / OBJ_SCALE
     
-    def calc_inconvenience():
-        total_inconv = 0.0
-        total_flow = 0.0
-        for (c, p, t) in model.CTP:
-            y_val = safe_value(model.y[c, p, t])
-            if y_val <= 1e-6:
-                continue
-            I_val = safe_value(model.I[c, p, t])
-            total_inconv += I_val * y_val
-            total_flow += y_val
-        return (total_inconv / total_flow) if total_flow > 0 else 0.0
+        total_y = sol["y"].sum()
+        total_slack = sol["r"].sum()
+        assign_rate = 100 * total_y / total_demand
     
-    I_bar = calc_inconvenience()
+        used = sol["y"] > 1e-6
+        total_flow = sol["y"][used].sum()
+        I_bar = float(sol["I"][used] @ sol["y"][used] / total_flow) if total_flow > 0 else 0.0
     
     log(f"\n📊 Iteration {iteration + 1} Results:")
     log(f"   TSTT (unscaled): {TSTT:,.2f}")
@@ -167,31 +202,45 @@ for iteration in range(MAX_ITERATIONS):
     # ============================================================
     # COMPUTE NEW EFFECTIVE TRAVEL TIMES
     # ============================================================
-    new_effective_times = compute_effective_travel_times(model, ARCS, TIME_SLOTS, FFTT, CAPACITY)
+    with PROFILER.phase("effective_times"):
+        new_effective_times = compute_effective_travel_times(model, ARCS, TIME_SLOTS, FFTT, CAPACITY, solution=sol,
+                                                             time_dependent=UE_TIME_DEPENDENT)
     effective_times_history.append(new_effective_times)
+    used_times = effective_travel_times if effective_travel_times is not None else FFTT
+    gap = relative_gap(model.inst["ctp_set"], sol["y"], option_travel_times(model.inst, new_effective_times),
+                       trip_best_times(model.inst, new_effective_times))
+    residual = fixed_point_residual(used_times, new_effective_times, ARCS)
+    gap_history.append(gap)
+    residual_history.append(residual)
     
     # ============================================================
     # CHECK CONVERGENCE
     # ============================================================
     converged = False
+    log(f"\n🔍 Convergence Check:")
+    log(f"   Relative UE gap: {gap:.4%}")
+    log(f"   Effective-time residual: {residual:.4f}")
     if iteration > 0:
         obj_change = abs(objective_history[-1] - objective_history[-2]) / objective_history[-2]
         convergence_history.append(obj_change)
         
-        log(f"\n🔍 Convergence Check:")
         log(f"   Previous TSTT: {objective_history[-2]:,.2f}")
         log(f"   Current TSTT: {objective_history[-1]:,.2f}")
         log(f"   Change: {obj_change*100:.2f}%")
         
-        if obj_change < CONVERGENCE_THRESHOLD:
-            log(f"\n✅ CONVERGED after {iteration + 1} iterations!")
-            log(f"   Change ({obj_change*100:.2f}%) < Threshold ({CONVERGENCE_THRESHOLD*100:.1f}%)")
-            converged = True
-        else:
-            log(f"\n⚠️ Not converged yet. Continuing...")
+    if UE_GAP > 0 and gap < UE_GAP:
+        log(f"\n✅ CONVERGED after {iteration + 1} iterations!")
+        log(f"   Relative gap ({gap:.4%}) < Threshold ({UE_GAP:.4%})")
+        converged = True
+    elif UE_GAP <= 0 and iteration > 0 and obj_change < CONVERGENCE_THRESHOLD:
+        log(f"\n✅ CONVERGED after {iteration + 1} iterations!")
+        log(f"   Change ({obj_change*100:.2f}%) < Threshold ({CONVERGENCE_THRESHOLD*100:.1f}%)")
+        converged = True
+    else:
+        log(f"\n⚠️ Not converged yet. Continuing...")
     
     # Update for next iteration
-    effective_travel_times = new_effective_times
+    effective_travel_times = ue_update(used_times, new_effective_times)
     
     # Break if converged
     if converged:
@@ -205,66 +254,11 @@ log("📊 COMPUTING COMPREHENSIVE STATISTICS")
 log("="*70)
 
 # Per-arc statistics
-arc_stats = []
-for (i, j) in ARCS:
-    ff = FFTT[(i, j)]
-    mu = CAPACITY[(i, j)]
-    
-    flows = []
-    utils = []
-    tt_increases = []
-    
-    for t in TIME_SLOTS:
-        x_val = safe_value(model.x[i, j, t])
-        flows.append(x_val)
-        
-        if mu > 0:
-            util = (x_val / mu) * 100
-            utils.append(util)
-        
-        # Compute travel time increase
-        eff_tt = bpr_latency_arc(ff, mu, x_val)
-        tt_increase = eff_tt - ff
-        tt_increases.append(tt_increase)
-    
-    avg_flow = np.mean(flows)
-    avg_util = np.mean(utils) if utils else 0.0
-    max_flow = np.max(flows)
-    max_util = np.max(utils) if utils else 0.0
-    avg_tt_increase = np.mean(tt_increases)
-    max_tt_increase = np.max(tt_increases)
-    
-    arc_stats.append({
-        "From": i,
-        "To": j,
-        "Ave_Ave_Flow": round(avg_flow, 2),
-        "Ave_Ave_Util": round(avg_util, 2),
-        "Ave_Max_Flow": round(max_flow, 2),
-        "Ave_Max_Util": round(max_util, 2),
-        "Ave_AumentoTTArco": round(avg_tt_increase, 2),
-        "Max_Ave_Flow": round(max_flow, 2),
-        "Max_Ave_Util": round(max_util, 2),
-        "Max_Max_Flow": round(max_flow, 2),
-        "Max_Max_Util": round(max_util, 2),
-        "Max_AumentoTTArco": round(max_tt_increase, 2),
-    })
-
-df_arc_stats = pd.DataFrame(arc_stats)
-
-# Overall statistics
-overall_stats = {
-    "Ave_Ave_Flow": df_arc_stats["Ave_Ave_Flow"].mean(),
-    "Ave_Ave_Util": df_arc_stats["Ave_Ave_Util"].mean(),
-    "Ave_Max_Flow": df_arc_stats["Ave_Max_Flow"].mean(),
-    "Ave_Max_Util": df_arc_stats["Ave_Max_Util"].mean(),
-    "Ave_AumentoTTArco": df_arc_stats["Ave_AumentoTTArco"].mean(),
-    "Max_Ave_Flow": df_arc_stats["Max_Ave_Flow"].max(),
-    "Max_Ave_Util": df_arc_stats["Max_Ave_Util"].max(),
-    "Max_Max_Flow": df_arc_stats["Max_Max_Flow"].max(),
-    "Max_Max_Util": df_arc_stats["Max_Max_Util"].max(),
-    "Max_AumentoTTArco": df_arc_stats["Max_AumentoTTArco"].max(),
-    "Inconvenience_ave": I_bar_final
-}
+PROFILER.label(iteration=None)
+with PROFILER.phase("arc_statistics"):
+    x_flows = sol["x"]
+    df_arc_stats, overall_stats = arc_statistics(x_flows, ARCS, FFTT, CAPACITY)
+overall_stats["Inconvenience_ave"] = I_bar_final
 
 log(f"\n📊 Overall Statistics:")
 for key, val in overall_stats.items():
@@ -301,73 +295,64 @@ log(f"   Unmet Demand: {total_slack_final:,.0f}")
 # ============================================================
 log(f"\n💾 Exporting results...")
 
-# Assignments
-assignments = []
-for (c, p, t) in model.CTP:
-    y_val = safe_value(model.y[c, p, t])
-    if y_val <= 1e-4:
-        continue
-    path = PATH_ARCS.get((c, p), [])
-    if not path:
-        continue
-    freeflow_tt = sum(FFTT[(i, j)] for (i, j) in path)
-    effective_tt = sum(effective_travel_times[(i, j)] for (i, j) in path)
-    tt_model = safe_value(model.TT[c, p, t])
-    inconv_model = safe_value(model.I[c, p, t])
-    assignments.append({
-        "Trip_ID": c,
-        "Path_ID": p,
-        "Departure_Slot": t,
-        "Vehicles_Assigned": y_val,
-        "Demand": TRIPS_DATA[c]["demand"],
-        "FreeFlow_Time_min": round(freeflow_tt, 2),
-        "Effective_Time_min": round(effective_tt, 2),
-        "TravelTime_PWL_min": round(tt_model, 2),
-        "Inconvenience_PWL": round(inconv_model, 4),
-    })
-
-df_assignments = pd.DataFrame(assignments)
-
-# Summary with comprehensive statistics
-summary_data = {
-    "Metric": [
-        "Total_Demand", "CTP_Options", "Iterations",
-        "Final_Assignment_%", "Final_TSTT", "Final_Inconvenience",
-        "Ave_Ave_Flow", "Ave_Ave_Util", "Ave_Max_Flow", "Ave_Max_Util",
-        "Ave_AumentoTTArco", "Max_Ave_Flow", "Max_Ave_Util",
-        "Max_Max_Flow", "Max_Max_Util", "Max_AumentoTTArco", "Inconvenience_ave"
-    ],
-    "Value": [
-        total_demand, len(model.CTP), len(objective_history),
-        assign_rate_final, TSTT_final, I_bar_final,
-        overall_stats["Ave_Ave_Flow"], overall_stats["Ave_Ave_Util"],
-        overall_stats["Ave_Max_Flow"], overall_stats["Ave_Max_Util"],
-        overall_stats["Ave_AumentoTTArco"], overall_stats["Max_Ave_Flow"],
-        overall_stats["Max_Ave_Util"], overall_stats["Max_Max_Flow"],
-        overall_stats["Max_Max_Util"], overall_stats["Max_AumentoTTArco"],
-        overall_stats["Inconvenience_ave"]
-    ]
-}
-df_summary = pd.DataFrame(summary_data)
-
-# Convergence
-conv_data = {
-    "Iteration": list(range(1, len(objective_history) + 1)),
-    "TSTT": objective_history,
-    "Change_%": [0.0] + [c*100 for c in convergence_history]
-}
-df_convergence = pd.DataFrame(conv_data)
-
-# Write to Excel
-with pd.ExcelWriter(OUT_XLS, engine="openpyxl") as xl:
-    df_summary.to_excel(xl, sheet_name="Summary", index=False)
-    df_convergence.to_excel(xl, sheet_name="Convergence", index=False)
-    df_arc_stats.to_excel(xl, sheet_name="Arc_Statistics", index=False)
-    if not df_assignments.empty:
-        df_assignments.to_excel(xl, sheet_name="Assignments", index=False)
+with PROFILER.phase("export_workbook"):
+    # Assignments
+    assignments = []
+    ctp_set = model.inst["ctp_set"]
+    effective_opt = option_travel_times(model.inst, new_effective_times)   # times of the final solution's flows
+    for n in np.flatnonzero(sol["y"] > 1e-4):
+        (c, p, t), y_val = ctp_set[n], float(sol["y"][n])
+        path = PATH_ARCS.get((c, p), [])
+        if not path:
+            continue
+        freeflow_tt = sum(FFTT[(i, j)] for (i, j) in path)
+        effective_tt = float(effective_opt[n])
+        tt_model = float(sol["TT"][n])
+        inconv_model = float(sol["I"][n])
+        assignments.append({
+            "Trip_ID": c,
+            "Path_ID": p,
+            "Departure_Slot": t,
+            "Vehicles_Assigned": y_val,
+            "Demand": TRIPS_DATA[c]["demand"],
+            "FreeFlow_Time_min": round(freeflow_tt, 2),
+            "Effective_Time_min": round(effective_tt, 2),
+            "TravelTime_PWL_min": round(tt_model, 2),
+            "Inconvenience_PWL": round(inconv_model, 4),
+        })
+
+    df_assignments = pd.DataFrame(assignments)
+
+    # Summary with comprehensive statistics
+    df_summary = summary_frame(total_demand, n_options, len(objective_history),
+                               assign_rate_final, TSTT_final, I_bar_final, overall_stats)
+
+    # Convergence
+    conv_data = {
+        "Iteration": list(range(1, len(objective_history) + 1)),
+        "TSTT": objective_history,
+        "Build_Time_s": build_times,
+        "Change_%": [0.0] + [c*100 for c in convergence_history],
+        "Relative_Gap": gap_history,
+        "Time_Residual": residual_history,
+        "Solver": [h["backend"] for h in solver_history],
+        "Termination": [h["termination"] for h in solver_history],
+        "Solve_Time_s": [h["wall_s"] for h in solver_history],
+        "Load_Time_s": [h["load_s"] for h in solver_history],
+        "Optimizer_Time_s": [h["solver_s"] for h in solver_history],
+    }
+    df_convergence = pd.DataFrame(conv_data)
+
+    # Write to Excel
+    with pd.ExcelWriter(OUT_XLS, engine="openpyxl") as xl:
+        df_summary.to_excel(xl, sheet_name="Summary", index=False)
+        df_convergence.to_excel(xl, sheet_name="Convergence", index=False)
+        df_arc_stats.to_excel(xl, sheet_name="Arc_Statistics", index=False)
+        if not df_assignments.empty:
+            df_assignments.to_excel(xl, sheet_name="Assignments", index=False)
 
 log(f"\n💾 Results saved to: {OUT_XLS}")
-log(f"   Sheets: Summary, Convergence, Arc_Statistics, Assignments")
+log(f"   Sheets: Summary, Convergence, Arc_Statistics, Assignments, Profile")
 log_file.close()
 
 print(f"\n✅ COMPLETE - Final Assignment: {assign_rate_final:.1f}%")
@@ -381,5 +366,15 @@ print(f"   Average Inconvenience: {I_bar_final:.4f}")
 from export_flows import export_time_specific_flows, export_to_excel_with_time
 
 # After your model.solve() completes:
-export_time_specific_flows(model, ARCS, TIME_SLOTS, "arc_flows_by_time.json")
-export_to_excel_with_time(model, ARCS, TIME_SLOTS, FFTT, CAPACITY, "arc_flows_detailed.xlsx")
\ No newline at end of file
+with PROFILER.phase("export_flows"):
+    export_time_specific_flows(model, ARCS, TIME_SLOTS, os.getenv("FLOWS_JSON", "arc_flows_by_time.json"), flows=sol["x"])
+    export_to_excel_with_time(model, ARCS, TIME_SLOTS, FFTT, CAPACITY, os.getenv("FLOWS_XLSX", "arc_flows_detailed.xlsx"),
+                              flows=sol["x"])
+
+# Phase profile: JSON/CSV next to the workbook plus a Profile sheet in it
+PROFILER.write(PROFILE_JSON, PROFILE_CSV, xls_path=dataset["xls_path"], out_xls=OUT_XLS,
+               ctp_options=n_options, arcs=len(ARCS), iterations=len(objective_history))
+with pd.ExcelWriter(OUT_XLS, engine="openpyxl", mode="a", if_sheet_exists="replace") as xl:
+    PROFILER.frame().to_excel(xl, sheet_name="Profile", index=False)
+PROFILER.report()
+print(f"💾 Profile saved to: {PROFILE_JSON}, {PROFILE_CSV} (sheet Profile)")
@@ -0,0 +1,228 @@
+"""
+Solver backend layer for the LP drivers.
+
+SolverBackend picks the first available Pyomo solver of SOLVER (a name or
+a comma list tried in order; "auto" = AUTO_ORDER, Gurobi first, then the
+licence-free HiGHS / CBC / GLPK, or NLP_ORDER for the exact BPR model)
+and maps one set of settings to the options of that backend:
+
+    setting      gurobi                 highs                        cbc            glpk                  ipopt
+    method       Method 2/1/-1          solver ipm/simplex/choose    -              --interior (barrier)  -
+    crossover    Crossover              run_crossover (off: choose)  -              -                     -
+    threads      Threads                threads                      threads        -                     -
+    time_limit   TimeLimit              time_limit                   sec            tmlim                 max_cpu_time
+    tol          Feasibility/Optimality primal/dual feasibility,     primalT,       -                     tol
+                 /BarConvTol            ipm_optimality_tolerance     dualT
+
+In-memory interfaces come before the LP-file shell interfaces of the same
+solver. Persistent ones keep the model loaded between solves: appsi_*
+pushes only what changed on the same model object (sync_options,
+update_travel_times, set_background_traffic edit it in place), the legacy
+gurobi_persistent has no change tracking and gets the model handed over
+again in memory, so only appsi_* counts as incremental. Every solve() leaves a uniform record in backend.last:
+backend, termination, status, wall seconds, the seconds spent loading or
+updating the model in a persistent solver and the optimizer seconds the
+solver itself reports (None when not applicable / not reported); the rest
+is LP writing and solution reading (shell) or solution loading.
+
+    SOLVER              name or comma list (default auto)
+    SOLVER_METHOD       barrier (default) | simplex | auto
+    SOLVER_CROSSOVER    0 (default) | 1
+    SOLVER_THREADS      (default 16)
+    SOLVER_TIME_LIMIT   seconds (default 72000)
+    SOLVER_TOL          feasibility/optimality tolerance (default 1e-3)
+"""
+
+import os
+import time
+from contextlib import contextmanager
+
+from pyomo.environ import SolverFactory
+from pyomo.opt import TerminationCondition
+
+from profiler import solver_time
+
+AUTO_ORDER = ("appsi_gurobi", "gurobi_persistent", "gurobi", "appsi_highs", "appsi_cbc", "cbc", "glpk")
+NLP_ORDER = ("appsi_ipopt", "ipopt")
+METHODS = ("barrier", "simplex", "auto")
+
+
+def settings(**overrides):
+    """Solver settings from the SOLVER_* environment, overridden by keyword"""
+    s = {
+        "method": os.getenv("SOLVER_METHOD", "barrier").lower(),
+        "crossover": os.getenv("SOLVER_CROSSOVER", "0") == "1",
+        "threads": int(os.getenv("SOLVER_THREADS", "16")),
+        "time_limit": float(os.getenv("SOLVER_TIME_LIMIT", "72000")),
+        "tol": float(os.getenv("SOLVER_TOL", "1e-3")),
+    }
+    s.update({k: v for k, v in overrides.items() if v is not None})
+    if s["method"] not in METHODS:
+        raise ValueError(f"SOLVER_METHOD must be one of {METHODS}, got '{s['method']}'")
+    return s
+
+
+def family(name):
+    for fam in ("gurobi", "highs", "cbc", "glpk", "ipopt"):
+        if fam in name:
+            return fam
+    return name
+
+
+def backend_options(name, s):
+    """Solver options of backend `name` for the settings s"""
+    fam = family(name)
+    if fam == "gurobi":
+        return {
+            "Method": {"barrier": 2, "simplex": 1, "auto": -1}[s["method"]],
+            "Crossover": -1 if s["crossover"] else 0,
+            "Presolve": 2,
+            "Threads": s["threads"],
+            "TimeLimit": s["time_limit"],
+            "FeasibilityTol": s["tol"],
+            "OptimalityTol": s["tol"],
+            "BarConvTol": s["tol"],
+            "NumericFocus": 2,
+            "BarHomogeneous": 1,
+        }
+    if fam == "highs":
+        return {
+            "solver": {"barrier": "ipm", "simplex": "simplex", "auto": "choose"}[s["method"]],
+            # HiGHS reports an IPM point that misses its tolerances as "unknown" and no
+            # solution gets loaded; "choose" only crosses over in that case
+            "run_crossover": "on" if s["crossover"] else "choose",
+            "presolve": "on",
+            "threads": s["threads"],
+            "time_limit": s["time_limit"],
+            "primal_feasibility_tolerance": s["tol"],
+            "dual_feasibility_tolerance": s["tol"],
+            "ipm_optimality_tolerance": s["tol"],
+        }
+    if fam == "cbc":  # the LP goes to CLP's dual simplex
+        return {"threads": s["threads"], "sec": s["time_limit"], "primalT": s["tol"], "dualT": s["tol"]}
+    if fam == "glpk":
+        opts = {"tmlim": int(s["time_limit"])}
+        if s["method"] == "barrier":
+            opts["interior"] = None
+        return opts
+    if fam == "ipopt":
+        return {"tol": s["tol"], "max_cpu_time": s["time_limit"]}
+    return {}
+
+
+class SolverBackend:
+    """
+    First available solver of `name` with the settings mapped onto it.
+
+    Parameters:
+    -----------
+    name : str, optional
+        Solver name or comma list; defaults to SOLVER, "auto" = AUTO_ORDER
+    nonlinear : bool
+        "auto" means NLP_ORDER (model_MULTI with BPR_MODEL=exact)
+    **overrides :
+        method / crossover / threads / time_limit / tol
+    """
+
+    def __init__(self, name=None, nonlinear=False, **overrides):
+        name = name or os.getenv("SOLVER", "auto")
+        if name == "auto":
+            candidates = NLP_ORDER if nonlinear else AUTO_ORDER
+        else:
+            candidates = [n.strip() for n in name.split(",") if n.strip()]
+        self.settings = settings(**overrides)
+        self.solver = None
+        for cand in candidates:
+            try:
+                solver = SolverFactory(cand)
+                ok = solver.available(exception_flag=False)
+            except Exception:
+                ok = False
+            if ok:
+                self.name, self.solver = cand, solver
+                break
+        if self.solver is None:
+            raise RuntimeError(f"No solver available among {', '.join(candidates)}")
+
+        self.family = family(self.name)
+        self.appsi = self.name.startswith("appsi_")
+        self.persistent = self.appsi or self.name.endswith("_persistent")
+        self.incremental = self.appsi  # gurobi_persistent gets set_instance on every solve
+        self.options = backend_options(self.name, self.settings)
+        self.solver.options.clear()
+        self.solver.options.update(self.options)
+        if self.appsi:
+            # fixed variables (PWL reduction, dropped options) go to the solver as lb = ub columns:
+            # the LP is linear either way, and new fixed values are a bound update instead of
+            # reprocessing every row that uses them
+            self.solver.update_config.treat_fixed_vars_as_params = False
+        self.last = {}
+        self._loaded = None
+        self._clock = 0.0
+
+    def describe(self):
+        s = self.settings
+        return (f"{self.name} ({s['method']}, crossover {'on' if s['crossover'] else 'off'}, "
+                f"{s['threads']} threads, tol {s['tol']:g}, limit {s['time_limit']:g}s)")
+
+    def warm_start_capable(self):
+        return self.solver.warm_start_capable()
+
+    def load(self, model):
+        """Hand model to a persistent solver: incremental update if already loaded (appsi)"""
+        if self.appsi and self._loaded is model:
+            self.solver.update()
+        else:
+            self.solver.set_instance(model)
+            self._clock = 0.0
+        self._loaded = model
+
+    @contextmanager
+    def _no_auto_update(self):
+        """appsi re-scans the model inside solve(); skip it right after load()"""
+        cfg = self.solver.update_config
+        keys = [k for k in cfg.keys() if k.startswith(("check_for_", "update_"))]
+        saved = {k: cfg[k] for k in keys}
+        for k in keys:
+            cfg[k] = False
+        try:
+            yield
+        finally:
+            for k, val in saved.items():
+                cfg[k] = val
+
+    def solve(self, model, tee=False, warmstart=False, **kwargs):
+        """Solve and record backend, termination, load/wall/optimizer seconds in self.last"""
+        if warmstart and not self.appsi and self.warm_start_capable():
+            kwargs["warmstart"] = True  # appsi solvers keep their own basis
+        t0 = time.time()
+        load_s = None
+        if self.persistent:
+            self.load(model)
+            load_s = time.time() - t0
+        if self.appsi:
+            with self._no_auto_update():
+                results = self.solver.solve(model, tee=tee, load_solutions=True, **kwargs)
+        else:
+            results = self.solver.solve(model, tee=tee, load_solutions=True, **kwargs)
+        wall = time.time() - t0
+        tc = results.solver.termination_condition
+        self.last = {
+            "backend": self.name,
+            "termination": str(tc),
+            "status": str(results.solver.status),
+            "optimal": tc == TerminationCondition.optimal,
+            "wall_s": wall,
+            "load_s": load_s,
+            "solver_s": self.optimizer_time(results),
+        }
+        return results
+
+    def optimizer_time(self, results):
+        """Optimizer seconds reported by the solver (appsi keeps them on its own results object)"""
+        reported = solver_time(results)
+        if reported is None and self.appsi:
+            clock = getattr(getattr(self.solver, "_last_results_object", None), "wallclock_time", None)
+            if clock is not None:  # HiGHS' run clock keeps counting over a loaded instance
+                reported, self._clock = clock - self._clock, clock
+        return reported
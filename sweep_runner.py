@@ -0,0 +1,176 @@
+"""
+Scenario sweep over the LEVEL x trips x VARIANT grid of dataset workbooks.
+
+Every workbook under {LEVEL}/{VARIANT}/ (LEVEL in LOW/MEDIUM/HIGH/NULL,
+VARIANT in OTT/BENCH0/RANDOM) is one grid cell; its trip count is the last
+_<n> in the file name. Each cell runs solve_model_MULTI.py (or
+fw_assignment.py with SWEEP_ENGINE=fw) in its own process, with XLS_PATH /
+OUT_XLS / log and flow-export paths set per job, so jobs never share
+output files. Jobs run SWEEP_JOBS at a time and split SWEEP_THREADS
+between them (SOLVER_THREADS plus the BLAS/OpenMP thread variables) instead
+of each asking for 16 threads. Largest instances start first.
+
+Each cell solves with the background traffic of its own level (TRAFFIC,
+resolved through model_MULTI.TRAFFIC_FILES). A cell is skipped when its
+output workbook is newer than the dataset, every local module of the
+repository root and that traffic file (SWEEP_FORCE=1 reruns everything).
+Outputs go to SWEEP_OUT_DIR (default sweep_out/), away from the shipped
+solution_*.xlsx workbooks in the repository root. The consolidated index
+(SWEEP_INDEX, default sweep_out/sweep_index.csv) lists every cell with its
+status, wall time, the Summary metrics of its workbook and the
+build/solve/export seconds of its phase profile.
+
+Usage: python sweep_runner.py
+    SWEEP_LEVELS    comma list (default LOW,MEDIUM,HIGH,NULL)
+    SWEEP_VARIANTS  comma list (default OTT,BENCH0,RANDOM)
+    SWEEP_TRIPS     comma list of trip counts to keep (default: all)
+    SWEEP_OUT_DIR   output directory (default sweep_out)
+    SWEEP_DRY_RUN=1 only print the schedule
+"""
+
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import pandas as pd
+
+from model_MULTI import TRAFFIC_FILES
+
+LEVELS = os.getenv("SWEEP_LEVELS", "LOW,MEDIUM,HIGH,NULL").split(",")
+VARIANTS = os.getenv("SWEEP_VARIANTS", "OTT,BENCH0,RANDOM").split(",")
+TRIP_FILTER = {int(n) for n in os.getenv("SWEEP_TRIPS", "").split(",") if n.strip()}
+OUT_DIR = Path(os.getenv("SWEEP_OUT_DIR", "sweep_out")).resolve()
+INDEX_CSV = os.getenv("SWEEP_INDEX", str(OUT_DIR / "sweep_index.csv"))
+ENGINE = os.getenv("SWEEP_ENGINE", "pyomo").lower()
+FORCE = os.getenv("SWEEP_FORCE", "0") == "1"
+DRY_RUN = os.getenv("SWEEP_DRY_RUN", "0") == "1"
+
+TOTAL_THREADS = int(os.getenv("SWEEP_THREADS", str(os.cpu_count() or 1)))
+N_JOBS = max(1, int(os.getenv("SWEEP_JOBS", str(max(1, TOTAL_THREADS // 4)))))
+THREADS_PER_JOB = max(1, TOTAL_THREADS // N_JOBS)
+
+ROOT = Path(__file__).resolve().parent
+SCRIPT = ROOT / ("fw_assignment.py" if ENGINE == "fw" else "solve_model_MULTI.py")
+
+SUMMARY_KEYS = ["Final_TSTT", "Final_Assignment_%", "Final_Inconvenience", "CTP_Options", "Iterations"]
+
+
+def enumerate_grid():
+    """One job per (level, trips, variant); duplicates keep the shortest file name"""
+    cells = {}
+    for level in LEVELS:
+        for variant in VARIANTS:
+            for xls in sorted((ROOT / level / variant).glob("*.xlsx")):
+                found = re.findall(r"_(\d+)", xls.stem)
+                if not found:
+                    continue
+                n = int(found[-1])
+                if TRIP_FILTER and n not in TRIP_FILTER:
+                    continue
+                key = (level, n, variant)
+                if key not in cells or len(xls.stem) < len(cells[key].stem):
+                    cells[key] = xls
+    jobs = []
+    for (level, n, variant), xls in cells.items():
+        suffix = "" if variant == "OTT" else f"_{variant}"
+        tag = "FW_" if ENGINE == "fw" else ""
+        jobs.append({"level": level, "trips": n, "variant": variant, "dataset": xls,
+                     "output": OUT_DIR / f"solution_{tag}{n}_{level}{suffix}.xlsx"})
+    return sorted(jobs, key=lambda j: -j["trips"])
+
+
+def dependencies(job):
+    """Inputs of a cell besides its dataset: the root modules the solve imports and its traffic file"""
+    modules = [p for p in ROOT.glob("*.py") if p.name != Path(__file__).name]
+    return modules + [ROOT / TRAFFIC_FILES.get(job["level"].upper(), job["level"])]
+
+
+def up_to_date(job):
+    out = job["output"]
+    if FORCE or not out.exists():
+        return False
+    newest_input = max(p.stat().st_mtime for p in [job["dataset"], *dependencies(job)] if p.exists())
+    return out.stat().st_mtime >= newest_input
+
+
+def run_job(job):
+    out = job["output"]
+    stem = out.with_suffix("")
+    env = dict(os.environ,
+               XLS_PATH=str(job["dataset"]), TRAFFIC=job["level"], OUT_XLS=str(out), FW_OUT=str(out),
+               DEBUG_LOG=f"{stem}.debug.txt", PROFILE_JSON=f"{stem}_profile.json", PROFILE_CSV=f"{stem}_profile.csv",
+               FLOWS_JSON=f"{stem}_arc_flows_by_time.json", FLOWS_XLSX=f"{stem}_arc_flows_detailed.xlsx",
+               SOLVER_THREADS=str(THREADS_PER_JOB), OMP_NUM_THREADS=str(THREADS_PER_JOB),
+               OPENBLAS_NUM_THREADS=str(THREADS_PER_JOB), MKL_NUM_THREADS=str(THREADS_PER_JOB),
+               PYTHONPATH=os.pathsep.join(filter(None, [str(ROOT), os.getenv("PYTHONPATH")])))
+    t0 = time.time()
+    with open(f"{stem}.log", "w", encoding="utf-8") as log:
+        proc = subprocess.run([sys.executable, str(SCRIPT)], cwd=ROOT, env=env,
+                              stdout=log, stderr=subprocess.STDOUT)
+    return proc.returncode, time.time() - t0
+
+
+def summary_metrics(out):
+    try:
+        df = pd.read_excel(out, sheet_name="Summary")
+    except Exception:
+        return {}
+    values = dict(zip(df["Metric"], df["Value"]))
+    return {k: values.get(k) for k in SUMMARY_KEYS}
+
+
+def profile_totals(out):
+    """Top-level phase seconds (build, solve, ...) from the run's *_profile.json"""
+    try:
+        with open(out.with_name(out.stem + "_profile.json"), encoding="utf-8") as f:
+            prof = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    totals = {"Peak_RSS_MB": prof["run"].get("peak_rss_mb")}
+    for rec in prof["phases"]:
+        if rec.get("depth") == 0:
+            key = rec["phase"].title() + "_s"
+            totals[key] = totals.get(key, 0.0) + rec["wall_s"]
+    return totals
+
+
+if __name__ == "__main__":
+    jobs = enumerate_grid()
+    todo = [j for j in jobs if not up_to_date(j)]
+
+    print("=" * 70)
+    print(f"🧮 SWEEP: {len(jobs)} grid cells, {len(todo)} to run, {len(jobs) - len(todo)} up to date")
+    print(f"   Engine: {SCRIPT.name}, {N_JOBS} parallel jobs x {THREADS_PER_JOB} threads")
+    print("=" * 70)
+    for j in todo:
+        print(f"   {j['level']:<6} {j['variant']:<6} {j['trips']:>5} trips  {j['dataset'].name} -> {j['output'].name}")
+    if DRY_RUN:
+        sys.exit(0)
+
+    OUT_DIR.mkdir(parents=True, exist_ok=True)
+    results = {id(j): {"status": "up_to_date", "returncode": 0, "wall_time_s": None} for j in jobs}
+    with ThreadPoolExecutor(max_workers=N_JOBS) as pool:
+        futures = {pool.submit(run_job, j): j for j in todo}
+        for fut in as_completed(futures):
+            j = futures[fut]
+            rc, wall = fut.result()
+            results[id(j)] = {"status": "done" if rc == 0 else "failed", "returncode": rc, "wall_time_s": round(wall, 1)}
+            print(f"{'✅' if rc == 0 else '❌'} {j['output'].name} ({wall:.0f}s)")
+
+    rows = []
+    for j in sorted(jobs, key=lambda j: (j["level"], j["variant"], j["trips"])):
+        row = {"level": j["level"], "variant": j["variant"], "trips": j["trips"],
+               "dataset": str(j["dataset"].relative_to(ROOT)), "output": str(j["output"]),
+               "threads": THREADS_PER_JOB, **results[id(j)]}
+        if j["output"].exists():
+            row.update(summary_metrics(j["output"]))
+            row.update(profile_totals(j["output"]))
+        rows.append(row)
+    pd.DataFrame(rows).to_csv(INDEX_CSV, index=False)
+    print(f"\n💾 Results index: {INDEX_CSV}")
+    sys.exit(0 if all(r["status"] != "failed" for r in results.values()) else 1)
@@ -0,0 +1,150 @@
+"""
+Update rules and convergence metrics for the outer UE loop.
+
+Each outer iteration solves the assignment for effective travel times t_k
+and maps the solution to new times F(t_k) (compute_effective_travel_times,
+per arc or per (arc, slot)). Substituting t_{k+1} = F(t_k) wholesale tends to
+oscillate on congested instances; TravelTimeUpdate applies one of
+
+    replace    t_{k+1} = F(t_k)                              (old behaviour)
+    msa        t_{k+1} = t_k + (F(t_k) - t_k) / k     (k = 1 on the first update)
+    damping    t_{k+1} = t_k + alpha * (F(t_k) - t_k)
+    anderson   Anderson mixing (type II) over the last UE_MEMORY residuals,
+               with alpha as mixing parameter; falls back to damping while
+               the history is short or the least-squares step is unusable
+
+Times never go below free flow. Works on the per-arc dict and on the
+(arcs x slots) array of the time-dependent mode alike.
+
+relative_gap measures how far the assignment is from equilibrium under
+F(t_k): (sum_o y_o c_o - sum_c D_c min_o c_o) / sum_o y_o c_o, with c_o the
+option travel times and D_c the assigned demand of trip c. The minimum runs
+over all candidate options of the trip (model_MULTI.trip_best_times), so
+options the GAMMA filter dropped under t_k but that are fastest under
+F(t_k) count against the assignment. fixed_point_residual is the relative
+change ||F(t_k) - t_k|| / ||t_k|| of the times themselves.
+
+    UE_RULE      replace (default) | msa | damping | anderson
+    UE_DAMPING   alpha (default 0.5)
+    UE_MEMORY    Anderson history length (default 3)
+"""
+
+import os
+
+import numpy as np
+
+RULES = ("replace", "msa", "damping", "anderson")
+
+
+def as_array(times, ARCS, shape=None):
+    """Effective times (dict per arc or array) as an array, broadcast to shape if given"""
+    arr = np.asarray(times, dtype=float) if isinstance(times, np.ndarray) \
+        else np.array([times[a] for a in ARCS], dtype=float)
+    if shape is not None and arr.shape != shape:
+        arr = np.broadcast_to(arr[:, None], shape).copy()
+    return arr
+
+
+def as_times(arr, ARCS):
+    """Inverse of as_array: per-arc dict for 1-D input, the array itself otherwise"""
+    return {a: float(arr[n]) for n, a in enumerate(ARCS)} if arr.ndim == 1 else arr
+
+
+def fixed_point_residual(used, mapped, ARCS):
+    """||F(t) - t|| / ||t|| between the times used by the solve and the times it produced"""
+    new = as_array(mapped, ARCS)
+    old = as_array(used, ARCS, new.shape)
+    return float(np.linalg.norm(new - old) / max(np.linalg.norm(old), 1e-12))
+
+
+def relative_gap(ctp_set, y, option_costs, trip_best=None):
+    """
+    Relative UE gap of an assignment.
+
+    Parameters:
+    -----------
+    ctp_set : list of (c, p, tau)
+    y : array aligned with ctp_set
+        Assigned vehicles
+    option_costs : array aligned with ctp_set
+        Travel time of every option (model_MULTI.option_travel_times)
+    trip_best : dict, optional
+        Fastest option time per trip over all candidates
+        (model_MULTI.trip_best_times); the minimum over ctp_set otherwise
+    """
+    y = np.asarray(y, dtype=float)
+    cost = np.asarray(option_costs, dtype=float)
+    total = float(y @ cost)
+    if total <= 0:
+        return 0.0
+    trips, trip = np.unique([c for (c, p, tau) in ctp_set], return_inverse=True)
+    trip = trip.ravel()
+    best = np.full(len(trips), np.inf)
+    np.minimum.at(best, trip, cost)
+    if trip_best is not None:
+        best = np.minimum(best, [trip_best.get(c, np.inf) for c in trips.tolist()])
+    demand = np.bincount(trip, weights=y, minlength=len(best))
+    return max(0.0, (total - float(demand @ best)) / total)
+
+
+class TravelTimeUpdate:
+    """
+    Stateful update t_{k+1} = U(t_k, F(t_k)) for the outer loop.
+
+    Parameters:
+    -----------
+    ARCS, FFTT :
+        Arc list and free-flow times (lower bound of every update)
+    rule, damping, memory :
+        Default to UE_RULE / UE_DAMPING / UE_MEMORY
+    """
+
+    def __init__(self, ARCS, FFTT, rule=None, damping=None, memory=None):
+        self.ARCS = ARCS
+        self.ff = np.array([FFTT[a] for a in ARCS], dtype=float)
+        self.rule = (rule or os.getenv("UE_RULE", "replace")).lower()
+        if self.rule not in RULES:
+            raise ValueError(f"UE_RULE must be one of {RULES}, got '{self.rule}'")
+        self.alpha = float(os.getenv("UE_DAMPING", "0.5")) if damping is None else damping
+        self.memory = int(os.getenv("UE_MEMORY", "3")) if memory is None else memory
+        self.k = 0
+        self._t, self._g = [], []
+
+    def __call__(self, used, mapped):
+        """
+        Next effective times from the times used in this iteration (FFTT on
+        the first one) and the times F produced; same kind as mapped.
+        """
+        self.k += 1
+        new = as_array(mapped, self.ARCS)
+        if self.rule == "replace":
+            return mapped
+        t = as_array(used, self.ARCS, new.shape)
+        if self._t and self._t[-1].shape != t.shape:  # switched between per-arc and per-slot
+            self._t, self._g = [], []
+        g = new - t
+
+        if self.rule == "msa":
+            nxt = t + g / self.k
+        elif self.rule == "damping":
+            nxt = t + self.alpha * g
+        else:
+            nxt = self._anderson(t, g)
+
+        floor = self.ff if nxt.ndim == 1 else self.ff[:, None]
+        return as_times(np.maximum(nxt, floor), self.ARCS)
+
+    def _anderson(self, t, g):
+        self._t.append(t.ravel())
+        self._g.append(g.ravel())
+        self._t, self._g = self._t[-(self.memory + 1):], self._g[-(self.memory + 1):]
+        step = t + self.alpha * g
+        if len(self._g) < 2:
+            return step
+        dT = np.diff(np.array(self._t), axis=0).T
+        dG = np.diff(np.array(self._g), axis=0).T
+        gamma, *_ = np.linalg.lstsq(dG, g.ravel(), rcond=None)
+        if not np.all(np.isfinite(gamma)):
+            return step
+        mixed = t.ravel() + self.alpha * g.ravel() - (dT + self.alpha * dG) @ gamma
+        return mixed.reshape(t.shape)